@@ -0,0 +1,87 @@
+MESES_ANALISE = 6
+TAMANHO_PAGINA = 20
+
+#Colunas agregadas devolvidas pelo banco para cada grupo
+_COLUNAS_AGREGADAS = (
+    'registros',
+    'consumo_total', 'media_consumo', 'consumo_min', 'consumo_max',
+    'custo_total', 'media_custo', 'custo_min', 'custo_max',
+)
+
+#Calcula no banco, em uma única consulta, o resumo geral, por setor e por mês do período
+def resumo_consumo(cursor, cnpj, meses=MESES_ANALISE):
+    cursor.execute('''
+        SELECT
+            GROUPING(setor),
+            GROUPING(TRUNC(data_registro, 'MM')),
+            setor,
+            TRUNC(data_registro, 'MM'),
+            COUNT(*),
+            SUM(consumo_kwh), AVG(consumo_kwh), MIN(consumo_kwh), MAX(consumo_kwh),
+            SUM(custo_total), AVG(custo_total), MIN(custo_total), MAX(custo_total)
+        FROM consumo_energetico
+        WHERE cnpj_empresa = :1
+        AND data_registro >= ADD_MONTHS(SYSDATE, -:2)
+        GROUP BY GROUPING SETS ((), (setor), (TRUNC(data_registro, 'MM')))
+    ''', [cnpj, meses])
+
+    return montar_resumo(cursor)
+
+#Separa as linhas de uma consulta com GROUPING SETS ((), (setor), (mês)) em resumo geral, por setor e por mês
+def montar_resumo(linhas):
+    resumo = {'geral': None, 'por_setor': [], 'por_mes': []}
+    for linha in linhas:
+        grupo_setor, grupo_mes, setor, mes = linha[:4]
+        valores = dict(zip(_COLUNAS_AGREGADAS, linha[4:]))
+        if grupo_setor and grupo_mes:
+            resumo['geral'] = valores
+        elif not grupo_setor:
+            resumo['por_setor'].append({'setor': setor, **valores})
+        else:
+            resumo['por_mes'].append({'mes': mes, **valores})
+
+    if not resumo['geral'] or not resumo['geral']['registros']:
+        return None
+
+    resumo['por_setor'].sort(key=lambda grupo: grupo['consumo_total'] or 0, reverse=True)
+    resumo['por_mes'].sort(key=lambda grupo: grupo['mes'])
+    return resumo
+
+#Página do histórico por busca de chave (keyset): em vez de OFFSET, continua a partir da última
+#linha mostrada (data_registro, ROWID), então qualquer página custa o mesmo que a primeira.
+#Com meses, só as leituras dos últimos meses (o mesmo período de resumo_consumo).
+#Devolve as linhas (data, kWh, custo, setor, observações) e a chave para a próxima página (ou None).
+def historico_consumos(cursor, cnpj, setor=None, inicio=None, fim=None, apos=None, tamanho=TAMANHO_PAGINA, meses=None):
+    filtros = ''
+    parametros = {'cnpj': cnpj, 'tamanho': tamanho + 1}
+    if meses:
+        filtros += ' AND data_registro >= ADD_MONTHS(SYSDATE, -:meses)'
+        parametros['meses'] = meses
+    if setor:
+        filtros += ' AND setor = :setor'
+        parametros['setor'] = setor
+    if inicio:
+        filtros += ' AND data_registro >= :inicio'
+        parametros['inicio'] = inicio
+    if fim:
+        filtros += ' AND data_registro < :fim + 1'
+        parametros['fim'] = fim
+    if apos:
+        filtros += ' AND (data_registro < :data OR (data_registro = :data AND ROWID < CHARTOROWID(:linha)))'
+        parametros['data'], parametros['linha'] = apos
+
+    cursor.arraysize = tamanho + 1
+    cursor.execute(f'''
+        SELECT data_registro, consumo_kwh, custo_total, setor, observacoes, ROWIDTOCHAR(ROWID)
+        FROM consumo_energetico
+        WHERE cnpj_empresa = :cnpj{filtros}
+        ORDER BY data_registro DESC, ROWID DESC
+        FETCH FIRST :tamanho ROWS ONLY
+    ''', parametros)
+    linhas = cursor.fetchall()
+
+    proxima = None
+    if len(linhas) > tamanho:
+        linhas = linhas[:tamanho]
+        proxima = (linhas[-1][0], linhas[-1][5])
+    return [linha[:5] for linha in linhas], proxima
@@ -0,0 +1,195 @@
+#Imports das funcionalidades a serem usadas
+import math
+import os
+import time
+
+#Detecção de leituras fora do padrão por série (empresa + setor) com média e variância
+#exponencialmente ponderadas (EWMA). Cada série guarda só alguns números, gravados em
+#estado_anomalias, então uma nova varredura continua de onde a anterior parou.
+#
+#A varredura avança pela ordem de gravação (id da leitura, atribuído pelo banco), não pela data da
+#leitura: importações em lote, leituras do spool e leituras com data retroativa entram depois da
+#última leitura avaliada e continuam sendo vistas. As leituras avaliadas na hora do registro
+#(verificar_leitura) ficam em leituras_avaliadas até a varredura passar por elas.
+
+CONFIG_ANOMALIAS = {
+    'alfa': float(os.environ.get('ECOFLUX_ANOMALIA_ALFA', 0.05)),
+    'limite': float(os.environ.get('ECOFLUX_ANOMALIA_LIMITE', 3.5)),
+    'aquecimento': int(os.environ.get('ECOFLUX_ANOMALIA_AQUECIMENTO', 20)),
+    #Só no Oracle: a varredura deixa para a próxima vez as leituras gravadas há menos que isto (em segundos),
+    #porque um id menor ainda pode estar em uma transação não confirmada de outra sessão
+    'atraso': float(os.environ.get('ECOFLUX_ANOMALIA_ATRASO', 60)),
+}
+
+#Linhas processadas entre um commit e outro na varredura completa
+TAMANHO_LOTE_VARREDURA = 10000
+
+#Tabelas do estado por série e das leituras marcadas (Oracle)
+DDL_ANOMALIAS = [
+    '''
+    CREATE TABLE estado_anomalias (
+        cnpj_empresa VARCHAR2(14) NOT NULL,
+        setor VARCHAR2(100) NOT NULL,
+        leituras NUMBER NOT NULL,
+        media NUMBER NOT NULL,
+        variancia NUMBER NOT NULL,
+        ultima_leitura DATE NOT NULL,
+        ultimo_id NUMBER,
+        CONSTRAINT pk_estado_anomalias PRIMARY KEY (cnpj_empresa, setor)
+    )
+    ''',
+    '''
+    CREATE TABLE anomalias_consumo (
+        cnpj_empresa VARCHAR2(14) NOT NULL,
+        setor VARCHAR2(100) NOT NULL,
+        data_registro DATE NOT NULL,
+        consumo_kwh NUMBER NOT NULL,
+        escore NUMBER NOT NULL,
+        media NUMBER NOT NULL,
+        desvio NUMBER NOT NULL,
+        detectada_em DATE DEFAULT SYSDATE NOT NULL
+    )
+    ''',
+    'CREATE INDEX idx_anomalias_empresa_data ON anomalias_consumo (cnpj_empresa, data_registro)',
+    '''
+    CREATE TABLE leituras_avaliadas (
+        id_leitura NUMBER PRIMARY KEY,
+        cnpj_empresa VARCHAR2(14) NOT NULL,
+        setor VARCHAR2(100) NOT NULL
+    )
+    ''',
+]
+
+#Ordem de gravação das leituras no Oracle: id de uma sequência e instante de gravação, ambos do banco
+#(em um esquema existente, aplicar sql/anomalias_ingestao.sql)
+DDL_INGESTAO = [
+    'CREATE SEQUENCE seq_consumo_ingestao CACHE 1000',
+    '''
+    ALTER TABLE consumo_energetico ADD (
+        id_ingestao NUMBER DEFAULT seq_consumo_ingestao.NEXTVAL NOT NULL,
+        gravada_em TIMESTAMP DEFAULT SYSTIMESTAMP NOT NULL
+    )
+    ''',
+    'CREATE INDEX idx_consumo_serie_ingestao ON consumo_energetico (cnpj_empresa, setor, id_ingestao)',
+    'CREATE INDEX idx_consumo_empresa_ingestao ON consumo_energetico (cnpj_empresa, id_ingestao)',
+]
+
+#Estado de uma série: quantidade de leituras, média e variância EWMA, data da leitura mais recente
+#incorporada e id (ordem de gravação) da última leitura varrida
+class EstadoSerie:
+    __slots__ = ('leituras', 'media', 'variancia', 'ultima_leitura', 'ultimo_id')
+
+    def __init__(self, leituras=0, media=0.0, variancia=0.0, ultima_leitura=None, ultimo_id=None):
+        self.leituras = leituras
+        self.media = media
+        self.variancia = variancia
+        self.ultima_leitura = ultima_leitura
+        self.ultimo_id = ultimo_id
+
+    #Escore z da leitura em relação ao histórico; None enquanto a série ainda está aquecendo
+    def escore(self, valor, config=None):
+        config = config or CONFIG_ANOMALIAS
+        if self.leituras < config['aquecimento'] or self.variancia <= 0:
+            return None
+        return (valor - self.media) / math.sqrt(self.variancia)
+
+    #Incorpora a leitura à média e à variância (atualização incremental, O(1))
+    def atualizar(self, valor, instante, config=None):
+        config = config or CONFIG_ANOMALIAS
+        if self.leituras == 0:
+            self.media = valor
+            self.variancia = 0.0
+        else:
+            alfa = max(config['alfa'], 1.0 / (self.leituras + 1))
+            diferenca = valor - self.media
+            incremento = alfa * diferenca
+            self.media += incremento
+            self.variancia = (1 - alfa) * (self.variancia + diferenca * incremento)
+        self.leituras += 1
+        if self.ultima_leitura is None or instante > self.ultima_leitura:
+            self.ultima_leitura = instante
+
+    def linha(self, cnpj, setor):
+        return (cnpj, setor, self.leituras, self.media, self.variancia, self.ultima_leitura, self.ultimo_id)
+
+#Avalia e incorpora uma leitura; devolve a linha de anomalia (para anomalias_consumo) ou None.
+#Leituras anteriores à última processada só são avaliadas, sem alterar o estado.
+def processar(estado, cnpj, setor, instante, valor, config=None):
+    config = config or CONFIG_ANOMALIAS
+    escore = estado.escore(valor, config)
+    anomalia = None
+    if escore is not None and abs(escore) >= config['limite']:
+        anomalia = (cnpj, setor, instante, valor, round(escore, 4), estado.media, math.sqrt(estado.variancia))
+    if estado.ultima_leitura is None or instante >= estado.ultima_leitura:
+        estado.atualizar(valor, instante, config)
+    return anomalia
+
+def descrever(anomalia):
+    cnpj, setor, instante, valor, escore, media, desvio = anomalia
+    return {
+        'cnpj': cnpj, 'setor': setor, 'data_registro': instante, 'consumo_kwh': valor,
+        'escore': escore, 'media': round(media, 4), 'desvio': round(desvio, 4),
+    }
+
+#Verifica uma leitura recém-inserida na mesma transação do insert (lê e grava só o estado da série).
+#'gravada' é o que consumo.inserir devolve: (id da leitura, data_registro gravada no banco). A leitura fica
+#marcada como avaliada para a varredura não contá-la de novo; o ponto da varredura (ultimo_id) não muda.
+def verificar_leitura(sessao, cnpj, setor, gravada, valor, config=None):
+    id_leitura, instante = gravada
+    linha = sessao.anomalias.estado(cnpj, setor)
+    estado = EstadoSerie(*linha[2:]) if linha else EstadoSerie()
+    anomalia = processar(estado, cnpj, setor, instante, valor, config)
+    sessao.anomalias.salvar_estados([estado.linha(cnpj, setor)])
+    sessao.anomalias.marcar_avaliada(id_leitura, cnpj, setor)
+    if anomalia:
+        sessao.anomalias.registrar([anomalia])
+        return descrever(anomalia)
+    return None
+
+#Varre as leituras gravadas depois do último id varrido de cada série (ou de uma empresa), em ordem de data
+#por série; as já avaliadas no registro só avançam o ponto da série. Grava e confirma a cada lote, sempre ao
+#fim de uma série, para que uma interrupção não deixe série pela metade.
+def varrer(sessao, cnpj=None, config=None, tamanho_lote=TAMANHO_LOTE_VARREDURA):
+    config = config or CONFIG_ANOMALIAS
+    inicio = time.perf_counter()
+    estados = {(linha[0], linha[1]): EstadoSerie(*linha[2:]) for linha in sessao.anomalias.estados(cnpj)}
+    resultado = {'leituras': 0, 'series': 0, 'anomalias': 0}
+    alterados = {}
+    anomalias = []
+    pendentes = 0
+    atual = None
+
+    def gravar():
+        sessao.anomalias.salvar_estados([estado.linha(*serie) for serie, estado in alterados.items()])
+        sessao.anomalias.registrar(anomalias)
+        sessao.commit()
+        resultado['anomalias'] += len(anomalias)
+        alterados.clear()
+        anomalias.clear()
+
+    for lote in sessao.anomalias.leituras_novas(cnpj, config['atraso']):
+        for cnpj_leitura, setor, instante, valor, id_leitura, avaliada in lote:
+            serie = (cnpj_leitura, setor)
+            if serie != atual:
+                if pendentes >= tamanho_lote:
+                    gravar()
+                    pendentes = 0
+                atual = serie
+                resultado['series'] += 1
+                estado = estados.get(serie) or EstadoSerie()
+                alterados[serie] = estado
+            if estado.ultimo_id is None or id_leitura > estado.ultimo_id:
+                estado.ultimo_id = id_leitura
+            pendentes += 1
+            if avaliada:
+                continue
+            anomalia = processar(estado, cnpj_leitura, setor, instante, valor, config)
+            if anomalia:
+                anomalias.append(anomalia)
+            resultado['leituras'] += 1
+
+    gravar()
+    sessao.anomalias.limpar_avaliadas(cnpj)
+    sessao.commit()
+    resultado['duracao_s'] = round(time.perf_counter() - inicio, 3)
+    return resultado
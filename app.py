@@ -1,20 +1,15 @@
 #Imports das funcionalidades a serem usadas
-import oracledb
-import requests
-import json
-
-#Configurações de conexão com o Oracle
-def conectar_banco():
-    try:
-        #Se desejar testar o sistema, crie as tabelas e utilize seu próprio banco de dados oracle
-        conn = oracledb.connect(
-            user='',
-            password='',
-            dsn=''
-        )
-        return conn
-    except oracledb.Error as e:
-        print(f'Erro de conexão: {e}')
+from datetime import datetime, timedelta
+
+from analise import MESES_ANALISE
+from anomalias import verificar_leitura
+from armazenamento import ErroBanco, abrir_sessao
+from cnpj import CNPJNaoEncontrado, ErroConsultaCNPJ, extrair_dados_empresa, obter_cliente
+from diretorio import obter_diretorio
+from indicadores import indicadores_empresa
+from ranking import montar_ranking
+from relatorio import escrever_relatorio, nome_arquivo_relatorio
+from senhas import autenticar, gerar_hash
 
 #Imprimir o menu principal
 def menu():
@@ -27,6 +22,7 @@ def menu():
 [5] - Gerar relatório
 [6] - Dicas de consumo
 [7] - Sair
+[8] - Comparar empresas
 =======================================
 '''
     print(impressao_menu)
@@ -41,6 +37,17 @@ def ler_opcao(mensagem):
             print('Por favor, apenas utilize números!')
             input('Pressione Enter para tentar novamente...')
 
+#Ler uma data no formato dd/mm/aaaa
+def ler_data(mensagem, obrigatoria=True):
+    while True:
+        valor = input(mensagem).strip()
+        if not valor and not obrigatoria:
+            return None
+        try:
+            return datetime.strptime(valor, '%d/%m/%Y')
+        except ValueError:
+            print('Data inválida. Use o formato dd/mm/aaaa.')
+
 #Verificar se o CNPJ é válido
 def validar_cnpj(cnpj):
     if len(cnpj) != 14:
@@ -48,28 +55,61 @@ def validar_cnpj(cnpj):
         return False
 
     try:
-        url = f'https://open.cnpja.com/office/{cnpj}'
-        
-        response = requests.get(url)
-        
-        if response.status_code == 200:
-            return response.json()
-        elif response.status_code == 404:
-            print('CNPJ não encontrado.')
-        else:
-            print(f'Erro na validação. Status: {response.status_code}')
-        
+        return obter_cliente().consultar(cnpj)
+    except CNPJNaoEncontrado:
+        print('CNPJ não encontrado.')
         return False
-    
-    except Exception as e:
-        print(f'Erro de conexão: {e}')
+    except ErroConsultaCNPJ as e:
+        print(e)
         return False
 
+#Selecionar uma empresa pelo diretório em memória, com busca por nome ou CNPJ e paginação
+def selecionar_empresa():
+    diretorio = obter_diretorio()
+
+    if not diretorio.total():
+        print('Nenhuma empresa cadastrada.')
+        return None
+
+    termo = input('\nBuscar empresa por nome ou CNPJ (Enter para listar todas): ')
+    pagina = 0
+
+    while True:
+        empresas, pagina, total_paginas, total = diretorio.pagina(termo, pagina)
+
+        if not empresas:
+            print('Nenhuma empresa encontrada.')
+            termo = input('Buscar empresa por nome ou CNPJ (Enter para listar todas): ')
+            continue
+
+        print(f'\n===== SELECIONE A EMPRESA (página {pagina + 1}/{total_paginas}, {total} encontradas) =====')
+        for i, empresa in enumerate(empresas, 1):
+            print(f'[{i}] {empresa[1]} (CNPJ: {empresa[0]})')
+        print('[P] Próxima página  [A] Página anterior  [B] Nova busca  [S] Sair')
+
+        escolha = input('Escolha o número da empresa: ').strip().upper()
+        if escolha == 'P':
+            pagina += 1
+        elif escolha == 'A':
+            pagina -= 1
+        elif escolha == 'B':
+            termo = input('Buscar empresa por nome ou CNPJ (Enter para listar todas): ')
+            pagina = 0
+        elif escolha == 'S':
+            return None
+        else:
+            try:
+                indice = int(escolha)
+                if 1 <= indice <= len(empresas):
+                    return empresas[indice-1]
+                print('Opção inválida. Tente novamente.')
+            except ValueError:
+                print('Por favor, digite um número válido.')
+
 #Função para criar um novo usuário, e salvá-lo no banco de dados
 def criar_usuario():
     try:
-        conexao = conectar_banco()
-        cursor = conexao.cursor()
+        sessao = abrir_sessao()
         
         print("\n===== CRIAR USUÁRIO =====")
 
@@ -79,8 +119,7 @@ def criar_usuario():
                 print("Username não pode conter espaços.")
                 continue
 
-            cursor.execute("SELECT username FROM users_ecoflux WHERE username = :1", [username])
-            if cursor.fetchone():
+            if sessao.usuarios.existe(username):
                 print("Username já existe. Escolha outro.")
                 continue
             break
@@ -101,22 +140,17 @@ def criar_usuario():
 
         email = input("Email: ")
 
-        cursor.execute('''
-            INSERT INTO users_ecoflux 
-            (username, senha, nome_completo, email) 
-            VALUES (:1, :2, :3, :4)
-        ''', (username, senha, nome_completo, email))
+        sessao.usuarios.criar(username, gerar_hash(senha), nome_completo, email)
         
-        conexao.commit()
+        sessao.commit()
         print("Usuário criado com sucesso!")
         return username
     
-    except oracledb.Error as erro:
+    except ErroBanco as erro:
         print(f"Erro ao criar usuário: {erro}")
         return None
     finally:
-        cursor.close()
-        conexao.close()
+        sessao.fechar()
 
 #Função de login, para verificar usuário e senha
 def login():
@@ -124,27 +158,20 @@ def login():
     senha = input("Senha: ")
     
     try:
-        conexao = conectar_banco()
-        cursor = conexao.cursor()
+        sessao = abrir_sessao()
         
-        cursor.execute("SELECT username FROM users_ecoflux WHERE username = :1 AND senha = :2", 
-                       [username, senha])
-        
-        usuario = cursor.fetchone()
-        
-        if usuario:
+        if autenticar(sessao, username, senha):
             print(f"Bem-vindo, {username}!")
             return username
         else:
             print("Usuário ou senha inválidos.")
             return None
     
-    except oracledb.Error as erro:
+    except ErroBanco as erro:
         print(f"Erro no login: {erro}")
         return None
     finally:
-        cursor.close()
-        conexao.close()
+        sessao.fechar()
 
 #Função para cadastrar uma nova empresa, usando o cnpj
 def cadastrar_empresa(usuario_logado):
@@ -163,30 +190,7 @@ def cadastrar_empresa(usuario_logado):
                 return
             continue
 
-        razao_social = dados_empresa.get('company', {}).get('name', 'Não informado')
-
-        nome_fantasia = dados_empresa.get('alias') or razao_social
-
-        setor = (
-            dados_empresa.get('mainActivity', {}).get('text') or 
-            dados_empresa.get('company', {}).get('mainActivity', {}).get('text') or 
-            'Não informado'
-        )
-
-        endereco_dados = dados_empresa.get('address', {})
-        endereco = f"{endereco_dados.get('street', '')} {endereco_dados.get('number', '')}".strip()
-
-        responsavel = dados_empresa.get('company', {}).get('members', [{}])[0].get('person', {}).get('name', 'Não informado')
-
-        contato = 'Não informado'
-        emails = dados_empresa.get('emails', [])
-        if emails:
-            contato = emails[0].get('address', 'Não informado')
-
-        if contato == 'Não informado':
-            telefones = dados_empresa.get('phones', [])
-            if telefones:
-                contato = f"({telefones[0].get('area', '')}) {telefones[0].get('number', '')}"
+        empresa = extrair_dados_empresa(dados_empresa)
 
         while True:
             try:
@@ -203,55 +207,40 @@ def cadastrar_empresa(usuario_logado):
                 print('Valor inválido. Digite um número.')
 
         try:
-            conexao = conectar_banco()
-            if not conexao:
+            sessao = abrir_sessao()
+            if not sessao:
                 print('Falha na conexão com o banco de dados.')
                 return
             
-            cursor = conexao.cursor()
-            
-            cursor.execute('''
-                INSERT INTO empresas 
-                (cnpj, razao_social, nome_fantasia, setor, 
-                 endereco, responsavel, contato, 
-                 num_funcionarios, area_total, usuario_cadastro)
-                VALUES (:1, :2, :3, :4, :5, :6, :7, :8, :9, :10)
-            ''', (
-                cnpj, razao_social, nome_fantasia, setor, 
-                endereco, responsavel, contato, 
+            sessao.empresas.inserir((
+                cnpj, empresa['razao_social'], empresa['nome_fantasia'], empresa['setor'], 
+                empresa['endereco'], empresa['responsavel'], empresa['contato'], 
                 num_funcionarios, area, usuario_logado
             ))
             
-            conexao.commit()
+            sessao.commit()
+            obter_diretorio().adicionar(cnpj, empresa['razao_social'])
             print('Empresa cadastrada com sucesso!')
             break
         
-        except oracledb.Error as erro:
+        except ErroBanco as erro:
             print(f'Erro ao cadastrar: {erro}')
             if input('Tentar novamente? (S/N): ').upper() != 'S':
                 break
         
         finally:
-            cursor.close()
-            conexao.close()
+            if sessao:
+                sessao.fechar()
 
 #Função de listar as empresas cadastradas
 def listar_empresas():
     try:
-        conexao = conectar_banco()
-        if not conexao:
+        sessao = abrir_sessao()
+        if not sessao:
             print('Falha na conexão com o banco de dados.')
             return
         
-        cursor = conexao.cursor()
-
-        cursor.execute('''
-            SELECT cnpj, razao_social, nome_fantasia, setor 
-            FROM empresas 
-            ORDER BY razao_social
-        ''')
-        
-        empresas = cursor.fetchall()
+        empresas = sessao.empresas.listar_detalhes()
         
         if not empresas:
             print('Nenhuma empresa cadastrada.')
@@ -266,13 +255,12 @@ def listar_empresas():
         
         print(f'\nTotal de empresas: {len(empresas)}')
     
-    except oracledb.Error as erro:
+    except ErroBanco as erro:
         print(f'Erro ao listar empresas: {erro}')
     
     finally:
-        if 'conexao' in locals():
-            cursor.close()
-            conexao.close()
+        if 'sessao' in locals() and sessao:
+            sessao.fechar()
         
         input('\nPressione Enter para continuar...')
 
@@ -283,40 +271,18 @@ def registrar_consumo(usuario_logado):
         return
 
     try:
-        conexao = conectar_banco()
-        if not conexao:
+        sessao = abrir_sessao()
+        if not sessao:
             print('Falha na conexão com o banco de dados.')
             return
-        
-        cursor = conexao.cursor()
 
-        cursor.execute('''
-            SELECT cnpj, razao_social 
-            FROM empresas 
-            ORDER BY razao_social
-        ''')
+        empresa = selecionar_empresa()
         
-        empresas = cursor.fetchall()
-        
-        if not empresas:
-            print('Nenhuma empresa cadastrada.')
+        if not empresa:
             input('Pressione Enter para continuar...')
             return
 
-        print('\n===== SELECIONE A EMPRESA =====')
-        for i, empresa in enumerate(empresas, 1):
-            print(f'[{i}] {empresa[1]} (CNPJ: {empresa[0]})')
-
-        while True:
-            try:
-                escolha = int(input('Escolha o número da empresa: '))
-                if 1 <= escolha <= len(empresas):
-                    cnpj_selecionado = empresas[escolha-1][0]
-                    break
-                else:
-                    print('Opção inválida. Tente novamente.')
-            except ValueError:
-                print('Por favor, digite um número válido.')
+        cnpj_selecionado = empresa[0]
 
         while True:
             try:
@@ -335,30 +301,30 @@ def registrar_consumo(usuario_logado):
         setor = input('Setor/Departamento: ') or 'Não especificado'
         observacoes = input('Observações (opcional): ') or 'Sem observações'
 
-        cursor.execute('''
-            INSERT INTO consumo_energetico 
-            (cnpj_empresa, data_registro, consumo_kwh, custo_total, setor, observacoes, usuario_registro)
-            VALUES (:1, SYSDATE, :2, :3, :4, :5, :6)
-        ''', (
+        gravada = sessao.consumo.inserir((
             cnpj_selecionado, 
+            None, 
             consumo_kwh, 
             custo_total, 
             setor, 
             observacoes,
             usuario_logado
         ))
+        anomalia = verificar_leitura(sessao, cnpj_selecionado, setor, gravada, consumo_kwh)
         
-        conexao.commit()
+        sessao.commit()
         print('Consumo registrado com sucesso!')
+        if anomalia:
+            print(f'Atenção: consumo fora do padrão do setor {setor} '
+                  f'(média {anomalia["media"]:.2f} kWh, desvio {anomalia["desvio"]:.2f} kWh, escore {anomalia["escore"]:.1f}).')
     
-    except oracledb.Error as erro:
+    except ErroBanco as erro:
         print(f'Erro ao registrar consumo: {erro}')
-        conexao.rollback()
+        sessao.rollback()
     
     finally:
-        if 'conexao' in locals():
-            cursor.close()
-            conexao.close()
+        if 'sessao' in locals() and sessao:
+            sessao.fechar()
         
         input('Pressione Enter para continuar...')
 
@@ -369,88 +335,204 @@ def analisar_consumo(usuario_logado):
         return
 
     try:
-        conexao = conectar_banco()
-        if not conexao:
+        sessao = abrir_sessao()
+        if not sessao:
             print('Falha na conexão com o banco de dados.')
             return
-        
-        cursor = conexao.cursor()
 
-        cursor.execute('''
-            SELECT cnpj, razao_social 
-            FROM empresas 
-            ORDER BY razao_social
-        ''')
-        
-        empresas = cursor.fetchall()
+        empresa = selecionar_empresa()
         
-        if not empresas:
-            print('Nenhuma empresa cadastrada.')
+        if not empresa:
             input('Pressione Enter para continuar...')
             return
 
-        print('\n===== SELECIONE A EMPRESA =====')
-        for i, empresa in enumerate(empresas, 1):
-            print(f'[{i}] {empresa[1]} (CNPJ: {empresa[0]})')
+        cnpj_selecionado = empresa[0]
 
-        while True:
-            try:
-                escolha = int(input('Escolha o número da empresa: '))
-                if 1 <= escolha <= len(empresas):
-                    cnpj_selecionado = empresas[escolha-1][0]
-                    break
-                else:
-                    print('Opção inválida. Tente novamente.')
-            except ValueError:
-                print('Por favor, digite um número válido.')
+        print('\nPeríodo da análise:')
+        print('[1] Últimos 6 meses')
+        print('[2] Escolher datas (totais consolidados)')
+        periodo = ler_opcao('Escolha uma opção: ')
 
-        cursor.execute('''
-            SELECT 
-                data_registro, 
-                consumo_kwh, 
-                custo_total,
-                setor
-            FROM consumo_energetico 
-            WHERE cnpj_empresa = :1 
-            AND data_registro >= ADD_MONTHS(SYSDATE, -6)
-            ORDER BY data_registro DESC
-        ''', [cnpj_selecionado])
-        
-        consumos = cursor.fetchall()
+        if periodo == 2:
+            inicio = ler_data('Data inicial (dd/mm/aaaa): ')
+            fim = ler_data('Data final (dd/mm/aaaa): ')
+            resumo = sessao.consumo.resumo_periodo(cnpj_selecionado, inicio, fim)
+        else:
+            resumo = sessao.consumo.resumo(cnpj_selecionado)
         
-        if not consumos:
-            print('Nenhum consumo registrado nos últimos 6 meses.')
+        if not resumo:
+            if periodo == 2:
+                print('Nenhum consumo registrado no período.')
+            else:
+                print('Nenhum consumo registrado nos últimos 6 meses.')
             input('Pressione Enter para continuar...')
             return
 
-        total_consumo = sum(consumo[1] for consumo in consumos)
-        media_consumo = total_consumo / len(consumos)
-        total_custo = sum(consumo[2] for consumo in consumos)
-        media_custo = total_custo / len(consumos)
+        geral = resumo['geral']
 
         print('\n===== ANÁLISE DE CONSUMO =====')
-        print(f'Total de registros: {len(consumos)}')
-        print(f'Consumo total: {total_consumo:.2f} kWh')
-        print(f'Média de consumo: {media_consumo:.2f} kWh')
-        print(f'Custo total: R$ {total_custo:.2f}')
-        print(f'Média de custo: R$ {media_custo:.2f}')
-
-        print('\nDetalhes dos Consumos:')
-        print(f'{"Data":<15} {"Consumo (kWh)":<20} {"Custo (R$)":<15} {"Setor":<20}')
-        print('-' * 70)
-        for consumo in consumos:
-            print(f'{consumo[0].strftime("%d/%m/%Y"):<15} {consumo[1]:<20.2f} {consumo[2]:<15.2f} {consumo[3]:<20}')
+        print(f'Total de registros: {geral["registros"]}')
+        print(f'Consumo total: {geral["consumo_total"]:.2f} kWh')
+        print(f'Média de consumo: {geral["media_consumo"]:.2f} kWh')
+        print(f'Menor/maior consumo: {geral["consumo_min"]:.2f} / {geral["consumo_max"]:.2f} kWh')
+        print(f'Custo total: R$ {geral["custo_total"]:.2f}')
+        print(f'Média de custo: R$ {geral["media_custo"]:.2f}')
+        print(f'Menor/maior custo: R$ {geral["custo_min"]:.2f} / R$ {geral["custo_max"]:.2f}')
+
+        print('\nConsumo por Setor:')
+        print(f'{"Setor":<30} {"Registros":<12} {"Consumo (kWh)":<20} {"Custo (R$)":<15}')
+        print('-' * 80)
+        for grupo in resumo['por_setor']:
+            print(f'{str(grupo["setor"]):<30} {grupo["registros"]:<12} {grupo["consumo_total"]:<20.2f} {grupo["custo_total"]:<15.2f}')
+
+        print('\nConsumo por Mês:')
+        print(f'{"Mês":<10} {"Registros":<12} {"Consumo (kWh)":<20} {"Custo (R$)":<15}')
+        print('-' * 60)
+        for grupo in resumo['por_mes']:
+            print(f'{grupo["mes"].strftime("%m/%Y"):<10} {grupo["registros"]:<12} {grupo["consumo_total"]:<20.2f} {grupo["custo_total"]:<15.2f}')
+
+        recentes = sessao.anomalias.listar(cnpj_selecionado, 10)
+        if recentes:
+            print('\nLeituras fora do padrão (mais recentes):')
+            print(f'{"Data":<18} {"Setor":<20} {"Consumo (kWh)":<16} {"Média (kWh)":<14} {"Escore":<8}')
+            print('-' * 80)
+            for _, setor, data_registro, consumo, escore, media, _ in recentes:
+                print(f'{data_registro.strftime("%d/%m/%Y %H:%M"):<18} {str(setor):<20} {consumo:<16.2f} {media:<14.2f} {escore:<8.1f}')
+
+        if input('\nDeseja ver os indicadores do período? (S/N): ').upper() == 'S':
+            if periodo == 2:
+                indicadores = indicadores_empresa(sessao, cnpj_selecionado, inicio, fim)
+            else:
+                indicadores = indicadores_empresa(sessao, cnpj_selecionado, meses=MESES_ANALISE)
+            mostrar_indicadores(indicadores)
+
+        if input('\nDeseja ver os detalhes dos consumos? (S/N): ').upper() == 'S':
+            setor = input('Filtrar por setor (Enter para todos): ').strip() or None
+            pagina = 0
+            apos = None
+            while True:
+                if periodo == 2:
+                    consumos, apos = sessao.consumo.historico(cnpj_selecionado, setor, inicio, fim, apos)
+                else:
+                    consumos, apos = sessao.consumo.historico(cnpj_selecionado, setor, apos=apos, meses=MESES_ANALISE)
+                if not consumos:
+                    print('Não há mais registros.')
+                    break
+
+                print(f'\nDetalhes dos Consumos (página {pagina + 1}):')
+                print(f'{"Data":<15} {"Consumo (kWh)":<20} {"Custo (R$)":<15} {"Setor":<20}')
+                print('-' * 70)
+                for consumo in consumos:
+                    print(f'{consumo[0].strftime("%d/%m/%Y"):<15} {consumo[1]:<20.2f} {consumo[2]:<15.2f} {consumo[3]:<20}')
+
+                if apos is None:
+                    break
+                if input('[Enter] próxima página / [S] sair: ').upper() == 'S':
+                    break
+                pagina += 1
     
-    except oracledb.Error as erro:
+    except ErroBanco as erro:
         print(f'Erro ao analisar consumo: {erro}')
     
     finally:
-        if 'conexao' in locals():
-            cursor.close()
-            conexao.close()
+        if 'sessao' in locals() and sessao:
+            sessao.fechar()
         
         input('\nPressione Enter para continuar...')
 
+#Mostra os indicadores calculados sobre a série de leituras
+def mostrar_indicadores(indicadores):
+    if not indicadores:
+        print('Nenhuma leitura no período.')
+        return
+
+    def valor(numero, formato='.2f'):
+        return '-' if numero is None else format(numero, formato)
+
+    print('\n===== INDICADORES =====')
+    print(f'Custo médio por kWh: R$ {valor(indicadores["custo_por_kwh"], ".4f")}')
+    print(f'kWh por funcionário: {valor(indicadores["kwh_por_funcionario"])}')
+    print(f'kWh por m²: {valor(indicadores["kwh_por_m2"])}')
+
+    movel = indicadores['media_movel']
+    if movel['consumo_kwh']:
+        print(f'Média móvel de {movel["janela_dias"]} dias (último dia): {valor(movel["consumo_kwh"][-1])} kWh/dia')
+
+    percentis = indicadores['percentis']
+    print('\nPercentis do consumo por leitura:')
+    print('  '.join(f'P{p}: {valor(v)} kWh' for p, v in zip(percentis['percentis'], percentis['consumo_kwh'])))
+
+    mensal = indicadores['mensal']
+    print('\nVariação mês a mês:')
+    print(f'{"Mês":<10} {"Consumo (kWh)":<16} {"Variação (kWh)":<16} {"Variação (%)":<14} {"R$/kWh":<10}')
+    print('-' * 70)
+    for posicao, mes in enumerate(mensal['meses']):
+        print(f'{mes[5:] + "/" + mes[:4]:<10} {valor(mensal["consumo_kwh"][posicao]):<16} {valor(mensal["variacao_kwh"][posicao]):<16} '
+              f'{valor(mensal["variacao_kwh_pct"][posicao]):<14} {valor(mensal["custo_por_kwh"][posicao], ".4f"):<10}')
+
+#Função para comparar todas as empresas por eficiência energética no período
+def comparar_empresas(usuario_logado):
+    if usuario_logado is None:
+        print("Erro: Usuário não autenticado. Faça login primeiro.")
+        return
+
+    try:
+        sessao = abrir_sessao()
+        if not sessao:
+            print('Falha na conexão com o banco de dados.')
+            return
+
+        print('\nPeríodo da comparação:')
+        print('[1] Últimos 12 meses')
+        print('[2] Escolher datas')
+        if ler_opcao('Escolha uma opção: ') == 2:
+            inicio = ler_data('Data inicial (dd/mm/aaaa): ')
+            fim = ler_data('Data final (dd/mm/aaaa): ')
+        else:
+            fim = datetime.now()
+            inicio = fim - timedelta(days=365)
+
+        cnpj = None
+        if input('Deseja ver a posição de uma empresa? (S/N): ').upper() == 'S':
+            empresa = selecionar_empresa()
+            cnpj = empresa[0] if empresa else None
+
+        ranking = montar_ranking(sessao.consumo.totais_empresas(inicio, fim), 5, cnpj)
+        if not ranking['empresas']:
+            print('Nenhuma empresa com consumo no período.')
+            return
+
+        print(f'\n===== COMPARAÇÃO ENTRE EMPRESAS ({ranking["empresas"]} com consumo no período) =====')
+        for metrica in ranking['metricas'].values():
+            geral = metrica['geral']
+            if not geral['empresas']:
+                continue
+            print(f'\n{metrica["descricao"]} - mediana: {geral["mediana"]:.4f}')
+            print(f'{"Mais eficientes":<45} {"Valor":<12}')
+            print('-' * 60)
+            for item in geral['melhores']:
+                print(f'{str(item["razao_social"])[:44]:<45} {item["valor"]:<12.4f}')
+            print(f'{"Menos eficientes":<45} {"Valor":<12}')
+            print('-' * 60)
+            for item in geral['piores']:
+                print(f'{str(item["razao_social"])[:44]:<45} {item["valor"]:<12.4f}')
+
+            posicao = metrica.get('empresa')
+            if posicao:
+                setor = ranking['empresa']['setor']
+                print(f'>> {ranking["empresa"]["razao_social"]}: {posicao["valor"]:.4f} - '
+                      f'{posicao["geral"]["posicao"]}º de {posicao["geral"]["de"]} no geral, '
+                      f'{posicao["setor"]["posicao"]}º de {posicao["setor"]["de"]} no setor {setor}')
+
+    except ErroBanco as erro:
+        print(f'Erro ao comparar empresas: {erro}')
+
+    finally:
+        if 'sessao' in locals() and sessao:
+            sessao.fechar()
+
+        input('\nPressione Enter para continuar...')
+
 #Função para gerar relatório em JSON do consumo
 def gerar_relatorio(usuario_logado):
     if usuario_logado is None:
@@ -458,89 +540,54 @@ def gerar_relatorio(usuario_logado):
         return
 
     try:
-        conexao = conectar_banco()
-        if not conexao:
+        sessao = abrir_sessao()
+        if not sessao:
             print('Falha na conexão com o banco de dados.')
             return
-        
-        cursor = conexao.cursor()
 
-        cursor.execute('''
-            SELECT cnpj, razao_social 
-            FROM empresas 
-            ORDER BY razao_social
-        ''')
-        
-        empresas = cursor.fetchall()
+        empresa = selecionar_empresa()
         
-        if not empresas:
-            print('Nenhuma empresa cadastrada.')
+        if not empresa:
             input('Pressione Enter para continuar...')
             return
 
-        print('\n===== SELECIONE A EMPRESA =====')
-        for i, empresa in enumerate(empresas, 1):
-            print(f'[{i}] {empresa[1]} (CNPJ: {empresa[0]})')
-
-        while True:
-            try:
-                escolha = int(input('Escolha o número da empresa: '))
-                if 1 <= escolha <= len(empresas):
-                    cnpj_selecionado = empresas[escolha-1][0]
-                    razao_social_selecionada = empresas[escolha-1][1]
-                    break
-                else:
-                    print('Opção inválida. Tente novamente.')
-            except ValueError:
-                print('Por favor, digite um número válido.')
+        cnpj_selecionado, razao_social_selecionada = empresa
+
+        print('\nFormato do relatório:')
+        print('[1] JSON formatado')
+        print('[2] JSON compacto')
+        print('[3] JSON-lines (um consumo por linha)')
+        print('[4] Resumo mensal por setor (totais consolidados)')
+        print('[5] CSV')
+        print('[6] JSON-lines compactado (gzip)')
+        print('[7] Colunar (Parquet, ou .npz sem o pyarrow)')
+        opcao_formato = ler_opcao('Escolha o formato: ')
+        formato = {2: 'json-compacto', 3: 'jsonl', 5: 'csv', 6: 'jsonl-gzip', 7: 'colunar'}.get(opcao_formato, 'json')
+
+        if opcao_formato == 4:
+            inicio = ler_data('Data inicial (dd/mm/aaaa, Enter para todo o histórico): ', obrigatoria=False)
+            fim = ler_data('Data final (dd/mm/aaaa, Enter para todo o histórico): ', obrigatoria=False)
+            nome_arquivo = nome_arquivo_relatorio(cnpj_selecionado, formato, sufixo='_mensal')
+            meses = sessao.consumo.iterar_resumo_mensal(cnpj_selecionado, inicio, fim)
+            total = escrever_relatorio(meses, cnpj_selecionado, razao_social_selecionada, nome_arquivo, formato, chave='meses')
+        else:
+            nome_arquivo = nome_arquivo_relatorio(cnpj_selecionado, formato)
+            consumos = sessao.consumo.iterar(cnpj_selecionado)
+            total = escrever_relatorio(consumos, cnpj_selecionado, razao_social_selecionada, nome_arquivo, formato)
 
-        cursor.execute('''
-            SELECT 
-                data_registro, 
-                consumo_kwh, 
-                custo_total,
-                setor,
-                observacoes
-            FROM consumo_energetico 
-            WHERE cnpj_empresa = :1 
-            ORDER BY data_registro DESC
-        ''', [cnpj_selecionado])
-        
-        consumos = cursor.fetchall()
-        
-        if not consumos:
+        if not total:
             print('Nenhum consumo registrado para esta empresa.')
             input('Pressione Enter para continuar...')
             return
 
-        relatorio = {
-            "cnpj": cnpj_selecionado,
-            "razao_social": razao_social_selecionada,
-            "consumos": [
-                {
-                    "data_registro": consumo[0].strftime("%Y-%m-%d"),
-                    "consumo_kwh": consumo[1],
-                    "custo_total": consumo[2],
-                    "setor": consumo[3],
-                    "observacoes": consumo[4]
-                } for consumo in consumos
-            ]
-        }
-
-        nome_arquivo = f"relatorio_{cnpj_selecionado}.json"
-
-        with open(nome_arquivo, 'w', encoding='utf-8') as arquivo:
-            json.dump(relatorio, arquivo, indent=4, ensure_ascii=False)
-        
         print(f"\nRelatório salvo com sucesso em '{nome_arquivo}'")
     
-    except oracledb.Error as erro:
+    except ErroBanco as erro:
         print(f'Erro ao gerar relatório: {erro}')
     
     finally:
-        if 'conexao' in locals():
-            cursor.close()
-            conexao.close()
+        if 'sessao' in locals() and sessao:
+            sessao.fechar()
         
         input('\nPressione Enter para continuar...')
 
@@ -617,9 +664,12 @@ def main():
             case 7:
                 print('Desconectando...')
                 break
+            case 8:
+                comparar_empresas(usuario_logado)
             case _:
                 print('Encerrando o programa...')
                 return
 
 #Executa o programa
-main()
\ No newline at end of file
+if __name__ == "__main__":
+    main()
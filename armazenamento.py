@@ -0,0 +1,1140 @@
+#Imports das funcionalidades a serem usadas
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+
+import oracledb
+
+import analise
+import anomalias
+import rollups
+from analise import montar_resumo
+from banco import conectar_banco, liberar_conexao
+from metricas import medido, medir
+from relatorio import TAMANHO_LOTE_PADRAO, iterar_consumos, iterar_consumos_novos
+
+#Camada de armazenamento: repositórios de usuários, empresas e consumo com uma implementação
+#para o Oracle e outra para um banco SQLite local. O backend é escolhido por ECOFLUX_BACKEND.
+
+BACKEND_PADRAO = os.environ.get('ECOFLUX_BACKEND', 'oracle')
+ARQUIVO_SQLITE = os.environ.get('ECOFLUX_SQLITE_ARQUIVO', 'ecoflux.db')
+
+#Linhas por lote ao carregar uma série inteira para análise
+SERIE_TAMANHO_LOTE = 50000
+
+#Erros de banco que as telas tratam, qualquer que seja o backend
+ErroBanco = (oracledb.Error, sqlite3.Error)
+
+# ===================== ORACLE =====================
+
+SQL_INSERIR_EMPRESA = '''
+    INSERT INTO empresas
+    (cnpj, razao_social, nome_fantasia, setor,
+     endereco, responsavel, contato,
+     num_funcionarios, area_total, usuario_cadastro)
+    VALUES (:1, :2, :3, :4, :5, :6, :7, :8, :9, :10)
+'''
+
+SQL_INSERIR_CONSUMO = '''
+    INSERT INTO consumo_energetico
+    (cnpj_empresa, data_registro, consumo_kwh, custo_total, setor, observacoes, usuario_registro)
+    VALUES (:1, NVL(:2, SYSDATE), :3, :4, :5, :6, :7)
+'''
+
+SQL_INSERIR_CONSUMO_ID = SQL_INSERIR_CONSUMO + '    RETURNING id_ingestao INTO :8\n'
+
+#A coluna senha precisa comportar o hash de senhas.py (cerca de 120 caracteres)
+DDL_SENHA = 'ALTER TABLE users_ecoflux MODIFY (senha VARCHAR2(255))'
+
+#Chaves de idempotência das leituras gravadas a partir do spool (spool.py), na mesma transação das leituras
+DDL_CHAVES_CONSUMO = '''
+    CREATE TABLE chaves_consumo (
+        chave VARCHAR2(32) PRIMARY KEY,
+        gravada_em DATE DEFAULT SYSDATE NOT NULL
+    )
+'''
+
+class UsuariosOracle:
+    def __init__(self, conexao):
+        self.conexao = conexao
+
+    @medido('sql.usuarios.existe')
+    def existe(self, username):
+        with self.conexao.cursor() as cursor:
+            cursor.execute("SELECT username FROM users_ecoflux WHERE username = :1", [username])
+            return cursor.fetchone() is not None
+
+    @medido('sql.usuarios.criar')
+    def criar(self, username, senha, nome_completo, email):
+        with self.conexao.cursor() as cursor:
+            cursor.execute('''
+                INSERT INTO users_ecoflux
+                (username, senha, nome_completo, email)
+                VALUES (:1, :2, :3, :4)
+            ''', (username, senha, nome_completo, email))
+
+    @medido('sql.usuarios.obter_senha')
+    def obter_senha(self, username):
+        with self.conexao.cursor() as cursor:
+            cursor.execute("SELECT senha FROM users_ecoflux WHERE username = :1", [username])
+            linha = cursor.fetchone()
+            return linha[0] if linha else None
+
+    @medido('sql.usuarios.atualizar_senha')
+    def atualizar_senha(self, username, nova, anterior):
+        with self.conexao.cursor() as cursor:
+            cursor.execute("UPDATE users_ecoflux SET senha = :1 WHERE username = :2 AND senha = :3",
+                           [nova, username, anterior])
+            return cursor.rowcount == 1
+
+class EmpresasOracle:
+    def __init__(self, conexao):
+        self.conexao = conexao
+
+    @medido('sql.empresas.listar')
+    def listar(self):
+        with self.conexao.cursor() as cursor:
+            cursor.arraysize = 5000
+            cursor.execute('''
+                SELECT cnpj, razao_social
+                FROM empresas
+            ''')
+            return cursor.fetchall()
+
+    @medido('sql.empresas.listar_detalhes')
+    def listar_detalhes(self):
+        with self.conexao.cursor() as cursor:
+            cursor.arraysize = 5000
+            cursor.execute('''
+                SELECT cnpj, razao_social, nome_fantasia, setor
+                FROM empresas
+                ORDER BY razao_social
+            ''')
+            return cursor.fetchall()
+
+    #(num_funcionarios, area_total) da empresa, ou None se não estiver cadastrada
+    @medido('sql.empresas.porte')
+    def porte(self, cnpj):
+        with self.conexao.cursor() as cursor:
+            cursor.execute("SELECT num_funcionarios, area_total FROM empresas WHERE cnpj = :1", [cnpj])
+            return cursor.fetchone()
+
+    @medido('sql.empresas.inserir')
+    def inserir(self, linha):
+        with self.conexao.cursor() as cursor:
+            cursor.execute(SQL_INSERIR_EMPRESA, linha)
+
+    #Insere várias empresas; devolve {posição: mensagem} das linhas rejeitadas
+    @medido('sql.empresas.inserir_lote')
+    def inserir_lote(self, linhas):
+        with self.conexao.cursor() as cursor:
+            cursor.executemany(SQL_INSERIR_EMPRESA, linhas, batcherrors=True)
+            return {erro.offset: erro.message for erro in cursor.getbatcherrors()}
+
+#Troca data_registro None pela data do banco, lida uma vez: a leitura e os rollups usam o mesmo instante
+def _com_data_banco(cursor, linhas):
+    if all(linha[1] is not None for linha in linhas):
+        return linhas
+    cursor.execute('SELECT SYSDATE FROM dual')
+    agora = cursor.fetchone()[0]
+    return [linha if linha[1] is not None else (linha[0], agora, *linha[2:]) for linha in linhas]
+
+class ConsumoOracle:
+    def __init__(self, conexao):
+        self.conexao = conexao
+
+    #Linha: (cnpj, data_registro ou None para a data do banco, kWh, custo, setor, observações, usuário).
+    #Devolve (id de gravação, data_registro gravada), usados por anomalias.verificar_leitura.
+    @medido('sql.consumo.inserir')
+    def inserir(self, linha):
+        with self.conexao.cursor() as cursor:
+            linha = _com_data_banco(cursor, [linha])[0]
+            id_leitura = cursor.var(oracledb.DB_TYPE_NUMBER)
+            cursor.setinputsizes(None, oracledb.DB_TYPE_DATE)
+            cursor.execute(SQL_INSERIR_CONSUMO_ID, [*linha, id_leitura])
+            rollups.atualizar_rollups(cursor, [linha[:5]])
+            return int(id_leitura.getvalue()[0]), linha[1]
+
+    #Insere um lote com executemany e atualiza os rollups; devolve {posição: mensagem} das linhas rejeitadas
+    @medido('sql.consumo.inserir_lote')
+    def inserir_lote(self, linhas):
+        with self.conexao.cursor() as cursor:
+            linhas = _com_data_banco(cursor, linhas)
+            cursor.setinputsizes(None, oracledb.DB_TYPE_DATE, None, None, None, None, None)
+            cursor.executemany(SQL_INSERIR_CONSUMO, linhas, batcherrors=True)
+            rejeitadas = {erro.offset: erro.message for erro in cursor.getbatcherrors()}
+            rollups.atualizar_rollups(cursor, (linha[:5] for posicao, linha in enumerate(linhas) if posicao not in rejeitadas))
+            return rejeitadas
+
+    #Quais destas chaves de idempotência já foram gravadas
+    @medido('sql.consumo.chaves_gravadas')
+    def chaves_gravadas(self, chaves):
+        if not chaves:
+            return set()
+        with self.conexao.cursor() as cursor:
+            marcadores = ', '.join(f':{posicao}' for posicao in range(1, len(chaves) + 1))
+            cursor.execute(f'SELECT chave FROM chaves_consumo WHERE chave IN ({marcadores})', list(chaves))
+            return {linha[0] for linha in cursor}
+
+    @medido('sql.consumo.gravar_chaves')
+    def gravar_chaves(self, chaves):
+        with self.conexao.cursor() as cursor:
+            cursor.executemany('INSERT INTO chaves_consumo (chave) VALUES (:1)', [(chave,) for chave in chaves])
+
+    @medido('sql.consumo.resumo')
+    def resumo(self, cnpj, meses=analise.MESES_ANALISE):
+        with self.conexao.cursor() as cursor:
+            return analise.resumo_consumo(cursor, cnpj, meses)
+
+    @medido('sql.consumo.resumo_periodo')
+    def resumo_periodo(self, cnpj, inicio, fim):
+        with self.conexao.cursor() as cursor:
+            return rollups.resumo_periodo(cursor, cnpj, inicio, fim)
+
+    #Página do histórico por chave; apos é a chave devolvida pela página anterior
+    @medido('sql.consumo.historico')
+    def historico(self, cnpj, setor=None, inicio=None, fim=None, apos=None, tamanho=analise.TAMANHO_PAGINA, meses=None):
+        with self.conexao.cursor() as cursor:
+            return analise.historico_consumos(cursor, cnpj, setor, inicio, fim, apos, tamanho, meses)
+
+    #(cnpj, razão social, setor, funcionários, área, registros, kWh, custo) de todas as empresas no período
+    @medido('sql.consumo.totais_empresas')
+    def totais_empresas(self, inicio, fim):
+        with self.conexao.cursor() as cursor:
+            yield from rollups.totais_empresas(cursor, inicio, fim)
+
+    #(cnpj, setor, índice do mês, kWh, custo) de todas as séries, do rollup mensal
+    @medido('sql.consumo.series_mensais')
+    def series_mensais(self, inicio, fim):
+        with self.conexao.cursor() as cursor:
+            yield from rollups.series_mensais(cursor, inicio, fim)
+
+    @medido('sql.consumo.impressao_rollups')
+    def impressao_rollups(self):
+        with self.conexao.cursor() as cursor:
+            return rollups.impressao_rollups(cursor)
+
+    @medido('sql.consumo.iterar')
+    def iterar(self, cnpj, tamanho_lote=TAMANHO_LOTE_PADRAO):
+        with self.conexao.cursor() as cursor:
+            yield from iterar_consumos(cursor, cnpj, tamanho_lote)
+
+    #Consumos gravados depois da marca d'água (id de gravação), na ordem de gravação, com o id de cada um
+    @medido('sql.consumo.iterar_novos')
+    def iterar_novos(self, cnpj, apos=None, tamanho_lote=TAMANHO_LOTE_PADRAO):
+        with self.conexao.cursor() as cursor:
+            yield from iterar_consumos_novos(cursor, cnpj, apos, tamanho_lote)
+
+    @medido('sql.consumo.iterar_resumo_mensal')
+    def iterar_resumo_mensal(self, cnpj, inicio=None, fim=None):
+        with self.conexao.cursor() as cursor:
+            yield from rollups.iterar_resumo_mensal(cursor, cnpj, inicio, fim)
+
+    #Série de leituras em lotes de tuplas (segundos desde 1970, kWh, custo), em ordem de data; só números, para carregar direto em arrays.
+    #Com meses, só as leituras dos últimos meses (o mesmo corte do resumo).
+    @medido('sql.consumo.lotes_serie')
+    def lotes_serie(self, cnpj, inicio=None, fim=None, tamanho_lote=SERIE_TAMANHO_LOTE, meses=None):
+        with self.conexao.cursor() as cursor:
+            cursor.arraysize = tamanho_lote
+            cursor.prefetchrows = tamanho_lote + 1
+            filtros = ''
+            parametros = {'cnpj': cnpj}
+            if meses:
+                filtros += ' AND data_registro >= ADD_MONTHS(SYSDATE, -:meses)'
+                parametros['meses'] = meses
+            if inicio:
+                filtros += ' AND data_registro >= :inicio'
+                parametros['inicio'] = inicio
+            if fim:
+                filtros += ' AND data_registro < :fim + 1'
+                parametros['fim'] = fim
+            cursor.execute(f'''
+                SELECT ROUND((data_registro - DATE '1970-01-01') * 86400), consumo_kwh, custo_total
+                FROM consumo_energetico
+                WHERE cnpj_empresa = :cnpj{filtros}
+                ORDER BY data_registro
+            ''', parametros)
+            while True:
+                lote = cursor.fetchmany()
+                if not lote:
+                    break
+                yield lote
+
+    @medido('sql.consumo.reconstruir_rollups')
+    def reconstruir_rollups(self, inicio=None, fim=None):
+        return rollups.reconstruir_rollups(self.conexao, inicio, fim)
+
+class AnomaliasOracle:
+    def __init__(self, conexao):
+        self.conexao = conexao
+
+    #Estado (cnpj, setor, leituras, média, variância, última leitura, último id varrido) de uma série, ou None.
+    #A linha fica travada até o fim da transação, para dois registros da mesma série não se sobreporem.
+    @medido('sql.anomalias.estado')
+    def estado(self, cnpj, setor):
+        with self.conexao.cursor() as cursor:
+            cursor.execute('''
+                SELECT cnpj_empresa, setor, leituras, media, variancia, ultima_leitura, ultimo_id
+                FROM estado_anomalias
+                WHERE cnpj_empresa = :1 AND setor = :2
+                FOR UPDATE
+            ''', [cnpj, setor])
+            return cursor.fetchone()
+
+    @medido('sql.anomalias.estados')
+    def estados(self, cnpj=None):
+        with self.conexao.cursor() as cursor:
+            cursor.arraysize = 5000
+            cursor.execute('''
+                SELECT cnpj_empresa, setor, leituras, media, variancia, ultima_leitura, ultimo_id
+                FROM estado_anomalias
+                WHERE :cnpj IS NULL OR cnpj_empresa = :cnpj
+            ''', {'cnpj': cnpj})
+            return cursor.fetchall()
+
+    @medido('sql.anomalias.salvar_estados')
+    def salvar_estados(self, linhas):
+        if not linhas:
+            return
+        with self.conexao.cursor() as cursor:
+            cursor.executemany('''
+                MERGE INTO estado_anomalias e
+                USING (
+                    SELECT :1 AS cnpj_empresa, :2 AS setor, :3 AS leituras, :4 AS media,
+                           :5 AS variancia, :6 AS ultima_leitura, :7 AS ultimo_id
+                    FROM dual
+                ) n
+                ON (e.cnpj_empresa = n.cnpj_empresa AND e.setor = n.setor)
+                WHEN MATCHED THEN UPDATE SET
+                    e.leituras = n.leituras, e.media = n.media, e.variancia = n.variancia,
+                    e.ultima_leitura = n.ultima_leitura, e.ultimo_id = n.ultimo_id
+                WHEN NOT MATCHED THEN INSERT
+                    (cnpj_empresa, setor, leituras, media, variancia, ultima_leitura, ultimo_id)
+                    VALUES (n.cnpj_empresa, n.setor, n.leituras, n.media, n.variancia, n.ultima_leitura, n.ultimo_id)
+            ''', linhas)
+
+    #Linhas: (cnpj, setor, data_registro, kWh, escore, média, desvio)
+    @medido('sql.anomalias.registrar')
+    def registrar(self, linhas):
+        if not linhas:
+            return
+        with self.conexao.cursor() as cursor:
+            cursor.executemany('''
+                INSERT INTO anomalias_consumo
+                (cnpj_empresa, setor, data_registro, consumo_kwh, escore, media, desvio)
+                VALUES (:1, :2, :3, :4, :5, :6, :7)
+            ''', linhas)
+
+    #Leituras gravadas depois do último id varrido de cada série, em lotes, ordenadas por série e data:
+    #(cnpj, setor, data_registro, kWh, id, 1 se já avaliada no registro). As gravadas há menos de
+    #'atraso' segundos ficam para a próxima varredura (ids de transações ainda abertas podem ser menores).
+    @medido('sql.anomalias.leituras_novas')
+    def leituras_novas(self, cnpj=None, atraso=0, tamanho_lote=SERIE_TAMANHO_LOTE):
+        with self.conexao.cursor() as cursor:
+            cursor.arraysize = tamanho_lote
+            cursor.prefetchrows = tamanho_lote + 1
+            cursor.execute('''
+                SELECT c.cnpj_empresa, c.setor, c.data_registro, c.consumo_kwh, c.id_ingestao,
+                       CASE WHEN a.id_leitura IS NULL THEN 0 ELSE 1 END
+                FROM consumo_energetico c
+                LEFT JOIN estado_anomalias e
+                    ON e.cnpj_empresa = c.cnpj_empresa AND e.setor = c.setor
+                LEFT JOIN leituras_avaliadas a
+                    ON a.id_leitura = c.id_ingestao
+                WHERE (e.ultimo_id IS NULL OR c.id_ingestao > e.ultimo_id)
+                AND c.gravada_em <= SYSTIMESTAMP - NUMTODSINTERVAL(:atraso, 'SECOND')
+                AND (:cnpj IS NULL OR c.cnpj_empresa = :cnpj)
+                ORDER BY c.cnpj_empresa, c.setor, c.data_registro, c.id_ingestao
+            ''', {'cnpj': cnpj, 'atraso': atraso})
+            while True:
+                lote = cursor.fetchmany()
+                if not lote:
+                    break
+                yield lote
+
+    @medido('sql.anomalias.marcar_avaliada')
+    def marcar_avaliada(self, id_leitura, cnpj, setor):
+        with self.conexao.cursor() as cursor:
+            cursor.execute('INSERT INTO leituras_avaliadas (id_leitura, cnpj_empresa, setor) VALUES (:1, :2, :3)',
+                           [id_leitura, cnpj, setor])
+
+    #Remove as marcas das leituras pelas quais a varredura já passou
+    @medido('sql.anomalias.limpar_avaliadas')
+    def limpar_avaliadas(self, cnpj=None):
+        with self.conexao.cursor() as cursor:
+            cursor.execute('''
+                DELETE FROM leituras_avaliadas a
+                WHERE (:cnpj IS NULL OR a.cnpj_empresa = :cnpj)
+                AND EXISTS (
+                    SELECT 1 FROM estado_anomalias e
+                    WHERE e.cnpj_empresa = a.cnpj_empresa AND e.setor = a.setor AND a.id_leitura <= e.ultimo_id
+                )
+            ''', {'cnpj': cnpj})
+
+    #Anomalias mais recentes de uma empresa
+    @medido('sql.anomalias.listar')
+    def listar(self, cnpj, limite=20):
+        with self.conexao.cursor() as cursor:
+            cursor.execute('''
+                SELECT cnpj_empresa, setor, data_registro, consumo_kwh, escore, media, desvio
+                FROM anomalias_consumo
+                WHERE cnpj_empresa = :1
+                ORDER BY data_registro DESC
+                FETCH FIRST :2 ROWS ONLY
+            ''', [cnpj, limite])
+            return cursor.fetchall()
+
+class SessaoOracle:
+    def __init__(self, conexao):
+        self.conexao = conexao
+        self.usuarios = UsuariosOracle(conexao)
+        self.empresas = EmpresasOracle(conexao)
+        self.consumo = ConsumoOracle(conexao)
+        self.anomalias = AnomaliasOracle(conexao)
+
+    @medido('banco.commit')
+    def commit(self):
+        self.conexao.commit()
+
+    def rollback(self):
+        self.conexao.rollback()
+
+    def fechar(self):
+        liberar_conexao(self.conexao)
+
+class BackendOracle:
+    nome = 'oracle'
+
+    def abrir_sessao(self):
+        conexao = conectar_banco()
+        return SessaoOracle(conexao) if conexao else None
+
+    def criar_estrutura(self):
+        conexao = conectar_banco()
+        if not conexao:
+            raise RuntimeError('Falha na conexão com o banco de dados.')
+        try:
+            rollups.criar_tabelas(conexao)
+            with conexao.cursor() as cursor:
+                for ddl in anomalias.DDL_INGESTAO + anomalias.DDL_ANOMALIAS:
+                    cursor.execute(ddl)
+                cursor.execute(DDL_CHAVES_CONSUMO)
+                cursor.execute(DDL_SENHA)
+        finally:
+            liberar_conexao(conexao)
+
+    def fechar(self):
+        pass
+
+# ===================== SQLITE =====================
+
+DDL_SQLITE = '''
+    CREATE TABLE IF NOT EXISTS users_ecoflux (
+        username TEXT PRIMARY KEY,
+        senha TEXT NOT NULL,
+        nome_completo TEXT,
+        email TEXT
+    );
+    CREATE TABLE IF NOT EXISTS empresas (
+        cnpj TEXT PRIMARY KEY,
+        razao_social TEXT,
+        nome_fantasia TEXT,
+        setor TEXT,
+        endereco TEXT,
+        responsavel TEXT,
+        contato TEXT,
+        num_funcionarios INTEGER,
+        area_total REAL,
+        usuario_cadastro TEXT
+    );
+    CREATE TABLE IF NOT EXISTS consumo_energetico (
+        id_consumo INTEGER PRIMARY KEY,
+        cnpj_empresa TEXT NOT NULL REFERENCES empresas(cnpj),
+        data_registro TEXT NOT NULL,
+        consumo_kwh REAL NOT NULL,
+        custo_total REAL NOT NULL,
+        setor TEXT NOT NULL,
+        observacoes TEXT,
+        usuario_registro TEXT
+    );
+    CREATE INDEX IF NOT EXISTS idx_consumo_empresa_data ON consumo_energetico (cnpj_empresa, data_registro);
+    CREATE INDEX IF NOT EXISTS idx_consumo_empresa_setor_data ON consumo_energetico (cnpj_empresa, setor, data_registro);
+    CREATE INDEX IF NOT EXISTS idx_consumo_data ON consumo_energetico (data_registro);
+    CREATE INDEX IF NOT EXISTS idx_consumo_serie_id ON consumo_energetico (cnpj_empresa, setor, id_consumo);
+    CREATE INDEX IF NOT EXISTS idx_consumo_empresa_id ON consumo_energetico (cnpj_empresa, id_consumo);
+    CREATE TABLE IF NOT EXISTS consumo_diario (
+        cnpj_empresa TEXT NOT NULL,
+        dia TEXT NOT NULL,
+        setor TEXT NOT NULL,
+        registros INTEGER NOT NULL,
+        consumo_kwh REAL NOT NULL,
+        custo_total REAL NOT NULL,
+        consumo_min REAL,
+        consumo_max REAL,
+        custo_min REAL,
+        custo_max REAL,
+        PRIMARY KEY (cnpj_empresa, dia, setor)
+    ) WITHOUT ROWID;
+    CREATE TABLE IF NOT EXISTS consumo_mensal (
+        cnpj_empresa TEXT NOT NULL,
+        mes TEXT NOT NULL,
+        setor TEXT NOT NULL,
+        registros INTEGER NOT NULL,
+        consumo_kwh REAL NOT NULL,
+        custo_total REAL NOT NULL,
+        consumo_min REAL,
+        consumo_max REAL,
+        custo_min REAL,
+        custo_max REAL,
+        PRIMARY KEY (cnpj_empresa, mes, setor)
+    ) WITHOUT ROWID;
+    CREATE TABLE IF NOT EXISTS estado_anomalias (
+        cnpj_empresa TEXT NOT NULL,
+        setor TEXT NOT NULL,
+        leituras INTEGER NOT NULL,
+        media REAL NOT NULL,
+        variancia REAL NOT NULL,
+        ultima_leitura TEXT NOT NULL,
+        ultimo_id INTEGER,
+        PRIMARY KEY (cnpj_empresa, setor)
+    ) WITHOUT ROWID;
+    CREATE TABLE IF NOT EXISTS leituras_avaliadas (
+        id_leitura INTEGER PRIMARY KEY,
+        cnpj_empresa TEXT NOT NULL,
+        setor TEXT NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS anomalias_consumo (
+        cnpj_empresa TEXT NOT NULL,
+        setor TEXT NOT NULL,
+        data_registro TEXT NOT NULL,
+        consumo_kwh REAL NOT NULL,
+        escore REAL NOT NULL,
+        media REAL NOT NULL,
+        desvio REAL NOT NULL,
+        detectada_em TEXT NOT NULL DEFAULT (datetime('now', 'localtime'))
+    );
+    CREATE INDEX IF NOT EXISTS idx_anomalias_empresa_data ON anomalias_consumo (cnpj_empresa, data_registro);
+    CREATE TABLE IF NOT EXISTS chaves_consumo (
+        chave TEXT PRIMARY KEY,
+        gravada_em TEXT NOT NULL
+    ) WITHOUT ROWID;
+'''
+
+_SQLITE_INSERIR_EMPRESA = '''
+    INSERT INTO empresas
+    (cnpj, razao_social, nome_fantasia, setor,
+     endereco, responsavel, contato,
+     num_funcionarios, area_total, usuario_cadastro)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+'''
+
+_SQLITE_INSERIR_CONSUMO = '''
+    INSERT INTO consumo_energetico
+    (cnpj_empresa, data_registro, consumo_kwh, custo_total, setor, observacoes, usuario_registro)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+'''
+
+_SQLITE_UPSERT_ROLLUP = '''
+    INSERT INTO {tabela}
+    (cnpj_empresa, {coluna}, setor, registros, consumo_kwh, custo_total,
+     consumo_min, consumo_max, custo_min, custo_max)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT (cnpj_empresa, {coluna}, setor) DO UPDATE SET
+        registros = registros + excluded.registros,
+        consumo_kwh = consumo_kwh + excluded.consumo_kwh,
+        custo_total = custo_total + excluded.custo_total,
+        consumo_min = MIN(consumo_min, excluded.consumo_min),
+        consumo_max = MAX(consumo_max, excluded.consumo_max),
+        custo_min = MIN(custo_min, excluded.custo_min),
+        custo_max = MAX(custo_max, excluded.custo_max)
+'''
+
+_SQLITE_UPSERT_DIARIO = _SQLITE_UPSERT_ROLLUP.format(tabela='consumo_diario', coluna='dia')
+_SQLITE_UPSERT_MENSAL = _SQLITE_UPSERT_ROLLUP.format(tabela='consumo_mensal', coluna='mes')
+
+_FORMATO_DATA = '%Y-%m-%d %H:%M:%S'
+
+def _texto_data(valor):
+    return valor.strftime(_FORMATO_DATA)
+
+def _ler_data(texto):
+    return datetime.fromisoformat(texto)
+
+#Data de n meses atrás, como o ADD_MONTHS do Oracle
+def _menos_meses(data, meses):
+    total = data.year * 12 + data.month - 1 - meses
+    ano, mes = divmod(total, 12)
+    mes += 1
+    proximo = datetime(ano + (mes == 12), mes % 12 + 1, 1)
+    ultimo_dia = (proximo - datetime(ano, mes, 1)).days
+    return data.replace(year=ano, month=mes, day=min(data.day, ultimo_dia))
+
+#Mesma consulta de resumo do Oracle, com as três agregações unidas por UNION ALL
+_SQLITE_RESUMO = '''
+    SELECT 1, 1, NULL, NULL, {agregados} FROM {origem}
+    UNION ALL
+    SELECT 0, 1, setor, NULL, {agregados} FROM {origem} GROUP BY setor
+    UNION ALL
+    SELECT 1, 0, NULL, {mes}, {agregados} FROM {origem} GROUP BY {mes}
+'''
+
+class UsuariosSQLite:
+    def __init__(self, conexao):
+        self.conexao = conexao
+
+    @medido('sql.usuarios.existe')
+    def existe(self, username):
+        return self.conexao.execute("SELECT 1 FROM users_ecoflux WHERE username = ?", [username]).fetchone() is not None
+
+    @medido('sql.usuarios.criar')
+    def criar(self, username, senha, nome_completo, email):
+        self.conexao.execute('''
+            INSERT INTO users_ecoflux
+            (username, senha, nome_completo, email)
+            VALUES (?, ?, ?, ?)
+        ''', (username, senha, nome_completo, email))
+
+    @medido('sql.usuarios.obter_senha')
+    def obter_senha(self, username):
+        linha = self.conexao.execute("SELECT senha FROM users_ecoflux WHERE username = ?", [username]).fetchone()
+        return linha[0] if linha else None
+
+    @medido('sql.usuarios.atualizar_senha')
+    def atualizar_senha(self, username, nova, anterior):
+        cursor = self.conexao.execute("UPDATE users_ecoflux SET senha = ? WHERE username = ? AND senha = ?",
+                                      [nova, username, anterior])
+        return cursor.rowcount == 1
+
+class EmpresasSQLite:
+    def __init__(self, conexao):
+        self.conexao = conexao
+
+    @medido('sql.empresas.listar')
+    def listar(self):
+        return self.conexao.execute("SELECT cnpj, razao_social FROM empresas").fetchall()
+
+    @medido('sql.empresas.listar_detalhes')
+    def listar_detalhes(self):
+        return self.conexao.execute('''
+            SELECT cnpj, razao_social, nome_fantasia, setor
+            FROM empresas
+            ORDER BY razao_social
+        ''').fetchall()
+
+    @medido('sql.empresas.porte')
+    def porte(self, cnpj):
+        return self.conexao.execute("SELECT num_funcionarios, area_total FROM empresas WHERE cnpj = ?", [cnpj]).fetchone()
+
+    @medido('sql.empresas.inserir')
+    def inserir(self, linha):
+        self.conexao.execute(_SQLITE_INSERIR_EMPRESA, linha)
+
+    @medido('sql.empresas.inserir_lote')
+    def inserir_lote(self, linhas):
+        return _inserir_lote_sqlite(self.conexao, _SQLITE_INSERIR_EMPRESA, linhas)
+
+#executemany dentro de um savepoint; se alguma linha falhar, refaz linha a linha para separar as rejeitadas
+def _inserir_lote_sqlite(conexao, sql, linhas):
+    if not conexao.in_transaction:
+        conexao.execute('BEGIN')
+    conexao.execute('SAVEPOINT lote')
+    try:
+        conexao.executemany(sql, linhas)
+        conexao.execute('RELEASE lote')
+        return {}
+    except sqlite3.Error:
+        conexao.execute('ROLLBACK TO lote')
+
+    rejeitadas = {}
+    for posicao, linha in enumerate(linhas):
+        try:
+            conexao.execute(sql, linha)
+        except sqlite3.Error as erro:
+            rejeitadas[posicao] = str(erro)
+    conexao.execute('RELEASE lote')
+    return rejeitadas
+
+class ConsumoSQLite:
+    _AGREGADOS = '''COUNT(*), SUM(consumo_kwh), AVG(consumo_kwh), MIN(consumo_kwh), MAX(consumo_kwh),
+                    SUM(custo_total), AVG(custo_total), MIN(custo_total), MAX(custo_total)'''
+    _AGREGADOS_ROLLUP = '''SUM(registros), SUM(consumo_kwh), SUM(consumo_kwh) / SUM(registros),
+                           MIN(consumo_min), MAX(consumo_max),
+                           SUM(custo_total), SUM(custo_total) / SUM(registros),
+                           MIN(custo_min), MAX(custo_max)'''
+
+    def __init__(self, conexao):
+        self.conexao = conexao
+
+    @medido('sql.consumo.inserir')
+    def inserir(self, linha):
+        data_registro = _ler_data(_texto_data(linha[1] or datetime.now()))
+        cursor = self.conexao.execute(_SQLITE_INSERIR_CONSUMO, (linha[0], _texto_data(data_registro), *linha[2:]))
+        self._atualizar_rollups([(linha[0], data_registro, linha[2], linha[3], linha[4])])
+        return cursor.lastrowid, data_registro
+
+    @medido('sql.consumo.inserir_lote')
+    def inserir_lote(self, linhas):
+        agora = _texto_data(datetime.now())
+        linhas = [
+            (linha[0], _texto_data(linha[1]) if linha[1] else agora, *linha[2:])
+            for linha in linhas
+        ]
+        rejeitadas = _inserir_lote_sqlite(self.conexao, _SQLITE_INSERIR_CONSUMO, linhas)
+        aceitas = [
+            (linha[0], _ler_data(linha[1]), linha[2], linha[3], linha[4])
+            for posicao, linha in enumerate(linhas) if posicao not in rejeitadas
+        ]
+        self._atualizar_rollups(aceitas)
+        return rejeitadas
+
+    @medido('sql.consumo.chaves_gravadas')
+    def chaves_gravadas(self, chaves):
+        if not chaves:
+            return set()
+        marcadores = ', '.join('?' * len(chaves))
+        return {linha[0] for linha in self.conexao.execute(f'SELECT chave FROM chaves_consumo WHERE chave IN ({marcadores})', list(chaves))}
+
+    @medido('sql.consumo.gravar_chaves')
+    def gravar_chaves(self, chaves):
+        if not self.conexao.in_transaction:
+            self.conexao.execute('BEGIN')
+        self.conexao.executemany("INSERT INTO chaves_consumo (chave, gravada_em) VALUES (?, datetime('now', 'localtime'))", [(chave,) for chave in chaves])
+
+    def _atualizar_rollups(self, leituras):
+        if not leituras:
+            return
+        for sql, mensal, formato in ((_SQLITE_UPSERT_DIARIO, False, '%Y-%m-%d'), (_SQLITE_UPSERT_MENSAL, True, '%Y-%m-01')):
+            grupos = rollups._agrupar(leituras, mensal)
+            self.conexao.executemany(sql, [(grupo[0], grupo[1].strftime(formato), *grupo[2:]) for grupo in grupos])
+
+    def _resumo(self, origem, agregados, mes, parametros):
+        sql = _SQLITE_RESUMO.format(origem=origem, agregados=agregados, mes=mes)
+        linhas = []
+        for linha in self.conexao.execute(sql, parametros * 3):
+            linha = list(linha)
+            if linha[3]:
+                linha[3] = _ler_data(linha[3])
+            linhas.append(linha)
+        return montar_resumo(linhas)
+
+    @medido('sql.consumo.resumo')
+    def resumo(self, cnpj, meses=analise.MESES_ANALISE):
+        limite = _texto_data(_menos_meses(datetime.now(), meses))
+        origem = '(SELECT * FROM consumo_energetico WHERE cnpj_empresa = ? AND data_registro >= ?)'
+        return self._resumo(origem, self._AGREGADOS, "substr(data_registro, 1, 7) || '-01'", [cnpj, limite])
+
+    @medido('sql.consumo.resumo_periodo')
+    def resumo_periodo(self, cnpj, inicio, fim):
+        fim_exclusivo = datetime.fromordinal(fim.toordinal() + 1)
+        origem = '(SELECT * FROM consumo_diario WHERE cnpj_empresa = ? AND dia >= ? AND dia < ?)'
+        parametros = [cnpj, inicio.strftime('%Y-%m-%d'), fim_exclusivo.strftime('%Y-%m-%d')]
+        return self._resumo(origem, self._AGREGADOS_ROLLUP, "substr(dia, 1, 7) || '-01'", parametros)
+
+    @medido('sql.consumo.historico')
+    def historico(self, cnpj, setor=None, inicio=None, fim=None, apos=None, tamanho=analise.TAMANHO_PAGINA, meses=None):
+        filtros = ''
+        parametros = [cnpj]
+        if meses:
+            filtros += ' AND data_registro >= ?'
+            parametros.append(_texto_data(_menos_meses(datetime.now(), meses)))
+        if setor:
+            filtros += ' AND setor = ?'
+            parametros.append(setor)
+        if inicio:
+            filtros += ' AND data_registro >= ?'
+            parametros.append(_texto_data(inicio))
+        if fim:
+            filtros += ' AND data_registro < ?'
+            parametros.append(_texto_data(datetime.fromordinal(fim.toordinal() + 1)))
+        if apos:
+            filtros += ' AND (data_registro, id_consumo) < (?, ?)'
+            parametros += [_texto_data(apos[0]), int(apos[1])]
+        linhas = self.conexao.execute(f'''
+            SELECT data_registro, consumo_kwh, custo_total, setor, observacoes, id_consumo
+            FROM consumo_energetico
+            WHERE cnpj_empresa = ?{filtros}
+            ORDER BY data_registro DESC, id_consumo DESC
+            LIMIT ?
+        ''', parametros + [tamanho + 1]).fetchall()
+
+        proxima = None
+        if len(linhas) > tamanho:
+            linhas = linhas[:tamanho]
+            proxima = (_ler_data(linhas[-1][0]), str(linhas[-1][5]))
+        return [(_ler_data(linha[0]), *linha[1:5]) for linha in linhas], proxima
+
+    @medido('sql.consumo.totais_empresas')
+    def totais_empresas(self, inicio, fim):
+        fim_exclusivo = datetime.fromordinal(fim.toordinal() + 1)
+        cursor = self.conexao.execute('''
+            SELECT e.cnpj, e.razao_social, e.setor, e.num_funcionarios, e.area_total,
+                   t.registros, t.consumo_kwh, t.custo_total
+            FROM (
+                SELECT cnpj_empresa, SUM(registros) AS registros,
+                       SUM(consumo_kwh) AS consumo_kwh, SUM(custo_total) AS custo_total
+                FROM consumo_diario
+                WHERE dia >= ? AND dia < ?
+                GROUP BY cnpj_empresa
+            ) t
+            JOIN empresas e ON e.cnpj = t.cnpj_empresa
+        ''', [inicio.strftime('%Y-%m-%d'), fim_exclusivo.strftime('%Y-%m-%d')])
+        try:
+            yield from cursor
+        finally:
+            cursor.close()
+
+    @medido('sql.consumo.series_mensais')
+    def series_mensais(self, inicio, fim):
+        cursor = self.conexao.execute('''
+            SELECT cnpj_empresa, setor,
+                   CAST(substr(mes, 1, 4) AS INTEGER) * 12 + CAST(substr(mes, 6, 2) AS INTEGER) - 1,
+                   consumo_kwh, custo_total
+            FROM consumo_mensal
+            WHERE mes >= ? AND mes < ?
+            ORDER BY cnpj_empresa, setor, mes
+        ''', [inicio.strftime('%Y-%m-%d'), fim.strftime('%Y-%m-%d')])
+        try:
+            yield from cursor
+        finally:
+            cursor.close()
+
+    @medido('sql.consumo.impressao_rollups')
+    def impressao_rollups(self):
+        return self.conexao.execute('SELECT COUNT(*), SUM(registros), SUM(consumo_kwh) FROM consumo_mensal').fetchone()
+
+    @medido('sql.consumo.iterar')
+    def iterar(self, cnpj, tamanho_lote=TAMANHO_LOTE_PADRAO):
+        cursor = self.conexao.execute('''
+            SELECT data_registro, consumo_kwh, custo_total, setor, observacoes
+            FROM consumo_energetico
+            WHERE cnpj_empresa = ?
+            ORDER BY data_registro DESC
+        ''', [cnpj])
+        cursor.arraysize = tamanho_lote
+        try:
+            while True:
+                consumos = cursor.fetchmany()
+                if not consumos:
+                    break
+                for consumo in consumos:
+                    yield {
+                        "data_registro": consumo[0][:10],
+                        "consumo_kwh": consumo[1],
+                        "custo_total": consumo[2],
+                        "setor": consumo[3],
+                        "observacoes": consumo[4]
+                    }
+        finally:
+            cursor.close()
+
+    @medido('sql.consumo.iterar_novos')
+    def iterar_novos(self, cnpj, apos=None, tamanho_lote=TAMANHO_LOTE_PADRAO):
+        cursor = self.conexao.execute('''
+            SELECT data_registro, consumo_kwh, custo_total, setor, observacoes, id_consumo
+            FROM consumo_energetico
+            WHERE cnpj_empresa = ? AND id_consumo > ?
+            ORDER BY id_consumo
+        ''', [cnpj, apos or 0])
+        cursor.arraysize = tamanho_lote
+        try:
+            while True:
+                consumos = cursor.fetchmany()
+                if not consumos:
+                    break
+                for consumo in consumos:
+                    yield consumo[5], {
+                        "data_registro": consumo[0][:10],
+                        "consumo_kwh": consumo[1],
+                        "custo_total": consumo[2],
+                        "setor": consumo[3],
+                        "observacoes": consumo[4]
+                    }
+        finally:
+            cursor.close()
+
+    @medido('sql.consumo.iterar_resumo_mensal')
+    def iterar_resumo_mensal(self, cnpj, inicio=None, fim=None):
+        inicio, fim = rollups._meses_inteiros(inicio, fim)
+        cursor = self.conexao.execute('''
+            SELECT mes, setor, registros, consumo_kwh, custo_total,
+                   consumo_min, consumo_max, custo_min, custo_max
+            FROM consumo_mensal
+            WHERE cnpj_empresa = ? AND mes >= ? AND mes < ?
+            ORDER BY mes DESC, setor
+        ''', [cnpj, inicio.strftime('%Y-%m-%d') if inicio else '', fim.strftime('%Y-%m-%d') if fim else '9999'])
+        try:
+            for linha in cursor:
+                yield {
+                    "mes": linha[0][:7],
+                    "setor": linha[1],
+                    "registros": linha[2],
+                    "consumo_kwh": linha[3],
+                    "custo_total": linha[4],
+                    "consumo_min": linha[5],
+                    "consumo_max": linha[6],
+                    "custo_min": linha[7],
+                    "custo_max": linha[8]
+                }
+        finally:
+            cursor.close()
+
+    @medido('sql.consumo.lotes_serie')
+    def lotes_serie(self, cnpj, inicio=None, fim=None, tamanho_lote=SERIE_TAMANHO_LOTE, meses=None):
+        fim_exclusivo = datetime.fromordinal(fim.toordinal() + 1) if fim else None
+        if meses:
+            corte = _menos_meses(datetime.now(), meses)
+            inicio = max(inicio, corte) if inicio else corte
+        cursor = self.conexao.execute('''
+            SELECT CAST(strftime('%s', data_registro) AS INTEGER), consumo_kwh, custo_total
+            FROM consumo_energetico
+            WHERE cnpj_empresa = ? AND data_registro >= ? AND data_registro < ?
+            ORDER BY data_registro
+        ''', [cnpj, _texto_data(inicio) if inicio else '', _texto_data(fim_exclusivo) if fim_exclusivo else '9999'])
+        try:
+            while True:
+                lote = cursor.fetchmany(tamanho_lote)
+                if not lote:
+                    break
+                yield lote
+        finally:
+            cursor.close()
+
+    @medido('sql.consumo.reconstruir_rollups')
+    def reconstruir_rollups(self, inicio=None, fim=None):
+        inicio, fim = rollups._meses_inteiros(inicio, fim)
+        inicio = inicio.strftime('%Y-%m-%d') if inicio else ''
+        fim = fim.strftime('%Y-%m-%d') if fim else '9999'
+        self.conexao.execute('DELETE FROM consumo_mensal WHERE mes >= ? AND mes < ?', [inicio, fim])
+        self.conexao.execute('DELETE FROM consumo_diario WHERE dia >= ? AND dia < ?', [inicio, fim])
+        dias = self.conexao.execute('''
+            INSERT INTO consumo_diario
+            (cnpj_empresa, dia, setor, registros, consumo_kwh, custo_total,
+             consumo_min, consumo_max, custo_min, custo_max)
+            SELECT cnpj_empresa, substr(data_registro, 1, 10), setor, COUNT(*),
+                   SUM(consumo_kwh), SUM(custo_total),
+                   MIN(consumo_kwh), MAX(consumo_kwh), MIN(custo_total), MAX(custo_total)
+            FROM consumo_energetico
+            WHERE data_registro >= ? AND data_registro < ?
+            GROUP BY cnpj_empresa, substr(data_registro, 1, 10), setor
+        ''', [inicio, fim]).rowcount
+        meses = self.conexao.execute('''
+            INSERT INTO consumo_mensal
+            (cnpj_empresa, mes, setor, registros, consumo_kwh, custo_total,
+             consumo_min, consumo_max, custo_min, custo_max)
+            SELECT cnpj_empresa, substr(dia, 1, 7) || '-01', setor, SUM(registros),
+                   SUM(consumo_kwh), SUM(custo_total),
+                   MIN(consumo_min), MAX(consumo_max), MIN(custo_min), MAX(custo_max)
+            FROM consumo_diario
+            WHERE dia >= ? AND dia < ?
+            GROUP BY cnpj_empresa, substr(dia, 1, 7), setor
+        ''', [inicio, fim]).rowcount
+        self.conexao.commit()
+        return dias, meses
+
+class AnomaliasSQLite:
+    def __init__(self, conexao):
+        self.conexao = conexao
+
+    @medido('sql.anomalias.estado')
+    def estado(self, cnpj, setor):
+        linha = self.conexao.execute('''
+            SELECT cnpj_empresa, setor, leituras, media, variancia, ultima_leitura, ultimo_id
+            FROM estado_anomalias
+            WHERE cnpj_empresa = ? AND setor = ?
+        ''', [cnpj, setor]).fetchone()
+        return (*linha[:5], _ler_data(linha[5]), linha[6]) if linha else None
+
+    @medido('sql.anomalias.estados')
+    def estados(self, cnpj=None):
+        cursor = self.conexao.execute('''
+            SELECT cnpj_empresa, setor, leituras, media, variancia, ultima_leitura, ultimo_id
+            FROM estado_anomalias
+            WHERE ? IS NULL OR cnpj_empresa = ?
+        ''', [cnpj, cnpj])
+        return [(*linha[:5], _ler_data(linha[5]), linha[6]) for linha in cursor]
+
+    @medido('sql.anomalias.salvar_estados')
+    def salvar_estados(self, linhas):
+        self.conexao.executemany('''
+            INSERT INTO estado_anomalias
+            (cnpj_empresa, setor, leituras, media, variancia, ultima_leitura, ultimo_id)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (cnpj_empresa, setor) DO UPDATE SET
+                leituras = excluded.leituras, media = excluded.media, variancia = excluded.variancia,
+                ultima_leitura = excluded.ultima_leitura, ultimo_id = excluded.ultimo_id
+        ''', [(*linha[:5], _texto_data(linha[5]), linha[6]) for linha in linhas])
+
+    @medido('sql.anomalias.registrar')
+    def registrar(self, linhas):
+        self.conexao.executemany('''
+            INSERT INTO anomalias_consumo
+            (cnpj_empresa, setor, data_registro, consumo_kwh, escore, media, desvio)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', [(*linha[:2], _texto_data(linha[2]), *linha[3:]) for linha in linhas])
+
+    #Gravações no SQLite são serializadas, então não há id menor pendente e o atraso não se aplica
+    @medido('sql.anomalias.leituras_novas')
+    def leituras_novas(self, cnpj=None, atraso=0, tamanho_lote=SERIE_TAMANHO_LOTE):
+        cursor = self.conexao.execute('''
+            SELECT c.cnpj_empresa, c.setor, c.data_registro, c.consumo_kwh, c.id_consumo,
+                   a.id_leitura IS NOT NULL
+            FROM consumo_energetico c
+            LEFT JOIN estado_anomalias e
+                ON e.cnpj_empresa = c.cnpj_empresa AND e.setor = c.setor
+            LEFT JOIN leituras_avaliadas a
+                ON a.id_leitura = c.id_consumo
+            WHERE (e.ultimo_id IS NULL OR c.id_consumo > e.ultimo_id)
+            AND (? IS NULL OR c.cnpj_empresa = ?)
+            ORDER BY c.cnpj_empresa, c.setor, c.data_registro, c.id_consumo
+        ''', [cnpj, cnpj])
+        try:
+            while True:
+                lote = cursor.fetchmany(tamanho_lote)
+                if not lote:
+                    break
+                yield [(linha[0], linha[1], _ler_data(linha[2]), *linha[3:]) for linha in lote]
+        finally:
+            cursor.close()
+
+    @medido('sql.anomalias.marcar_avaliada')
+    def marcar_avaliada(self, id_leitura, cnpj, setor):
+        self.conexao.execute('INSERT INTO leituras_avaliadas (id_leitura, cnpj_empresa, setor) VALUES (?, ?, ?)',
+                             [id_leitura, cnpj, setor])
+
+    @medido('sql.anomalias.limpar_avaliadas')
+    def limpar_avaliadas(self, cnpj=None):
+        self.conexao.execute('''
+            DELETE FROM leituras_avaliadas
+            WHERE (? IS NULL OR cnpj_empresa = ?)
+            AND id_leitura <= (
+                SELECT e.ultimo_id FROM estado_anomalias e
+                WHERE e.cnpj_empresa = leituras_avaliadas.cnpj_empresa AND e.setor = leituras_avaliadas.setor
+            )
+        ''', [cnpj, cnpj])
+
+    @medido('sql.anomalias.listar')
+    def listar(self, cnpj, limite=20):
+        cursor = self.conexao.execute('''
+            SELECT cnpj_empresa, setor, data_registro, consumo_kwh, escore, media, desvio
+            FROM anomalias_consumo
+            WHERE cnpj_empresa = ?
+            ORDER BY data_registro DESC
+            LIMIT ?
+        ''', [cnpj, limite])
+        return [(*linha[:2], _ler_data(linha[2]), *linha[3:]) for linha in cursor]
+
+class SessaoSQLite:
+    def __init__(self, conexao, local=None):
+        self.conexao = conexao
+        self._local = local if local is not None else threading.local()
+        self._local.sessoes = getattr(self._local, 'sessoes', 0) + 1
+        self._aberta = True
+        self.usuarios = UsuariosSQLite(conexao)
+        self.empresas = EmpresasSQLite(conexao)
+        self.consumo = ConsumoSQLite(conexao)
+        self.anomalias = AnomaliasSQLite(conexao)
+
+    @medido('banco.commit')
+    def commit(self):
+        self.conexao.commit()
+
+    def rollback(self):
+        self.conexao.rollback()
+
+    #A conexão fica com a thread para reaproveitar o cache de comandos preparados, então uma sessão pode ser
+    #aberta dentro de outra (diretorio.carregar_empresas dentro de uma operação, por exemplo): só a última a
+    #fechar desfaz o que não foi confirmado, para não descartar as gravações pendentes da sessão de fora
+    def fechar(self):
+        if not self._aberta:
+            return
+        self._aberta = False
+        self._local.sessoes -= 1
+        if not self._local.sessoes and self.conexao.in_transaction:
+            self.conexao.rollback()
+
+class BackendSQLite:
+    nome = 'sqlite'
+
+    def __init__(self, caminho=ARQUIVO_SQLITE):
+        self.caminho = caminho
+        self._local = threading.local()
+        self._conexoes = []
+        self._trava = threading.Lock()
+        self.criar_estrutura()
+
+    def _conexao(self):
+        conexao = getattr(self._local, 'conexao', None)
+        if conexao is None:
+            with medir('banco.conectar'):
+                conexao = sqlite3.connect(self.caminho, timeout=30, cached_statements=512, check_same_thread=False)
+                conexao.execute('PRAGMA journal_mode = WAL')
+                conexao.execute('PRAGMA synchronous = NORMAL')
+                conexao.execute('PRAGMA foreign_keys = ON')
+                conexao.execute('PRAGMA temp_store = MEMORY')
+            self._local.conexao = conexao
+            with self._trava:
+                self._conexoes.append(conexao)
+        return conexao
+
+    def abrir_sessao(self):
+        return SessaoSQLite(self._conexao(), self._local)
+
+    def criar_estrutura(self):
+        conexao = self._conexao()
+        conexao.executescript(DDL_SQLITE)
+        conexao.commit()
+
+    def fechar(self):
+        with self._trava:
+            conexoes, self._conexoes = self._conexoes, []
+        for conexao in conexoes:
+            conexao.close()
+        self._local = threading.local()
+
+_backend_padrao = None
+_trava_backend = threading.Lock()
+
+#Cria o backend pelo nome ('oracle' ou 'sqlite')
+def criar_backend(nome=BACKEND_PADRAO, **opcoes):
+    if nome == 'sqlite':
+        return BackendSQLite(**opcoes)
+    if nome == 'oracle':
+        return BackendOracle()
+    raise ValueError(f'Backend desconhecido: {nome}')
+
+#Retorna o backend compartilhado pelo processo
+def obter_backend():
+    global _backend_padrao
+    with _trava_backend:
+        if _backend_padrao is None:
+            _backend_padrao = criar_backend()
+        return _backend_padrao
+
+#Troca o backend compartilhado (ex.: um SQLite local para testes e benchmarks)
+def definir_backend(backend):
+    global _backend_padrao
+    with _trava_backend:
+        anterior, _backend_padrao = _backend_padrao, backend
+    if anterior is not None and anterior is not backend:
+        anterior.fechar()
+
+#Abre uma sessão no backend compartilhado; devolve None se não for possível conectar
+def abrir_sessao():
+    try:
+        return obter_backend().abrir_sessao()
+    except ErroBanco as e:
+        print(f'Erro de conexão: {e}')
+        return None
+
+#Uso: with sessao() as s: ...  (a sessão é devolvida ao final; o que não foi confirmado é desfeito)
+@contextmanager
+def sessao():
+    aberta = abrir_sessao()
+    if aberta is None:
+        raise RuntimeError('Falha na conexão com o banco de dados.')
+    try:
+        yield aberta
+    finally:
+        aberta.fechar()
@@ -0,0 +1,189 @@
+#Imports das funcionalidades a serem usadas
+import os
+import threading
+import time
+
+import oracledb
+
+from metricas import medir
+
+#Configurações de conexão com o Oracle (podem ser sobrescritas por variáveis de ambiente)
+#Se desejar testar o sistema, crie as tabelas e utilize seu próprio banco de dados oracle
+CONFIG_BANCO = {
+    'user': os.environ.get('ECOFLUX_DB_USER', ''),
+    'password': os.environ.get('ECOFLUX_DB_PASSWORD', ''),
+    'dsn': os.environ.get('ECOFLUX_DB_DSN', ''),
+}
+
+#Configurações do pool de conexões
+CONFIG_POOL = {
+    'min': int(os.environ.get('ECOFLUX_POOL_MIN', 1)),
+    'max': int(os.environ.get('ECOFLUX_POOL_MAX', 4)),
+    'increment': int(os.environ.get('ECOFLUX_POOL_INCREMENT', 1)),
+    'ping_interval': int(os.environ.get('ECOFLUX_POOL_PING_INTERVAL', 60)),
+    'timeout_aquisicao': int(os.environ.get('ECOFLUX_POOL_TIMEOUT', 10)),
+}
+
+#Métricas de uso do pool (tempo para adquirir e tempo que a sessão ficou emprestada)
+class MetricasPool:
+    def __init__(self):
+        self._trava = threading.Lock()
+        self.aquisicoes = 0
+        self.liberacoes = 0
+        self.falhas = 0
+        self.tempo_aquisicao_total = 0.0
+        self.tempo_aquisicao_max = 0.0
+        self.tempo_emprestimo_total = 0.0
+        self.tempo_emprestimo_max = 0.0
+
+    def registrar_aquisicao(self, duracao):
+        with self._trava:
+            self.aquisicoes += 1
+            self.tempo_aquisicao_total += duracao
+            self.tempo_aquisicao_max = max(self.tempo_aquisicao_max, duracao)
+
+    def registrar_liberacao(self, duracao):
+        with self._trava:
+            self.liberacoes += 1
+            self.tempo_emprestimo_total += duracao
+            self.tempo_emprestimo_max = max(self.tempo_emprestimo_max, duracao)
+
+    def registrar_falha(self):
+        with self._trava:
+            self.falhas += 1
+
+    def resumo(self):
+        with self._trava:
+            return {
+                'aquisicoes': self.aquisicoes,
+                'liberacoes': self.liberacoes,
+                'falhas': self.falhas,
+                'aquisicao_media_ms': (self.tempo_aquisicao_total / self.aquisicoes * 1000) if self.aquisicoes else 0.0,
+                'aquisicao_max_ms': self.tempo_aquisicao_max * 1000,
+                'emprestimo_medio_ms': (self.tempo_emprestimo_total / self.liberacoes * 1000) if self.liberacoes else 0.0,
+                'emprestimo_max_ms': self.tempo_emprestimo_max * 1000,
+            }
+
+#Pool de conexões: empresta sessões já autenticadas em vez de abrir uma nova a cada operação.
+#A fábrica do pool pode ser trocada (ex.: por um banco local de testes) desde que devolva
+#um objeto com acquire(), release(conexao) e close(), como o pool do oracledb.
+class PoolConexoes:
+    def __init__(self, config_banco=None, config_pool=None, fabrica_pool=None):
+        self.config_banco = dict(CONFIG_BANCO if config_banco is None else config_banco)
+        self.config_pool = dict(CONFIG_POOL)
+        self.config_pool.update(config_pool or {})
+        self.fabrica_pool = fabrica_pool or oracledb.create_pool
+        self.metricas = MetricasPool()
+        self._pool = None
+        self._emprestimos = {}
+        self._trava = threading.Lock()
+
+    def _criar_pool(self):
+        if self.fabrica_pool is oracledb.create_pool:
+            return oracledb.create_pool(
+                **self.config_banco,
+                min=self.config_pool['min'],
+                max=self.config_pool['max'],
+                increment=self.config_pool['increment'],
+                ping_interval=self.config_pool['ping_interval'],
+                getmode=oracledb.POOL_GETMODE_TIMEDWAIT,
+                wait_timeout=self.config_pool['timeout_aquisicao'] * 1000,
+            )
+        return self.fabrica_pool(**self.config_banco, **self.config_pool)
+
+    def _obter_pool(self):
+        with self._trava:
+            if self._pool is None:
+                self._pool = self._criar_pool()
+            return self._pool
+
+    #Empresta uma sessão do pool, verificando se ela ainda está viva
+    def adquirir(self):
+        inicio = time.perf_counter()
+        try:
+            conexao = self._obter_pool().acquire()
+        except Exception:
+            self.metricas.registrar_falha()
+            raise
+        self.metricas.registrar_aquisicao(time.perf_counter() - inicio)
+        with self._trava:
+            self._emprestimos[id(conexao)] = time.perf_counter()
+        return conexao
+
+    #Devolve a sessão ao pool; sessões quebradas são descartadas
+    def liberar(self, conexao):
+        if conexao is None:
+            return
+        with self._trava:
+            inicio = self._emprestimos.pop(id(conexao), None)
+        if inicio is not None:
+            self.metricas.registrar_liberacao(time.perf_counter() - inicio)
+        pool = self._pool
+        if pool is None:
+            conexao.close()
+            return
+        try:
+            pool.release(conexao)
+        except Exception:
+            self.metricas.registrar_falha()
+            try:
+                pool.drop(conexao)
+            except Exception:
+                pass
+
+    #Verifica se o banco responde usando uma sessão emprestada
+    def verificar_saude(self):
+        conexao = None
+        try:
+            conexao = self.adquirir()
+            conexao.ping()
+            return True
+        except Exception:
+            return False
+        finally:
+            self.liberar(conexao)
+
+    def estatisticas(self):
+        dados = self.metricas.resumo()
+        pool = self._pool
+        if pool is not None:
+            dados['abertas'] = getattr(pool, 'opened', None)
+            dados['ocupadas'] = getattr(pool, 'busy', None)
+        return dados
+
+    def fechar(self):
+        with self._trava:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.close()
+
+_pool_padrao = None
+_trava_pool = threading.Lock()
+
+#Retorna o pool compartilhado pelo processo, criando-o na primeira chamada
+def obter_pool():
+    global _pool_padrao
+    with _trava_pool:
+        if _pool_padrao is None:
+            _pool_padrao = PoolConexoes()
+        return _pool_padrao
+
+#Troca o pool compartilhado (usado para apontar para outro banco, ex.: um banco local de testes)
+def definir_pool(pool):
+    global _pool_padrao
+    with _trava_pool:
+        anterior, _pool_padrao = _pool_padrao, pool
+    if anterior is not None and anterior is not pool:
+        anterior.fechar()
+
+#Empresta uma conexão do pool compartilhado
+def conectar_banco():
+    try:
+        with medir('banco.conectar'):
+            return obter_pool().adquirir()
+    except oracledb.Error as e:
+        print(f'Erro de conexão: {e}')
+
+#Devolve uma conexão ao pool compartilhado
+def liberar_conexao(conexao):
+    obter_pool().liberar(conexao)
@@ -0,0 +1,260 @@
+#Imports das funcionalidades a serem usadas
+import argparse
+import json
+import os
+import platform
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+
+import operacoes
+from armazenamento import BackendSQLite, definir_backend, sessao
+from diretorio import DiretorioEmpresas, carregar_empresas, definir_diretorio
+from senhas import autenticar, cache_verificacoes, gerar_hash
+
+#Benchmarks dos caminhos usados pelo app (login, listagem de empresas, registro de consumo,
+#análise de 6 meses e relatório completo) sobre um banco SQLite local com dados sintéticos.
+#O resultado é gravado em JSON e pode ser comparado com uma execução anterior (baseline).
+
+ESCALAS = {
+    'pequena': 10_000,
+    'media': 1_000_000,
+    'grande': 10_000_000,
+}
+
+SETORES_EMPRESA = ('Comércio varejista', 'Indústria de transformação', 'Serviços de escritório',
+                   'Hospitais', 'Supermercados', 'Educação', 'Logística', 'Hotelaria')
+SETORES_CONSUMO = ('Produção', 'Administrativo', 'Climatização', 'Iluminação', 'TI', 'Não especificado')
+
+SENHA_BENCHMARK = 'senha-benchmark'
+LOTE_GERACAO = 50_000
+
+def _cnpj(numero):
+    return f'{numero:014d}'
+
+#Usuários com a mesma senha (um único hash calculado, para a geração não ser dominada pelo scrypt)
+def gerar_usuarios(quantidade):
+    senha = gerar_hash(SENHA_BENCHMARK)
+    return [(f'usuario{numero}', senha, f'Usuário {numero}', f'usuario{numero}@ecoflux.test') for numero in range(quantidade)]
+
+def gerar_empresas(quantidade, semente=42):
+    gerador = np.random.default_rng(semente)
+    funcionarios = gerador.integers(5, 2000, quantidade).tolist()
+    areas = np.round(gerador.uniform(80, 20_000, quantidade), 1).tolist()
+    setores = gerador.integers(0, len(SETORES_EMPRESA), quantidade).tolist()
+    return [
+        (_cnpj(numero), f'Empresa Sintética {numero}', f'Sintética {numero}', SETORES_EMPRESA[setores[numero]],
+         'Rua dos Testes, 100', 'Responsável Teste', 'contato@ecoflux.test',
+         funcionarios[numero], areas[numero], 'benchmark')
+        for numero in range(quantidade)
+    ]
+
+#Leituras em lotes, distribuídas nos últimos anos; a empresa 0 é a que mais tem leituras
+#(distribuição desigual entre empresas, como na vida real)
+def gerar_leituras(total, empresas, anos=3, semente=42, lote=LOTE_GERACAO):
+    gerador = np.random.default_rng(semente + 1)
+    fim = datetime.now().replace(microsecond=0)
+    janela = int(timedelta(days=365 * anos).total_seconds())
+    inicio = fim - timedelta(seconds=janela)
+    gerados = 0
+    while gerados < total:
+        tamanho = min(lote, total - gerados)
+        indices = np.minimum((gerador.pareto(1.2, tamanho) * empresas / 20).astype(np.int64), empresas - 1)
+        segundos = gerador.integers(0, janela, tamanho).tolist()
+        kwh = np.round(gerador.gamma(3.0, 40.0, tamanho), 3)
+        custo = np.round(kwh * gerador.normal(0.82, 0.06, tamanho), 2)
+        setores = gerador.integers(0, len(SETORES_CONSUMO), tamanho).tolist()
+        yield [
+            (_cnpj(indice), inicio + timedelta(seconds=segundo), valor_kwh, valor_custo,
+             SETORES_CONSUMO[setor], 'Leitura sintética', 'benchmark')
+            for indice, segundo, valor_kwh, valor_custo, setor
+            in zip(indices.tolist(), segundos, kwh.tolist(), custo.tolist(), setores)
+        ]
+        gerados += tamanho
+
+#Cria o banco sintético: usuários, empresas e leituras (com rollups), pelo mesmo caminho de gravação do app
+def popular(leituras, empresas, usuarios, anos=3, semente=42, mostrar=True):
+    inicio = time.perf_counter()
+    with sessao() as aberta:
+        for linha in gerar_usuarios(usuarios):
+            aberta.usuarios.criar(*linha)
+        aberta.empresas.inserir_lote(gerar_empresas(empresas, semente))
+        aberta.commit()
+
+        gravadas = 0
+        for lote in gerar_leituras(leituras, empresas, anos, semente):
+            aberta.consumo.inserir_lote(lote)
+            aberta.commit()
+            gravadas += len(lote)
+            if mostrar:
+                decorrido = time.perf_counter() - inicio
+                sys.stderr.write(f'\rGerando dados: {gravadas}/{leituras} leituras ({gravadas / decorrido:.0f}/s)')
+                sys.stderr.flush()
+    if mostrar:
+        sys.stderr.write('\n')
+    return time.perf_counter() - inicio
+
+#Executa a função várias vezes e resume os tempos
+def _medir(funcao, repeticoes, aquecimento=1):
+    for _ in range(aquecimento):
+        funcao()
+    tempos = []
+    linhas = 0
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        resultado = funcao()
+        tempos.append(time.perf_counter() - inicio)
+        if isinstance(resultado, int):
+            linhas += resultado
+    tempos.sort()
+    return {
+        'repeticoes': repeticoes,
+        'mediana_ms': round(statistics.median(tempos) * 1000, 3),
+        'p95_ms': round(tempos[min(len(tempos) - 1, int(len(tempos) * 0.95))] * 1000, 3),
+        'min_ms': round(tempos[0] * 1000, 3),
+        'linhas_por_execucao': linhas // repeticoes if linhas else None,
+    }
+
+#Cenários: cada um devolve uma função sem argumentos a ser medida
+def cenarios(diretorio_saida, semente=42):
+    empresa_principal = _cnpj(0)
+    contador = iter(range(10 ** 9))
+
+    def login():
+        cache_verificacoes.remover('usuario0')
+        with sessao() as aberta:
+            autenticar(aberta, 'usuario0', SENHA_BENCHMARK)
+
+    def login_em_cache():
+        with sessao() as aberta:
+            autenticar(aberta, 'usuario0', SENHA_BENCHMARK)
+
+    def listagem_empresas():
+        diretorio = DiretorioEmpresas(carregar_empresas)
+        return len(diretorio.pagina('', 0)[0]) and diretorio.total()
+
+    def busca_empresas():
+        return len(diretorio_compartilhado.buscar('Sintética 12'))
+
+    def insercao_unitaria():
+        with sessao() as aberta:
+            aberta.consumo.inserir((empresa_principal, None, 120.5, 98.2, 'Produção', 'Benchmark', 'benchmark'))
+            aberta.commit()
+
+    def insercao_lote():
+        lote = next(gerar_leituras(1000, 50, 1, semente + next(contador), 1000))
+        with sessao() as aberta:
+            aberta.consumo.inserir_lote(lote)
+            aberta.commit()
+        return len(lote)
+
+    def analise_seis_meses():
+        with sessao() as aberta:
+            resumo = aberta.consumo.resumo(empresa_principal, 6)
+        return resumo['geral']['registros'] if resumo else 0
+
+    def relatorio_completo():
+        return operacoes.gerar_relatorio(empresa_principal, 'json', diretorio_saida)['registros']
+
+    diretorio_compartilhado = DiretorioEmpresas(carregar_empresas)
+    definir_diretorio(diretorio_compartilhado)
+    return {
+        'login': (login, 5),
+        'login_em_cache': (login_em_cache, 200),
+        'listagem_empresas': (listagem_empresas, 10),
+        'busca_empresas': (busca_empresas, 200),
+        'insercao_unitaria': (insercao_unitaria, 200),
+        'insercao_lote_1000': (insercao_lote, 10),
+        'analise_seis_meses': (analise_seis_meses, 20),
+        'relatorio_completo': (relatorio_completo, 3),
+    }
+
+#Compara com a baseline; devolve a lista de cenários mais lentos que a tolerância
+def comparar(resultado, baseline, tolerancia):
+    if baseline.get('parametros') != resultado['parametros']:
+        print('Aviso: a baseline foi gerada com outros parâmetros; a comparação pode não ser justa.', file=sys.stderr)
+
+    regressoes = []
+    print(f'\n{"Cenário":<22} {"Baseline ms":>12} {"Atual ms":>10} {"Variação":>10}')
+    print('-' * 58)
+    for nome, atual in resultado['cenarios'].items():
+        anterior = baseline.get('cenarios', {}).get(nome)
+        if not anterior:
+            print(f'{nome:<22} {"-":>12} {atual["mediana_ms"]:>10.2f} {"novo":>10}')
+            continue
+        variacao = atual['mediana_ms'] / anterior['mediana_ms'] - 1 if anterior['mediana_ms'] else 0.0
+        marcador = '  <-- regressão' if variacao > tolerancia else ''
+        print(f'{nome:<22} {anterior["mediana_ms"]:>12.2f} {atual["mediana_ms"]:>10.2f} {variacao * 100:>9.1f}%{marcador}')
+        if variacao > tolerancia:
+            regressoes.append(nome)
+    return regressoes
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmarks do Ecoflux sobre um banco SQLite com dados sintéticos.')
+    parser.add_argument('--escala', choices=sorted(ESCALAS), default='pequena', help='Quantidade de leituras geradas')
+    parser.add_argument('--leituras', type=int, help='Quantidade exata de leituras (substitui --escala)')
+    parser.add_argument('--empresas', type=int, help='Empresas geradas (padrão: uma para cada 1000 leituras, de 10 a 10 mil)')
+    parser.add_argument('--usuarios', type=int, default=100)
+    parser.add_argument('--anos', type=int, default=3, help='Anos de histórico das leituras')
+    parser.add_argument('--semente', type=int, default=42)
+    parser.add_argument('--banco', help='Arquivo SQLite; se já existir é reaproveitado (padrão: banco temporário)')
+    parser.add_argument('--cenarios', nargs='+', help='Executa só estes cenários')
+    parser.add_argument('--saida', help='Grava o resultado em JSON')
+    parser.add_argument('--baseline', help='JSON de uma execução anterior para comparar')
+    parser.add_argument('--tolerancia', type=float, default=0.2, help='Piora relativa aceita antes de acusar regressão')
+    args = parser.parse_args(argv)
+
+    leituras = args.leituras or ESCALAS[args.escala]
+    empresas = args.empresas or min(10_000, max(10, leituras // 1000))
+    parametros = {'leituras': leituras, 'empresas': empresas, 'usuarios': args.usuarios, 'anos': args.anos, 'semente': args.semente}
+
+    with tempfile.TemporaryDirectory(prefix='ecoflux-benchmark-') as temporario:
+        caminho = args.banco or os.path.join(temporario, 'benchmark.db')
+        existente = os.path.exists(caminho)
+        definir_backend(BackendSQLite(caminho))
+
+        geracao = None
+        if not existente:
+            geracao = popular(leituras, empresas, args.usuarios, args.anos, args.semente)
+
+        resultado = {
+            'versao': 1,
+            'data': datetime.now().isoformat(timespec='seconds'),
+            'parametros': parametros,
+            'ambiente': {
+                'python': platform.python_version(),
+                'sqlite': sqlite3.sqlite_version,
+                'plataforma': platform.platform(),
+            },
+            'geracao_s': round(geracao, 3) if geracao is not None else None,
+            'cenarios': {},
+        }
+
+        for nome, (funcao, repeticoes) in cenarios(temporario, args.semente).items():
+            if args.cenarios and nome not in args.cenarios:
+                continue
+            resultado['cenarios'][nome] = _medir(funcao, repeticoes)
+            medicao = resultado['cenarios'][nome]
+            print(f'{nome:<22} mediana {medicao["mediana_ms"]:>10.2f} ms   p95 {medicao["p95_ms"]:>10.2f} ms')
+
+        definir_backend(None)
+
+    if args.saida:
+        with open(args.saida, 'w', encoding='utf-8') as arquivo:
+            json.dump(resultado, arquivo, ensure_ascii=False, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as arquivo:
+            regressoes = comparar(resultado, json.load(arquivo), args.tolerancia)
+        if regressoes:
+            print(f'\nRegressões: {", ".join(regressoes)}', file=sys.stderr)
+            return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
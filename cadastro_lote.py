@@ -0,0 +1,145 @@
+#Imports das funcionalidades a serem usadas
+import argparse
+import csv
+import json
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from armazenamento import ErroBanco, abrir_sessao
+from cnpj import ErroConsultaCNPJ, extrair_dados_empresa, obter_cliente
+from diretorio import obter_diretorio
+
+CONSULTAS_SIMULTANEAS = 8
+TAMANHO_LOTE_PADRAO = 500
+
+#Lê o arquivo de entrada: CSV com colunas cnpj, num_funcionarios e area_total, ou JSON-lines com as mesmas chaves
+def ler_entradas(caminho):
+    with open(caminho, 'r', encoding='utf-8', newline='') as arquivo:
+        if caminho.endswith(('.jsonl', '.ndjson', '.json')):
+            registros = (json.loads(linha) for linha in arquivo if linha.strip())
+        else:
+            amostra = arquivo.read(4096)
+            arquivo.seek(0)
+            delimitador = ';' if amostra.count(';') > amostra.count(',') else ','
+            registros = csv.DictReader(arquivo, delimiter=delimitador)
+
+        for registro in registros:
+            cnpj = ''.join(c for c in str(registro.get('cnpj', '')) if c.isdigit())
+            try:
+                num_funcionarios = int(registro['num_funcionarios'])
+                area = float(str(registro['area_total']).replace(',', '.'))
+            except (KeyError, ValueError, TypeError):
+                yield cnpj, None, None
+                continue
+            yield cnpj, num_funcionarios, area
+
+#Consulta um CNPJ na API e monta a linha do INSERT
+def _resolver(cliente, cnpj, num_funcionarios, area, usuario):
+    if len(cnpj) != 14:
+        raise ErroConsultaCNPJ('CNPJ inválido. Deve conter 14 dígitos.')
+    if num_funcionarios is None:
+        raise ErroConsultaCNPJ('Número de funcionários ou área total inválidos.')
+    empresa = extrair_dados_empresa(cliente.consultar(cnpj))
+    return (
+        cnpj, empresa['razao_social'], empresa['nome_fantasia'], empresa['setor'],
+        empresa['endereco'], empresa['responsavel'], empresa['contato'],
+        num_funcionarios, area, usuario
+    )
+
+#Grava um lote de empresas; linhas rejeitadas pelo banco (ex.: CNPJ duplicado) ficam no relatório
+def _gravar_lote(sessao, lote, resultados):
+    rejeitadas = sessao.empresas.inserir_lote(lote)
+    sessao.commit()
+
+    diretorio = obter_diretorio()
+    for posicao, linha in enumerate(lote):
+        if posicao in rejeitadas:
+            resultados[linha[0]] = ('erro', rejeitadas[posicao])
+        else:
+            resultados[linha[0]] = ('cadastrada', linha[1])
+            diretorio.adicionar(linha[0], linha[1])
+
+#Cadastra em lote as empresas do arquivo: consultas à API em paralelo e inserts agrupados
+def cadastrar_empresas(caminho, usuario, simultaneas=CONSULTAS_SIMULTANEAS, tamanho_lote=TAMANHO_LOTE_PADRAO, cliente=None):
+    cliente = cliente or obter_cliente()
+    resultados = {}
+    sessao = abrir_sessao()
+    if not sessao:
+        raise RuntimeError('Falha na conexão com o banco de dados.')
+
+    try:
+        with ThreadPoolExecutor(max_workers=simultaneas) as executor:
+            futuros = {}
+            vistos = set()
+            for cnpj, num_funcionarios, area in ler_entradas(caminho):
+                if cnpj in vistos:
+                    continue
+                vistos.add(cnpj)
+                futuro = executor.submit(_resolver, cliente, cnpj, num_funcionarios, area, usuario)
+                futuros[futuro] = cnpj
+
+            lote = []
+            for futuro in as_completed(futuros):
+                cnpj = futuros[futuro]
+                try:
+                    lote.append(futuro.result())
+                except ErroConsultaCNPJ as erro:
+                    resultados[cnpj] = ('erro', str(erro))
+                    continue
+                #Qualquer outra falha (ex.: retorno da API em formato inesperado) fica só com este CNPJ
+                except Exception as erro:
+                    resultados[cnpj] = ('erro', f'{type(erro).__name__}: {erro}')
+                    continue
+
+                if len(lote) >= tamanho_lote:
+                    _gravar_lote(sessao, lote, resultados)
+                    lote = []
+
+            if lote:
+                _gravar_lote(sessao, lote, resultados)
+    finally:
+        sessao.fechar()
+
+    return resultados
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Cadastro em lote de empresas a partir de uma lista de CNPJs.')
+    parser.add_argument('arquivo', help='CSV ou JSON-lines com cnpj, num_funcionarios e area_total')
+    parser.add_argument('--usuario', required=True, help='Usuário registrado como responsável pelo cadastro')
+    parser.add_argument('--simultaneas', type=int, default=CONSULTAS_SIMULTANEAS, help='Consultas à API em paralelo')
+    parser.add_argument('--lote', type=int, default=TAMANHO_LOTE_PADRAO, help='Empresas por lote de inserção')
+    parser.add_argument('--saida', help='Arquivo CSV com o resultado de cada CNPJ')
+    args = parser.parse_args(argv)
+
+    inicio = time.perf_counter()
+    try:
+        resultados = cadastrar_empresas(args.arquivo, args.usuario, args.simultaneas, args.lote)
+    except (OSError, RuntimeError, *ErroBanco) as erro:
+        print(f'Erro ao cadastrar empresas: {erro}', file=sys.stderr)
+        return 1
+    duracao = time.perf_counter() - inicio
+
+    cadastradas = sum(1 for status, _ in resultados.values() if status == 'cadastrada')
+    print('\n===== CADASTRO EM LOTE =====')
+    print(f'CNPJs processados: {len(resultados)}')
+    print(f'Empresas cadastradas: {cadastradas}')
+    print(f'Falhas: {len(resultados) - cadastradas}')
+    print(f'Tempo: {duracao:.2f} s')
+
+    if args.saida:
+        with open(args.saida, 'w', encoding='utf-8', newline='') as arquivo:
+            escritor = csv.writer(arquivo, delimiter=';')
+            escritor.writerow(['cnpj', 'status', 'detalhe'])
+            for cnpj, (status, detalhe) in resultados.items():
+                escritor.writerow([cnpj, status, detalhe])
+        print(f"Resultado salvo em '{args.saida}'")
+    else:
+        for cnpj, (status, detalhe) in resultados.items():
+            if status != 'cadastrada':
+                print(f'  {cnpj}: {detalhe}')
+
+    return 0 if cadastradas == len(resultados) else 2
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,281 @@
+#Imports das funcionalidades a serem usadas
+import argparse
+import json
+import sys
+from datetime import date, datetime
+
+import exportacao
+import metricas
+import operacoes
+from armazenamento import criar_backend, definir_backend
+from operacoes import ErroOperacao
+from previsao import MESES_HISTORICO, METODOS
+from relatorio import FORMATOS
+
+#Interface de linha de comando do Ecoflux: cada subcomando executa uma operação
+#sem menus e escreve o resultado em JSON na saída padrão.
+
+def _ler_data(valor):
+    try:
+        return datetime.fromisoformat(valor)
+    except ValueError:
+        return datetime.strptime(valor, '%d/%m/%Y')
+
+def _para_json(valor):
+    if isinstance(valor, (date, datetime)):
+        return valor.isoformat()
+    return str(valor)
+
+#Usuário das operações de escrita quando nem --usuario nem o item do --json informam um
+USUARIO_PADRAO = 'cli'
+
+#Erros de um item que não interrompem os demais itens do lote (nem o comando, em main)
+ERROS_ITEM = (ErroOperacao, RuntimeError, KeyError, ValueError, TypeError, OSError)
+
+def _mensagem_erro(erro):
+    if isinstance(erro, KeyError):
+        return f'Campo obrigatório ausente: {erro}'
+    return str(erro)
+
+#Itens de --json (arquivo ou '-' para a entrada padrão; objeto ou lista), cada um com os argumentos
+#passados na linha de comando por cima; sem --json, um único item só com os argumentos
+def _carregar_itens(args, campos):
+    dados = {}
+    if args.json:
+        if args.json == '-':
+            dados = json.load(sys.stdin)
+        else:
+            with open(args.json, 'r', encoding='utf-8') as arquivo:
+                dados = json.load(arquivo)
+    informados = {campo: getattr(args, campo) for campo in campos if getattr(args, campo, None) is not None}
+    itens = dados if isinstance(dados, list) else [dados]
+    return [{**item, **informados} if isinstance(item, dict) else item for item in itens]
+
+#Executa a operação item a item: cada item já gravado fica gravado, então a saída traz o resultado ou o
+#erro de cada um (na ordem do --json) e args.falhas diz ao main se algum falhou
+def _em_lote(args, itens, operacao):
+    resultados = []
+    args.falhas = 0
+    for posicao, item in enumerate(itens):
+        try:
+            if not isinstance(item, dict):
+                raise TypeError(f'O item deve ser um objeto JSON, não {type(item).__name__}.')
+            resultados.append(operacao(item))
+        except ERROS_ITEM as erro:
+            args.falhas += 1
+            resultados.append({'item': posicao, 'erro': _mensagem_erro(erro)})
+    return resultados
+
+def cmd_register_company(args):
+    def cadastrar(item):
+        return operacoes.cadastrar_empresa(
+            item['cnpj'], item['num_funcionarios'], item['area_total'], item.get('usuario') or USUARIO_PADRAO
+        )
+    return _em_lote(args, _carregar_itens(args, ('cnpj', 'num_funcionarios', 'area_total', 'usuario')), cadastrar)
+
+def cmd_record_consumption(args):
+    campos = ('cnpj', 'consumo_kwh', 'custo_total', 'setor', 'observacoes', 'data_registro', 'usuario')
+    registrar = operacoes.registrar_consumo_adiado if args.adiado else operacoes.registrar_consumo
+
+    def registrar_item(item):
+        data_registro = item.get('data_registro')
+        if isinstance(data_registro, str):
+            data_registro = _ler_data(data_registro)
+        return registrar(
+            item['cnpj'], item['consumo_kwh'], item['custo_total'], item.get('usuario') or USUARIO_PADRAO,
+            item.get('setor'), item.get('observacoes'), data_registro
+        )
+    return _em_lote(args, _carregar_itens(args, campos), registrar_item)
+
+def cmd_drain_spool(args):
+    return operacoes.esvaziar_spool(args.lotes)
+
+def cmd_analyze(args):
+    return operacoes.analisar_consumo(args.cnpj, args.meses, args.inicio, args.fim, args.detalhes, args.apos)
+
+def cmd_create_structure(args):
+    return operacoes.criar_estrutura()
+
+def cmd_rebuild_rollups(args):
+    return operacoes.reconstruir_rollups(args.inicio, args.fim)
+
+def cmd_scan_anomalies(args):
+    return operacoes.varrer_anomalias(args.cnpj)
+
+def cmd_history(args):
+    return operacoes.historico_consumo(args.cnpj, args.setor, args.inicio, args.fim, args.apos, args.tamanho)
+
+def cmd_rank(args):
+    return operacoes.ranking_empresas(args.inicio, args.fim, args.top, args.cnpj, args.setor)
+
+def cmd_indicators(args):
+    return operacoes.indicadores_consumo(args.cnpj, args.inicio, args.fim, args.janela)
+
+def cmd_forecast(args):
+    return operacoes.prever_consumo(args.cnpj, args.metodo, args.horizonte, args.meses)
+
+def cmd_profile(args):
+    return operacoes.perfil_empresa(args.cnpj, args.atualizar)
+
+def cmd_refresh_profiles(args):
+    if args.idade_dias is None:
+        return operacoes.atualizar_perfis(limite=args.limite)
+    return operacoes.atualizar_perfis(args.idade_dias * 24 * 60 * 60, args.limite)
+
+def cmd_report(args):
+    return operacoes.gerar_relatorio(args.cnpj, args.formato, args.diretorio, args.tipo, args.inicio, args.fim, incremental=args.incremental)
+
+def cmd_export_all(args):
+    exportacao_total = exportacao.exportar_todos(
+        args.formato, args.diretorio, args.tipo, args.inicio, args.fim,
+        args.trabalhadores, args.reiniciar, not args.sem_progresso, args.incremental
+    )
+    resultados = exportacao_total['resultados']
+    return {
+        'empresas': len(resultados),
+        'arquivos': sum(1 for resultado in resultados if resultado.get('arquivo')),
+        'retomadas': exportacao_total['retomadas'],
+        'duracao_s': exportacao_total['duracao_s'],
+        'empresas_por_segundo': exportacao_total['empresas_por_segundo'],
+        'erros': [resultado for resultado in resultados if 'erro' in resultado],
+    }
+
+def _parser():
+    parser = argparse.ArgumentParser(prog='ecoflux', description='Ecoflux em modo não interativo.')
+    parser.add_argument('--usuario', help=f'Usuário registrado nas operações de escrita (padrão: o do item do --json ou {USUARIO_PADRAO})')
+    parser.add_argument('--compacto', action='store_true', help='Saída JSON em uma única linha')
+    parser.add_argument('--sqlite', metavar='ARQUIVO', help='Usa um banco SQLite local em vez do Oracle')
+    parser.add_argument('--stats', action='store_true', help='Mostra na saída de erro o tempo de cada operação (conexão, consultas, API, arquivos)')
+    parser.add_argument('--metricas', metavar='ARQUIVO', help='Grava as métricas em formato Prometheus (ou JSON, se terminar em .json)')
+    subcomandos = parser.add_subparsers(dest='comando', required=True)
+
+    cadastro = subcomandos.add_parser('register-company', help='Cadastra uma empresa pelo CNPJ')
+    cadastro.add_argument('--cnpj')
+    cadastro.add_argument('--num-funcionarios', dest='num_funcionarios', type=int)
+    cadastro.add_argument('--area-total', dest='area_total', type=float)
+    cadastro.add_argument('--json', help='Arquivo JSON (objeto ou lista) ou - para a entrada padrão')
+    cadastro.set_defaults(funcao=cmd_register_company)
+
+    consumo = subcomandos.add_parser('record-consumption', help='Registra leituras de consumo')
+    consumo.add_argument('--cnpj')
+    consumo.add_argument('--consumo-kwh', dest='consumo_kwh', type=float)
+    consumo.add_argument('--custo-total', dest='custo_total', type=float)
+    consumo.add_argument('--setor')
+    consumo.add_argument('--observacoes')
+    consumo.add_argument('--data-registro', dest='data_registro')
+    consumo.add_argument('--json', help='Arquivo JSON (objeto ou lista) ou - para a entrada padrão')
+    consumo.add_argument('--adiado', action='store_true', help='Grava no spool local e confirma sem esperar o banco (gravado depois pelo drain-spool)')
+    consumo.set_defaults(funcao=cmd_record_consumption)
+
+    spool = subcomandos.add_parser('drain-spool', help='Grava no banco as leituras pendentes no spool local')
+    spool.add_argument('--lotes', type=int, help='Máximo de lotes gravados nesta execução')
+    spool.set_defaults(funcao=cmd_drain_spool)
+
+    analise = subcomandos.add_parser('analyze', help='Resumo de consumo de uma empresa')
+    analise.add_argument('--cnpj', required=True)
+    analise.add_argument('--meses', type=int, default=6)
+    analise.add_argument('--inicio', type=_ler_data, help='Início do período (usa os rollups)')
+    analise.add_argument('--fim', type=_ler_data, help='Fim do período (usa os rollups)')
+    analise.add_argument('--detalhes', action='store_true', help='Inclui uma página dos consumos detalhados')
+    analise.add_argument('--apos', help='Valor de "proxima" devolvido pela página anterior de detalhes')
+    analise.set_defaults(funcao=cmd_analyze)
+
+    historico = subcomandos.add_parser('history', help='Histórico de consumos de uma empresa, uma página por vez')
+    historico.add_argument('--cnpj', required=True)
+    historico.add_argument('--setor')
+    historico.add_argument('--inicio', type=_ler_data)
+    historico.add_argument('--fim', type=_ler_data)
+    historico.add_argument('--apos', help='Valor de "proxima" devolvido pela página anterior')
+    historico.add_argument('--tamanho', type=int, default=20, help='Linhas por página')
+    historico.set_defaults(funcao=cmd_history)
+
+    estrutura = subcomandos.add_parser('create-structure', help='Cria as tabelas auxiliares (rollups, anomalias, spool) no banco')
+    estrutura.set_defaults(funcao=cmd_create_structure)
+
+    reconstrucao = subcomandos.add_parser('rebuild-rollups', help='Recalcula os rollups diários e mensais a partir das leituras')
+    reconstrucao.add_argument('--inicio', type=_ler_data, help='Início do período (padrão: todo o histórico)')
+    reconstrucao.add_argument('--fim', type=_ler_data, help='Fim do período')
+    reconstrucao.set_defaults(funcao=cmd_rebuild_rollups)
+
+    varredura = subcomandos.add_parser('scan-anomalies', help='Avalia as leituras novas de todas as séries e marca as anomalias')
+    varredura.add_argument('--cnpj', help='Limita a varredura a uma empresa')
+    varredura.set_defaults(funcao=cmd_scan_anomalies)
+
+    ranking = subcomandos.add_parser('rank', help='Compara todas as empresas por kWh/m², kWh/funcionário e custo/kWh')
+    ranking.add_argument('--inicio', type=_ler_data, help='Início do período (padrão: 12 meses atrás)')
+    ranking.add_argument('--fim', type=_ler_data, help='Fim do período (padrão: hoje)')
+    ranking.add_argument('--top', type=int, default=10, help='Empresas listadas entre as melhores e as piores')
+    ranking.add_argument('--cnpj', help='Inclui a posição desta empresa no geral e no setor')
+    ranking.add_argument('--setor', help='Detalha apenas os pares deste setor')
+    ranking.set_defaults(funcao=cmd_rank)
+
+    indicadores = subcomandos.add_parser('indicators', help='Indicadores da série de consumo (médias móveis, variação mensal, percentis)')
+    indicadores.add_argument('--cnpj', required=True)
+    indicadores.add_argument('--inicio', type=_ler_data)
+    indicadores.add_argument('--fim', type=_ler_data)
+    indicadores.add_argument('--janela', type=int, default=7, help='Dias da média móvel')
+    indicadores.set_defaults(funcao=cmd_indicators)
+
+    previsao = subcomandos.add_parser('forecast', help='Previsão de consumo (kWh) e custo (R$) do próximo mês para todas as empresas')
+    previsao.add_argument('--cnpj', help='Mostra só esta empresa')
+    previsao.add_argument('--metodo', choices=METODOS, default='auto')
+    previsao.add_argument('--horizonte', type=int, default=1, help='Meses à frente do último mês completo')
+    previsao.add_argument('--meses', type=int, default=MESES_HISTORICO, help='Meses de histórico usados no ajuste')
+    previsao.set_defaults(funcao=cmd_forecast)
+
+    perfil = subcomandos.add_parser('profile', help='Perfil completo de um CNPJ guardado localmente (sócios, endereço, contatos, atividades)')
+    perfil.add_argument('--cnpj', required=True)
+    perfil.add_argument('--atualizar', action='store_true', help='Consulta a API mesmo que o perfil local seja recente')
+    perfil.set_defaults(funcao=cmd_profile)
+
+    atualizacao = subcomandos.add_parser('refresh-profiles', help='Consulta de novo na API os perfis locais mais antigos')
+    atualizacao.add_argument('--idade-dias', dest='idade_dias', type=float, help='Idade a partir da qual o perfil é atualizado (padrão: 30 dias)')
+    atualizacao.add_argument('--limite', type=int, help='Máximo de perfis atualizados nesta execução')
+    atualizacao.set_defaults(funcao=cmd_refresh_profiles)
+
+    for nome, ajuda, funcao in (
+        ('report', 'Gera o relatório de uma empresa', cmd_report),
+        ('export-all', 'Gera o relatório de todas as empresas', cmd_export_all),
+    ):
+        relatorio = subcomandos.add_parser(nome, help=ajuda)
+        if nome == 'report':
+            relatorio.add_argument('--cnpj', required=True)
+        relatorio.add_argument('--formato', choices=sorted(FORMATOS), default='json')
+        relatorio.add_argument('--tipo', choices=['consumos', 'mensal'], default='consumos')
+        relatorio.add_argument('--diretorio', default='.')
+        relatorio.add_argument('--inicio', type=_ler_data)
+        relatorio.add_argument('--fim', type=_ler_data)
+        relatorio.add_argument('--incremental', action='store_true',
+                               help="Grava só as leituras novas desde a última execução (marca d'água ao lado do arquivo; ignora --inicio/--fim)")
+        if nome == 'export-all':
+            relatorio.add_argument('--trabalhadores', type=int, help='Relatórios gerados em paralelo (padrão: tamanho máximo do pool)')
+            relatorio.add_argument('--reiniciar', action='store_true', help='Ignora o progresso salvo e exporta tudo de novo')
+            relatorio.add_argument('--sem-progresso', action='store_true', help='Não mostra o andamento na saída de erro')
+        relatorio.set_defaults(funcao=funcao)
+
+    return parser
+
+def main(argv=None):
+    args = _parser().parse_args(argv)
+    if args.stats or args.metricas:
+        metricas.ativar()
+    if args.sqlite:
+        definir_backend(criar_backend('sqlite', caminho=args.sqlite))
+    try:
+        resultado = args.funcao(args)
+        codigo_saida = 1 if getattr(args, 'falhas', 0) else 0
+    except ERROS_ITEM as erro:
+        resultado = {'erro': _mensagem_erro(erro)}
+        codigo_saida = 1
+
+    json.dump(resultado, sys.stdout, default=_para_json, ensure_ascii=False, indent=None if args.compacto else 2)
+    sys.stdout.write('\n')
+
+    if args.stats:
+        metricas.imprimir_resumo()
+    if args.metricas:
+        metricas.gravar(args.metricas)
+    return codigo_saida
+
+if __name__ == '__main__':
+    sys.exit(main())
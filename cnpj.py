@@ -0,0 +1,294 @@
+#Imports das funcionalidades a serem usadas
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import requests
+
+from metricas import medir
+from perfis import IDADE_MAXIMA_PERFIL, obter_perfis
+
+URL_API_CNPJ = os.environ.get('ECOFLUX_CNPJ_URL', 'https://open.cnpja.com/office/')
+
+#Configurações do cliente de consulta de CNPJ
+CONFIG_CNPJ = {
+    'timeout_conexao': float(os.environ.get('ECOFLUX_CNPJ_TIMEOUT_CONEXAO', 3.05)),
+    'timeout_leitura': float(os.environ.get('ECOFLUX_CNPJ_TIMEOUT_LEITURA', 10)),
+    'ttl_cache': float(os.environ.get('ECOFLUX_CNPJ_TTL', 24 * 60 * 60)),
+    'ttl_nao_encontrado': float(os.environ.get('ECOFLUX_CNPJ_TTL_404', 60 * 60)),
+    'tamanho_cache': int(os.environ.get('ECOFLUX_CNPJ_CACHE', 1024)),
+    'arquivo_cache': os.environ.get('ECOFLUX_CNPJ_ARQUIVO_CACHE') or None,
+    'requisicoes_por_minuto': float(os.environ.get('ECOFLUX_CNPJ_RPM', 5)),
+    'rajada': int(os.environ.get('ECOFLUX_CNPJ_RAJADA', 5)),
+    'tentativas': int(os.environ.get('ECOFLUX_CNPJ_TENTATIVAS', 3)),
+    'espera_base': float(os.environ.get('ECOFLUX_CNPJ_ESPERA', 1.0)),
+    #Teto da espera entre tentativas, inclusive a pedida pela API em Retry-After
+    'espera_maxima': float(os.environ.get('ECOFLUX_CNPJ_ESPERA_MAXIMA', 30.0)),
+    'idade_perfil': IDADE_MAXIMA_PERFIL,
+}
+
+#Status HTTP que valem uma nova tentativa
+STATUS_REPETIR = {429, 500, 502, 503, 504}
+
+class ErroConsultaCNPJ(Exception):
+    def __init__(self, mensagem, status=None):
+        super().__init__(mensagem)
+        self.status = status
+
+class CNPJNaoEncontrado(ErroConsultaCNPJ):
+    def __init__(self, cnpj):
+        super().__init__(f'CNPJ {cnpj} não encontrado.', 404)
+
+#Cache LRU com tempo de expiração, opcionalmente salvo em um arquivo JSON-lines: cada guardar anexa
+#uma linha e o arquivo só é reescrito (com os itens vivos) quando passa do dobro do tamanho do cache
+class CacheTTL:
+    def __init__(self, tamanho_maximo, arquivo=None):
+        self.tamanho_maximo = tamanho_maximo
+        self.arquivo = arquivo
+        self._dados = OrderedDict()
+        self._trava = threading.Lock()
+        self._saida = None
+        self._linhas_arquivo = 0
+        if arquivo:
+            self._carregar()
+
+    def obter(self, chave):
+        with self._trava:
+            item = self._dados.get(chave)
+            if item is None:
+                return None
+            if item[0] < time.time():
+                del self._dados[chave]
+                return None
+            self._dados.move_to_end(chave)
+            return item
+
+    def guardar(self, chave, valor, ttl):
+        with self._trava:
+            item = (time.time() + ttl, valor)
+            self._dados[chave] = item
+            self._dados.move_to_end(chave)
+            while len(self._dados) > self.tamanho_maximo:
+                self._dados.popitem(last=False)
+            if self.arquivo:
+                self._anexar(chave, *item)
+
+    def limpar(self):
+        with self._trava:
+            self._dados.clear()
+            if self.arquivo:
+                self._reescrever()
+
+    def __len__(self):
+        return len(self._dados)
+
+    def fechar(self):
+        with self._trava:
+            if self._saida is not None:
+                self._saida.close()
+                self._saida = None
+
+    #Uma linha [chave, expira_em, valor] por item guardado; a última linha de cada chave vale
+    def _carregar(self):
+        agora = time.time()
+        try:
+            with open(self.arquivo, 'r', encoding='utf-8') as arquivo:
+                for linha in arquivo:
+                    try:
+                        item = json.loads(linha)
+                    except ValueError:
+                        continue
+                    self._linhas_arquivo += 1
+                    chave, expira_em, valor = item
+                    self._dados.pop(chave, None)
+                    if expira_em >= agora:
+                        self._dados[chave] = (expira_em, valor)
+        except OSError:
+            return
+        while len(self._dados) > self.tamanho_maximo:
+            self._dados.popitem(last=False)
+
+    def _anexar(self, chave, expira_em, valor):
+        if self._linhas_arquivo >= 2 * self.tamanho_maximo:
+            self._reescrever()
+            return
+        if self._saida is None:
+            self._saida = open(self.arquivo, 'a', encoding='utf-8')
+        self._saida.write(json.dumps([chave, expira_em, valor], ensure_ascii=False) + '\n')
+        self._saida.flush()
+        self._linhas_arquivo += 1
+
+    def _reescrever(self):
+        if self._saida is not None:
+            self._saida.close()
+            self._saida = None
+        temporario = f'{self.arquivo}.tmp'
+        with open(temporario, 'w', encoding='utf-8') as arquivo:
+            for chave, (expira_em, valor) in self._dados.items():
+                arquivo.write(json.dumps([chave, expira_em, valor], ensure_ascii=False) + '\n')
+        os.replace(temporario, self.arquivo)
+        self._linhas_arquivo = len(self._dados)
+
+#Limitador de taxa por balde de fichas: no máximo 'rajada' chamadas seguidas e depois 'taxa' por segundo
+class LimitadorTaxa:
+    def __init__(self, taxa, rajada):
+        self.taxa = taxa
+        self.rajada = rajada
+        self._fichas = float(rajada)
+        self._ultimo = time.monotonic()
+        self._trava = threading.Lock()
+
+    def aguardar(self):
+        while True:
+            with self._trava:
+                agora = time.monotonic()
+                self._fichas = min(self.rajada, self._fichas + (agora - self._ultimo) * self.taxa)
+                self._ultimo = agora
+                if self._fichas >= 1:
+                    self._fichas -= 1
+                    return
+                espera = (1 - self._fichas) / self.taxa
+            time.sleep(espera)
+
+#Cliente da API de CNPJ: reaproveita a conexão HTTP, guarda resultados em cache e respeita o limite da API.
+#Os perfis completos ficam também no armazenamento local (perfis.py), consultado antes da API enquanto
+#não passarem da idade máxima e usado como reserva, mesmo antigo, se a API estiver fora do ar.
+class ClienteCNPJ:
+    def __init__(self, url_base=URL_API_CNPJ, config=None, sessao=None, perfis=None):
+        self.url_base = url_base if url_base.endswith('/') else url_base + '/'
+        self.config = dict(CONFIG_CNPJ)
+        self.config.update(config or {})
+        self.sessao = sessao or requests.Session()
+        self.cache = CacheTTL(self.config['tamanho_cache'], self.config['arquivo_cache'])
+        self.limitador = LimitadorTaxa(self.config['requisicoes_por_minuto'] / 60, self.config['rajada'])
+        self.perfis = perfis if perfis is not None else obter_perfis()
+
+    #Consulta um CNPJ; devolve o dicionário da API ou lança CNPJNaoEncontrado/ErroConsultaCNPJ.
+    #Com atualizar, ignora o cache e o perfil local e vai direto à API.
+    def consultar(self, cnpj, atualizar=False):
+        if not atualizar:
+            em_cache = self.cache.obter(cnpj)
+            if em_cache is not None:
+                dados = em_cache[1]
+                if dados is None:
+                    raise CNPJNaoEncontrado(cnpj)
+                return dados
+
+        perfil = self.perfis.obter(cnpj) if self.perfis is not None else None
+        if perfil and not atualizar and perfil[1] < self.config['idade_perfil']:
+            self.cache.guardar(cnpj, perfil[0], self.config['ttl_cache'])
+            return perfil[0]
+
+        try:
+            resposta = self._requisitar(cnpj)
+        except ErroConsultaCNPJ:
+            if perfil:
+                return perfil[0]
+            raise
+
+        if resposta.status_code == 200:
+            try:
+                dados = resposta.json()
+            except ValueError as erro:
+                raise ErroConsultaCNPJ(f'Resposta inválida da API: {erro}', 200) from erro
+            self.cache.guardar(cnpj, dados, self.config['ttl_cache'])
+            if self.perfis is not None:
+                self.perfis.guardar(cnpj, dados)
+            return dados
+        if resposta.status_code == 404:
+            self.cache.guardar(cnpj, None, self.config['ttl_nao_encontrado'])
+            raise CNPJNaoEncontrado(cnpj)
+        if perfil:
+            return perfil[0]
+        raise ErroConsultaCNPJ(f'Erro na validação. Status: {resposta.status_code}', resposta.status_code)
+
+    def _requisitar(self, cnpj):
+        timeout = (self.config['timeout_conexao'], self.config['timeout_leitura'])
+        tentativas = max(1, self.config['tentativas'])
+
+        for tentativa in range(tentativas):
+            self.limitador.aguardar()
+            try:
+                with medir('http.cnpj') as medicao:
+                    resposta = self.sessao.get(self.url_base + cnpj, timeout=timeout)
+                    medicao.bytes = len(resposta.content)
+            except (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError) as erro:
+                if tentativa == tentativas - 1:
+                    raise ErroConsultaCNPJ(f'Erro de conexão: {erro}') from erro
+                time.sleep(self._espera(tentativa))
+                continue
+            except requests.RequestException as erro:
+                raise ErroConsultaCNPJ(f'Erro na consulta: {erro}') from erro
+
+            if resposta.status_code not in STATUS_REPETIR or tentativa == tentativas - 1:
+                return resposta
+            time.sleep(self._espera(tentativa, resposta.headers.get('Retry-After')))
+
+    def _espera(self, tentativa, retry_after=None):
+        espera = self.config['espera_base'] * (2 ** tentativa)
+        if retry_after:
+            try:
+                espera = max(0.0, float(retry_after))
+            except ValueError:
+                pass
+        return min(espera, self.config['espera_maxima'])
+
+    def fechar(self):
+        self.sessao.close()
+        self.cache.fechar()
+
+#Extrai do retorno da API os campos gravados na tabela empresas
+def extrair_dados_empresa(dados_empresa):
+    razao_social = dados_empresa.get('company', {}).get('name', 'Não informado')
+
+    nome_fantasia = dados_empresa.get('alias') or razao_social
+
+    setor = (
+        dados_empresa.get('mainActivity', {}).get('text') or 
+        dados_empresa.get('company', {}).get('mainActivity', {}).get('text') or 
+        'Não informado'
+    )
+
+    endereco_dados = dados_empresa.get('address', {})
+    endereco = f"{endereco_dados.get('street', '')} {endereco_dados.get('number', '')}".strip()
+
+    membros = dados_empresa.get('company', {}).get('members') or [{}]
+    responsavel = membros[0].get('person', {}).get('name', 'Não informado')
+
+    contato = 'Não informado'
+    emails = dados_empresa.get('emails', [])
+    if emails:
+        contato = emails[0].get('address', 'Não informado')
+
+    if contato == 'Não informado':
+        telefones = dados_empresa.get('phones', [])
+        if telefones:
+            contato = f"({telefones[0].get('area', '')}) {telefones[0].get('number', '')}"
+
+    return {
+        'razao_social': razao_social,
+        'nome_fantasia': nome_fantasia,
+        'setor': setor,
+        'endereco': endereco,
+        'responsavel': responsavel,
+        'contato': contato,
+    }
+
+_cliente_padrao = None
+_trava_cliente = threading.Lock()
+
+#Retorna o cliente compartilhado pelo processo
+def obter_cliente():
+    global _cliente_padrao
+    with _trava_cliente:
+        if _cliente_padrao is None:
+            _cliente_padrao = ClienteCNPJ()
+        return _cliente_padrao
+
+#Troca o cliente compartilhado (usado para apontar para outro servidor, ex.: um servidor local de testes)
+def definir_cliente(cliente):
+    global _cliente_padrao
+    with _trava_cliente:
+        _cliente_padrao = cliente
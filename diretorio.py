@@ -0,0 +1,118 @@
+#Imports das funcionalidades a serem usadas
+import bisect
+import threading
+import time
+
+from armazenamento import sessao
+
+TEMPO_VALIDADE = 300
+
+#Índice das empresas cadastradas mantido na memória do processo.
+#É carregado uma vez do banco e atualizado quando o próprio processo cadastra uma empresa,
+#evitando consultar a tabela empresas inteira a cada ação do menu.
+class DiretorioEmpresas:
+    def __init__(self, carregar, validade=TEMPO_VALIDADE):
+        self._carregar = carregar
+        self.validade = validade
+        self._trava = threading.Lock()
+        self._carregado_em = None
+        self._empresas = []
+        self._chaves_nome = []
+        self._por_cnpj = {}
+        self._cnpjs = []
+
+    def _indexar(self, empresas):
+        empresas = sorted(empresas, key=lambda empresa: (empresa[1] or '').lower())
+        self._empresas = empresas
+        self._chaves_nome = [(razao_social or '').lower() for _, razao_social in empresas]
+        self._por_cnpj = dict(empresas)
+        self._cnpjs = sorted(self._por_cnpj)
+        self._carregado_em = time.monotonic()
+
+    def _garantir_carregado(self):
+        if self._carregado_em is None or time.monotonic() - self._carregado_em > self.validade:
+            self._indexar(self._carregar())
+
+    #Descarta o índice; a próxima consulta recarrega do banco
+    def invalidar(self):
+        with self._trava:
+            self._carregado_em = None
+
+    #Inclui uma empresa recém-cadastrada sem recarregar a tabela
+    def adicionar(self, cnpj, razao_social):
+        with self._trava:
+            if self._carregado_em is None or cnpj in self._por_cnpj:
+                self._carregado_em = None
+                return
+            chave = (razao_social or '').lower()
+            posicao = bisect.bisect_right(self._chaves_nome, chave)
+            self._chaves_nome.insert(posicao, chave)
+            self._empresas.insert(posicao, (cnpj, razao_social))
+            self._por_cnpj[cnpj] = razao_social
+            bisect.insort(self._cnpjs, cnpj)
+
+    def total(self):
+        with self._trava:
+            self._garantir_carregado()
+            return len(self._empresas)
+
+    def razao_social(self, cnpj):
+        with self._trava:
+            self._garantir_carregado()
+            return self._por_cnpj.get(cnpj)
+
+    #Busca por CNPJ (prefixo) ou por nome (prefixo primeiro, depois trechos do nome)
+    def buscar(self, termo=''):
+        with self._trava:
+            self._garantir_carregado()
+            termo = termo.strip().lower()
+            if not termo:
+                return list(self._empresas)
+
+            digitos = ''.join(c for c in termo if c.isdigit())
+            if digitos and len(digitos) == len(termo.replace('.', '').replace('/', '').replace('-', '')):
+                inicio = bisect.bisect_left(self._cnpjs, digitos)
+                encontrados = []
+                for cnpj in self._cnpjs[inicio:]:
+                    if not cnpj.startswith(digitos):
+                        break
+                    encontrados.append((cnpj, self._por_cnpj[cnpj]))
+                return encontrados
+
+            inicio = bisect.bisect_left(self._chaves_nome, termo)
+            fim = bisect.bisect_left(self._chaves_nome, termo + '￿')
+            prefixo = self._empresas[inicio:fim]
+            trechos = [
+                empresa for posicao, empresa in enumerate(self._empresas)
+                if (posicao < inicio or posicao >= fim) and termo in self._chaves_nome[posicao]
+            ]
+            return prefixo + trechos
+
+    #Devolve uma página do resultado da busca e o total de páginas
+    def pagina(self, termo, numero, tamanho=20):
+        encontrados = self.buscar(termo)
+        total_paginas = max(1, -(-len(encontrados) // tamanho))
+        numero = min(max(numero, 0), total_paginas - 1)
+        return encontrados[numero * tamanho:(numero + 1) * tamanho], numero, total_paginas, len(encontrados)
+
+#Lê cnpj e razão social de todas as empresas (uma única consulta por carga do índice)
+def carregar_empresas():
+    with sessao() as aberta:
+        return aberta.empresas.listar()
+
+_diretorio_padrao = None
+_trava_diretorio = threading.Lock()
+
+#Retorna o diretório de empresas compartilhado pelo processo
+def obter_diretorio():
+    global _diretorio_padrao
+    with _trava_diretorio:
+        if _diretorio_padrao is None:
+            _diretorio_padrao = DiretorioEmpresas(carregar_empresas)
+        return _diretorio_padrao
+
+#Troca o diretório compartilhado (ex.: ao apontar o processo para outro banco)
+def definir_diretorio(diretorio):
+    global _diretorio_padrao
+    with _trava_diretorio:
+        _diretorio_padrao = diretorio
@@ -0,0 +1,143 @@
+#Imports das funcionalidades a serem usadas
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from armazenamento import abrir_sessao
+from banco import CONFIG_POOL
+from diretorio import obter_diretorio
+from operacoes import ErroOperacao, gerar_relatorio
+
+ARQUIVO_ESTADO = '.exportacao_{tipo}_{formato}.jsonl'
+
+#Registro das empresas já exportadas, gravado linha a linha para permitir retomar uma exportação interrompida.
+#A primeira linha guarda o período exportado; retomar com outro período começa do zero, porque os arquivos
+#já gravados são do período anterior.
+class EstadoExportacao:
+    def __init__(self, diretorio, tipo, formato, reiniciar=False, inicio=None, fim=None):
+        self.caminho = os.path.join(diretorio, ARQUIVO_ESTADO.format(tipo=tipo, formato=formato))
+        self.periodo = [inicio.isoformat() if inicio else None, fim.isoformat() if fim else None]
+        self._trava = threading.Lock()
+        self.concluidas = {}
+        self._periodo_arquivo = None
+        if not reiniciar:
+            self._carregar()
+        if reiniciar or self._periodo_arquivo != self.periodo:
+            self.concluidas = {}
+            with open(self.caminho, 'w', encoding='utf-8') as arquivo:
+                arquivo.write(json.dumps({'periodo': self.periodo}) + '\n')
+        self._arquivo = open(self.caminho, 'a', encoding='utf-8')
+
+    def _carregar(self):
+        try:
+            with open(self.caminho, 'r', encoding='utf-8') as arquivo:
+                for linha in arquivo:
+                    try:
+                        item = json.loads(linha)
+                    except ValueError:
+                        continue
+                    if 'periodo' in item:
+                        self._periodo_arquivo = item['periodo']
+                    else:
+                        self.concluidas[item['cnpj']] = item
+        except OSError:
+            pass
+
+    #Uma empresa só conta como concluída se o arquivo registrado ainda existir
+    def concluida(self, cnpj):
+        item = self.concluidas.get(cnpj)
+        return item is not None and (item.get('arquivo') is None or os.path.exists(item['arquivo']))
+
+    def marcar(self, resultado):
+        with self._trava:
+            self.concluidas[resultado['cnpj']] = resultado
+            self._arquivo.write(json.dumps(resultado, ensure_ascii=False) + '\n')
+            self._arquivo.flush()
+
+    def fechar(self):
+        self._arquivo.close()
+
+#Mostra o andamento na saída de erro (a saída padrão fica livre para o resultado em JSON)
+class Progresso:
+    def __init__(self, total, intervalo=1.0, saida=sys.stderr):
+        self.total = total
+        self.intervalo = intervalo
+        self.saida = saida
+        self.feitas = 0
+        self.linhas = 0
+        self.inicio = time.perf_counter()
+        self._ultimo = 0.0
+        self._trava = threading.Lock()
+
+    def avancar(self, linhas):
+        with self._trava:
+            self.feitas += 1
+            self.linhas += linhas
+            agora = time.perf_counter()
+            if agora - self._ultimo >= self.intervalo or self.feitas == self.total:
+                self._ultimo = agora
+                decorrido = agora - self.inicio or 1e-9
+                self.saida.write(
+                    f'\r[{self.feitas}/{self.total}] {self.feitas / decorrido:.1f} empresas/s, '
+                    f'{self.linhas / decorrido:.0f} linhas/s'
+                )
+                if self.feitas == self.total:
+                    self.saida.write('\n')
+                self.saida.flush()
+
+#Gera o relatório de uma empresa com uma sessão (conexão do pool) só para ela
+def _exportar_empresa(cnpj, formato, diretorio, tipo, inicio, fim, incremental):
+    sessao = abrir_sessao()
+    if not sessao:
+        raise ErroOperacao('Falha na conexão com o banco de dados.')
+    try:
+        return gerar_relatorio(cnpj, formato, diretorio, tipo, inicio, fim, sessao, incremental)
+    finally:
+        sessao.fechar()
+
+#Exporta o relatório de todas as empresas em paralelo, um arquivo por CNPJ, retomando de onde parou.
+#No modo incremental toda execução passa por todas as empresas (quem não tem leitura nova custa uma consulta);
+#as marcas d'água de cada arquivo é que evitam regravar o histórico.
+def exportar_todos(formato='json', diretorio='.', tipo='consumos', inicio=None, fim=None,
+                   trabalhadores=None, reiniciar=False, mostrar_progresso=True, incremental=False):
+    os.makedirs(diretorio, exist_ok=True)
+    trabalhadores = trabalhadores or CONFIG_POOL['max']
+    estado = EstadoExportacao(diretorio, tipo, formato, reiniciar or incremental, inicio, fim)
+
+    empresas = [cnpj for cnpj, _ in obter_diretorio().buscar('')]
+    pendentes = [cnpj for cnpj in empresas if not estado.concluida(cnpj)]
+    progresso = Progresso(len(pendentes)) if mostrar_progresso and pendentes else None
+
+    resultados = [estado.concluidas[cnpj] for cnpj in empresas if estado.concluida(cnpj)]
+    inicio_exportacao = time.perf_counter()
+    executor = ThreadPoolExecutor(max_workers=trabalhadores)
+    try:
+        futuros = {
+            executor.submit(_exportar_empresa, cnpj, formato, diretorio, tipo, inicio, fim, incremental): cnpj
+            for cnpj in pendentes
+        }
+        for futuro in as_completed(futuros):
+            cnpj = futuros[futuro]
+            try:
+                resultado = futuro.result()
+                estado.marcar(resultado)
+            except (ErroOperacao, OSError) as erro:
+                resultado = {'cnpj': cnpj, 'erro': str(erro)}
+            resultados.append(resultado)
+            if progresso:
+                progresso.avancar(resultado.get('registros', 0))
+    finally:
+        #Em uma interrupção, descarta o que ainda não começou; o que já terminou fica no estado para a próxima execução
+        executor.shutdown(wait=True, cancel_futures=True)
+        estado.fechar()
+
+    duracao = time.perf_counter() - inicio_exportacao
+    return {
+        'resultados': resultados,
+        'retomadas': len(empresas) - len(pendentes),
+        'duracao_s': round(duracao, 3),
+        'empresas_por_segundo': round(len(pendentes) / duracao, 2) if duracao else 0.0,
+    }
@@ -0,0 +1,166 @@
+#Imports das funcionalidades a serem usadas
+import argparse
+import csv
+import json
+import sys
+import time
+from datetime import datetime
+
+from armazenamento import ErroBanco, abrir_sessao
+
+TAMANHO_LOTE_PADRAO = 5000
+
+#Converte um número que pode vir com vírgula decimal
+def _ler_numero(valor):
+    if isinstance(valor, (int, float)):
+        return float(valor)
+    return float(str(valor).strip().replace(',', '.'))
+
+#Converte a data de registro (ISO 8601 ou dd/mm/aaaa); vazio usa a data do banco
+def _ler_data(valor):
+    if valor in (None, ''):
+        return None
+    valor = str(valor).strip()
+    for formato in ('%Y-%m-%d %H:%M:%S', '%Y-%m-%dT%H:%M:%S', '%Y-%m-%d', '%d/%m/%Y %H:%M:%S', '%d/%m/%Y'):
+        try:
+            return datetime.strptime(valor, formato)
+        except ValueError:
+            continue
+    return datetime.fromisoformat(valor)
+
+#Transforma um registro lido do arquivo na tupla usada pelo INSERT
+def montar_linha(registro, usuario_padrao):
+    cnpj = str(registro.get('cnpj_empresa') or registro.get('cnpj') or '').strip()
+    if len(cnpj) != 14:
+        raise ValueError(f'CNPJ inválido: {cnpj!r}')
+    return (
+        cnpj,
+        _ler_data(registro.get('data_registro')),
+        _ler_numero(registro['consumo_kwh']),
+        _ler_numero(registro['custo_total']),
+        registro.get('setor') or 'Não especificado',
+        registro.get('observacoes') or 'Sem observações',
+        registro.get('usuario_registro') or usuario_padrao,
+    )
+
+#Lê o arquivo linha a linha (CSV com cabeçalho ou JSON-lines), sem carregá-lo inteiro na memória
+def ler_registros(caminho, formato=None):
+    if formato is None:
+        formato = 'jsonl' if caminho.endswith(('.jsonl', '.ndjson', '.json')) else 'csv'
+
+    with open(caminho, 'r', encoding='utf-8', newline='') as arquivo:
+        if formato == 'csv':
+            amostra = arquivo.read(4096)
+            arquivo.seek(0)
+            delimitador = ';' if amostra.count(';') > amostra.count(',') else ','
+            for numero, registro in enumerate(csv.DictReader(arquivo, delimiter=delimitador), 2):
+                yield numero, registro
+        else:
+            for numero, linha in enumerate(arquivo, 1):
+                linha = linha.strip()
+                if linha:
+                    yield numero, linha
+
+#Resultado de uma importação em lote
+class ResultadoImportacao:
+    def __init__(self):
+        self.lidas = 0
+        self.inseridas = 0
+        self.erros = []
+        self.lotes = 0
+        self.duracao = 0.0
+
+    @property
+    def linhas_por_segundo(self):
+        return self.lidas / self.duracao if self.duracao else 0.0
+
+    def resumo(self):
+        return {
+            'linhas_lidas': self.lidas,
+            'linhas_inseridas': self.inseridas,
+            'linhas_com_erro': len(self.erros),
+            'lotes': self.lotes,
+            'duracao_s': round(self.duracao, 3),
+            'linhas_por_segundo': round(self.linhas_por_segundo, 1),
+        }
+
+#Envia um lote de uma vez; linhas rejeitadas pelo banco são coletadas sem abortar o lote
+def _gravar_lote(sessao, lote, numeros, resultado):
+    rejeitadas = sessao.consumo.inserir_lote(lote)
+    for posicao, mensagem in sorted(rejeitadas.items()):
+        resultado.erros.append((numeros[posicao], mensagem))
+    sessao.commit()
+    resultado.inseridas += len(lote) - len(rejeitadas)
+    resultado.lotes += 1
+
+#Importa um arquivo de leituras para a tabela consumo_energetico em lotes
+def importar_arquivo(caminho, usuario, tamanho_lote=TAMANHO_LOTE_PADRAO, formato=None, sessao=None):
+    resultado = ResultadoImportacao()
+    sessao_propria = sessao is None
+    if sessao_propria:
+        sessao = abrir_sessao()
+        if not sessao:
+            raise RuntimeError('Falha na conexão com o banco de dados.')
+
+    inicio = time.perf_counter()
+    try:
+        lote = []
+        numeros = []
+        for numero, registro in ler_registros(caminho, formato):
+            resultado.lidas += 1
+            try:
+                if isinstance(registro, str):
+                    registro = json.loads(registro)
+                lote.append(montar_linha(registro, usuario))
+                numeros.append(numero)
+            except (KeyError, ValueError, TypeError) as erro:
+                resultado.erros.append((numero, f'Registro inválido: {erro}'))
+                continue
+
+            if len(lote) >= tamanho_lote:
+                _gravar_lote(sessao, lote, numeros, resultado)
+                lote = []
+                numeros = []
+
+        if lote:
+            _gravar_lote(sessao, lote, numeros, resultado)
+    finally:
+        resultado.duracao = time.perf_counter() - inicio
+        if sessao_propria:
+            sessao.fechar()
+
+    return resultado
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Importação em lote de leituras de consumo de energia.')
+    parser.add_argument('arquivos', nargs='+', help='Arquivos CSV ou JSON-lines com as leituras')
+    parser.add_argument('--usuario', required=True, help='Usuário registrado como responsável pelas leituras')
+    parser.add_argument('--lote', type=int, default=TAMANHO_LOTE_PADRAO, help='Linhas por lote/commit')
+    parser.add_argument('--formato', choices=['csv', 'jsonl'], help='Força o formato do arquivo')
+    parser.add_argument('--max-erros', type=int, default=20, help='Quantidade de erros exibidos por arquivo')
+    args = parser.parse_args(argv)
+
+    codigo_saida = 0
+    for caminho in args.arquivos:
+        try:
+            resultado = importar_arquivo(caminho, args.usuario, args.lote, args.formato)
+        except (OSError, RuntimeError, *ErroBanco) as erro:
+            print(f'Erro ao importar {caminho}: {erro}', file=sys.stderr)
+            codigo_saida = 1
+            continue
+
+        resumo = resultado.resumo()
+        print(f'\n===== IMPORTAÇÃO: {caminho} =====')
+        print(f'Linhas lidas: {resumo["linhas_lidas"]}')
+        print(f'Linhas inseridas: {resumo["linhas_inseridas"]}')
+        print(f'Linhas com erro: {resumo["linhas_com_erro"]}')
+        print(f'Tempo: {resumo["duracao_s"]:.2f} s ({resumo["linhas_por_segundo"]:.0f} linhas/s)')
+        for numero, mensagem in resultado.erros[:args.max_erros]:
+            print(f'  linha {numero}: {mensagem}')
+        if resultado.erros:
+            codigo_saida = 2
+
+    return codigo_saida
+
+if __name__ == '__main__':
+    sys.exit(main())
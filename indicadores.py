@@ -0,0 +1,185 @@
+#Imports das funcionalidades a serem usadas
+import argparse
+import time
+
+import numpy as np
+
+#Indicadores de consumo calculados em memória sobre a série completa de uma empresa.
+#As leituras são carregadas em arrays NumPy (uma coluna por campo) e cada indicador
+#é uma passada vetorizada sobre elas, sem laços em Python por leitura.
+
+JANELA_MEDIA = 7
+PERCENTIS = (5, 25, 50, 75, 95)
+
+#Leituras de uma empresa em colunas: instante (datetime64[s]), kWh e custo, em ordem de data
+class SerieConsumo:
+    def __init__(self, instantes, kwh, custo):
+        ordem = None if len(instantes) < 2 or np.all(instantes[1:] >= instantes[:-1]) else np.argsort(instantes, kind='stable')
+        self.instantes = instantes if ordem is None else instantes[ordem]
+        self.kwh = kwh if ordem is None else kwh[ordem]
+        self.custo = custo if ordem is None else custo[ordem]
+
+    def __len__(self):
+        return len(self.kwh)
+
+#Monta a série a partir dos lotes (segundos, kWh, custo) devolvidos pelo repositório de consumo
+def serie_de_lotes(lotes):
+    blocos = [np.array(lote, dtype=np.float64).reshape(-1, 3) for lote in lotes]
+    matriz = np.concatenate(blocos) if blocos else np.empty((0, 3))
+    instantes = matriz[:, 0].astype(np.int64).astype('datetime64[s]')
+    return SerieConsumo(instantes, np.ascontiguousarray(matriz[:, 1]), np.ascontiguousarray(matriz[:, 2]))
+
+#Carrega a série de uma empresa pela sessão de armazenamento
+def carregar_serie(sessao, cnpj, inicio=None, fim=None, meses=None):
+    return serie_de_lotes(sessao.consumo.lotes_serie(cnpj, inicio, fim, meses=meses))
+
+#Divisão elemento a elemento que devolve NaN onde o divisor é zero
+def _dividir(numerador, denominador):
+    numerador = np.asarray(numerador, dtype=np.float64)
+    denominador = np.asarray(denominador, dtype=np.float64)
+    resultado = np.full(np.broadcast(numerador, denominador).shape, np.nan)
+    np.divide(numerador, denominador, out=resultado, where=denominador != 0)
+    return resultado
+
+#Soma kWh, custo e quantidade de leituras por dia, incluindo os dias sem leitura
+def totais_diarios(serie):
+    dias = serie.instantes.astype('datetime64[D]')
+    primeiro = dias[0]
+    indices = (dias - primeiro).astype(np.int64)
+    tamanho = int(indices[-1]) + 1
+    return (
+        primeiro + np.arange(tamanho),
+        np.bincount(indices, weights=serie.kwh, minlength=tamanho),
+        np.bincount(indices, weights=serie.custo, minlength=tamanho),
+        np.bincount(indices, minlength=tamanho),
+    )
+
+#Agrupa os totais diários por mês (são poucos milhares de dias, não milhões de leituras)
+def totais_mensais(dias, kwh_dia, custo_dia, leituras_dia):
+    meses = dias.astype('datetime64[M]')
+    primeiro = meses[0]
+    indices = (meses - primeiro).astype(np.int64)
+    tamanho = int(indices[-1]) + 1
+    return (
+        primeiro + np.arange(tamanho),
+        np.bincount(indices, weights=kwh_dia, minlength=tamanho),
+        np.bincount(indices, weights=custo_dia, minlength=tamanho),
+        np.bincount(indices, weights=leituras_dia, minlength=tamanho).astype(np.int64),
+    )
+
+#Percentis com interpolação linear (mesmo resultado de np.percentile) a partir de uma única ordenação
+def percentis_ordenados(valores, percentis):
+    if not len(valores):
+        return np.full(len(percentis), np.nan)
+    ordenados = np.sort(valores)
+    posicoes = np.asarray(percentis, dtype=np.float64) / 100 * (len(ordenados) - 1)
+    abaixo = np.floor(posicoes).astype(np.int64)
+    acima = np.minimum(abaixo + 1, len(ordenados) - 1)
+    return ordenados[abaixo] + (ordenados[acima] - ordenados[abaixo]) * (posicoes - abaixo)
+
+#Média móvel simples por soma acumulada: um valor por janela completa
+def media_movel(valores, janela):
+    if janela <= 0 or len(valores) < janela:
+        return np.empty(0)
+    acumulado = np.concatenate(([0.0], np.cumsum(valores, dtype=np.float64)))
+    return (acumulado[janela:] - acumulado[:-janela]) / janela
+
+#Diferença e variação percentual de cada período em relação ao anterior (o primeiro fica sem valor)
+def variacao(valores):
+    delta = np.concatenate(([np.nan], np.diff(valores)))
+    anterior = np.concatenate(([np.nan], valores[:-1]))
+    return delta, _dividir(delta, anterior) * 100
+
+#Converte um array em lista para JSON, trocando NaN por None
+def _lista(valores, casas=4):
+    valores = np.round(np.asarray(valores, dtype=np.float64), casas)
+    return [None if valor != valor else valor for valor in valores.tolist()]
+
+def _numero(valor, casas=4):
+    return None if valor is None or valor != valor else round(float(valor), casas)
+
+#Calcula todos os indicadores da série; num_funcionarios e area_total vêm do cadastro da empresa
+def calcular_indicadores(serie, num_funcionarios=None, area_total=None, janela=JANELA_MEDIA, percentis=PERCENTIS):
+    if not len(serie):
+        return None
+
+    dias, kwh_dia, custo_dia, leituras_dia = totais_diarios(serie)
+    meses, kwh_mes, custo_mes, leituras_mes = totais_mensais(dias, kwh_dia, custo_dia, leituras_dia)
+    delta_mes, variacao_mes = variacao(kwh_mes)
+    delta_custo_mes, variacao_custo_mes = variacao(custo_mes)
+    movel = media_movel(kwh_dia, janela)
+
+    consumo_total = float(serie.kwh.sum())
+    custo_total = float(serie.custo.sum())
+    tarifas = _dividir(serie.custo, serie.kwh)
+    tarifas = tarifas[~np.isnan(tarifas)]
+    percentis = list(percentis)
+
+    return {
+        'leituras': len(serie),
+        'inicio': serie.instantes[0].astype(object),
+        'fim': serie.instantes[-1].astype(object),
+        'consumo_total': _numero(consumo_total),
+        'custo_total': _numero(custo_total),
+        'custo_por_kwh': _numero(_dividir(custo_total, consumo_total)),
+        'kwh_por_funcionario': _numero(_dividir(consumo_total, num_funcionarios or 0)),
+        'kwh_por_m2': _numero(_dividir(consumo_total, area_total or 0)),
+        'percentis': {
+            'percentis': percentis,
+            'consumo_kwh': _lista(percentis_ordenados(serie.kwh, percentis)),
+            'custo_total': _lista(percentis_ordenados(serie.custo, percentis)),
+            'custo_por_kwh': _lista(percentis_ordenados(tarifas, percentis)),
+        },
+        'media_movel': {
+            'janela_dias': janela,
+            'dias': np.datetime_as_string(dias[janela - 1:], unit='D').tolist() if len(movel) else [],
+            'consumo_kwh': _lista(movel),
+        },
+        'mensal': {
+            'meses': np.datetime_as_string(meses, unit='M').tolist(),
+            'leituras': leituras_mes.tolist(),
+            'consumo_kwh': _lista(kwh_mes),
+            'custo_total': _lista(custo_mes),
+            'variacao_kwh': _lista(delta_mes),
+            'variacao_kwh_pct': _lista(variacao_mes, 2),
+            'variacao_custo': _lista(delta_custo_mes),
+            'variacao_custo_pct': _lista(variacao_custo_mes, 2),
+            'custo_por_kwh': _lista(_dividir(custo_mes, kwh_mes)),
+            'kwh_por_funcionario': _lista(_dividir(kwh_mes, num_funcionarios or 0)),
+            'kwh_por_m2': _lista(_dividir(kwh_mes, area_total or 0)),
+        },
+    }
+
+#Carrega a série e o porte da empresa e calcula os indicadores
+def indicadores_empresa(sessao, cnpj, inicio=None, fim=None, janela=JANELA_MEDIA, meses=None):
+    porte = sessao.empresas.porte(cnpj) or (None, None)
+    return calcular_indicadores(carregar_serie(sessao, cnpj, inicio, fim, meses), porte[0], porte[1], janela)
+
+#Série sintética com leituras a cada poucos minutos, para medir o tempo de cálculo
+def serie_sintetica(leituras, semente=42):
+    gerador = np.random.default_rng(semente)
+    inicio = np.datetime64('2020-01-01T00:00:00', 's')
+    instantes = inicio + np.cumsum(gerador.integers(60, 600, leituras)).astype('timedelta64[s]')
+    kwh = gerador.gamma(4.0, 25.0, leituras)
+    custo = kwh * gerador.normal(0.85, 0.05, leituras)
+    return SerieConsumo(instantes, kwh, custo)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Tempo de cálculo dos indicadores de consumo sobre uma série sintética.')
+    parser.add_argument('--leituras', type=int, default=2_000_000)
+    parser.add_argument('--repeticoes', type=int, default=5)
+    args = parser.parse_args(argv)
+
+    serie = serie_sintetica(args.leituras)
+    calcular_indicadores(serie, 120, 3500.0)
+    inicio = time.perf_counter()
+    for _ in range(args.repeticoes):
+        indicadores = calcular_indicadores(serie, 120, 3500.0)
+    duracao = (time.perf_counter() - inicio) / args.repeticoes
+
+    print(f'Leituras: {len(serie)} ({indicadores["inicio"]:%d/%m/%Y} a {indicadores["fim"]:%d/%m/%Y}, '
+          f'{len(indicadores["mensal"]["meses"])} meses)')
+    print(f'Tempo médio de cálculo: {duracao * 1000:.1f} ms ({len(serie) / duracao / 1e6:.1f} milhões de leituras/s)')
+
+if __name__ == '__main__':
+    main()
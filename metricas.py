@@ -0,0 +1,254 @@
+#Imports das funcionalidades a serem usadas
+import atexit
+import functools
+import inspect
+import json
+import os
+import sys
+import threading
+import time
+from bisect import bisect_left
+
+#Medição de tempo das operações (conexão, consultas, consulta de CNPJ, gravação de arquivos).
+#Desligada por padrão: cada ponto medido custa só a checagem de uma variável global.
+#ECOFLUX_METRICAS=1 liga a coleta; ECOFLUX_METRICAS_ARQUIVO grava o resultado ao sair
+#(Prometheus em texto, ou JSON se o arquivo terminar em .json).
+
+#Limites superiores dos baldes dos histogramas, em segundos
+LIMITES = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_ativo = False
+
+#Histograma de latência e contadores de linhas, bytes e erros de uma operação
+#(as chamadas que terminam em exceção entram no histograma e também em erros)
+class Histograma:
+    __slots__ = ('baldes', 'contagem', 'soma', 'minimo', 'maximo', 'linhas', 'bytes', 'erros')
+
+    def __init__(self):
+        self.baldes = [0] * (len(LIMITES) + 1)
+        self.contagem = 0
+        self.soma = 0.0
+        self.minimo = None
+        self.maximo = 0.0
+        self.linhas = 0
+        self.bytes = 0
+        self.erros = 0
+
+    def registrar(self, duracao, linhas=0, bytes=0, erro=False):
+        self.baldes[bisect_left(LIMITES, duracao)] += 1
+        self.contagem += 1
+        self.soma += duracao
+        self.minimo = duracao if self.minimo is None else min(self.minimo, duracao)
+        self.maximo = max(self.maximo, duracao)
+        self.linhas += linhas
+        self.bytes += bytes
+        self.erros += erro
+
+    #Percentil estimado por interpolação dentro do balde
+    def percentil(self, p):
+        if not self.contagem:
+            return None
+        alvo = p / 100 * self.contagem
+        acumulado = 0
+        for posicao, quantidade in enumerate(self.baldes):
+            if quantidade and acumulado + quantidade >= alvo:
+                inferior = LIMITES[posicao - 1] if posicao else 0.0
+                superior = LIMITES[posicao] if posicao < len(LIMITES) else self.maximo
+                estimado = inferior + (superior - inferior) * (alvo - acumulado) / quantidade
+                return min(max(estimado, self.minimo), self.maximo)
+            acumulado += quantidade
+        return self.maximo
+
+class Registro:
+    def __init__(self):
+        self._trava = threading.Lock()
+        self.operacoes = {}
+
+    def registrar(self, nome, duracao, linhas=0, bytes=0, erro=False):
+        with self._trava:
+            histograma = self.operacoes.get(nome)
+            if histograma is None:
+                histograma = self.operacoes[nome] = Histograma()
+            histograma.registrar(duracao, linhas, bytes, erro)
+
+    def limpar(self):
+        with self._trava:
+            self.operacoes = {}
+
+    def resumo(self):
+        with self._trava:
+            operacoes = sorted(self.operacoes.items())
+        return {
+            nome: {
+                'contagem': histograma.contagem,
+                'total_s': round(histograma.soma, 6),
+                'media_ms': round(histograma.soma / histograma.contagem * 1000, 3),
+                'p50_ms': round(histograma.percentil(50) * 1000, 3),
+                'p95_ms': round(histograma.percentil(95) * 1000, 3),
+                'p99_ms': round(histograma.percentil(99) * 1000, 3),
+                'max_ms': round(histograma.maximo * 1000, 3),
+                'linhas': histograma.linhas,
+                'bytes': histograma.bytes,
+                'erros': histograma.erros,
+            }
+            for nome, histograma in operacoes
+        }
+
+    #Formato de exposição de texto do Prometheus
+    def texto_prometheus(self):
+        with self._trava:
+            operacoes = sorted(self.operacoes.items())
+        linhas = [
+            '# HELP ecoflux_operacao_segundos Latência das operações do Ecoflux',
+            '# TYPE ecoflux_operacao_segundos histogram',
+        ]
+        for nome, histograma in operacoes:
+            acumulado = 0
+            for limite, quantidade in zip(LIMITES, histograma.baldes):
+                acumulado += quantidade
+                linhas.append(f'ecoflux_operacao_segundos_bucket{{operacao="{nome}",le="{limite}"}} {acumulado}')
+            linhas.append(f'ecoflux_operacao_segundos_bucket{{operacao="{nome}",le="+Inf"}} {histograma.contagem}')
+            linhas.append(f'ecoflux_operacao_segundos_sum{{operacao="{nome}"}} {histograma.soma:.6f}')
+            linhas.append(f'ecoflux_operacao_segundos_count{{operacao="{nome}"}} {histograma.contagem}')
+        for metrica, campo in (('linhas', 'linhas'), ('bytes', 'bytes'), ('erros', 'erros')):
+            linhas.append(f'# TYPE ecoflux_operacao_{metrica}_total counter')
+            for nome, histograma in operacoes:
+                linhas.append(f'ecoflux_operacao_{metrica}_total{{operacao="{nome}"}} {getattr(histograma, campo)}')
+        return '\n'.join(linhas) + '\n'
+
+registro = Registro()
+
+def ativar():
+    global _ativo
+    _ativo = True
+
+def desativar():
+    global _ativo
+    _ativo = False
+
+def ativo():
+    return _ativo
+
+#Medição de um trecho: with medir('nome') as medicao: ...; medicao.linhas / medicao.bytes opcionais
+class _Medicao:
+    __slots__ = ('nome', 'inicio', 'linhas', 'bytes')
+
+    def __init__(self, nome):
+        self.nome = nome
+        self.linhas = 0
+        self.bytes = 0
+
+    def __enter__(self):
+        self.inicio = time.perf_counter()
+        return self
+
+    def __exit__(self, tipo, *erro):
+        registro.registrar(self.nome, time.perf_counter() - self.inicio, self.linhas, self.bytes, tipo is not None)
+        return False
+
+#Medição que não faz nada, usada enquanto a coleta está desligada
+class _MedicaoNula:
+    __slots__ = ()
+    linhas = 0
+    bytes = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *erro):
+        return False
+
+    def __setattr__(self, nome, valor):
+        pass
+
+_NULA = _MedicaoNula()
+
+def medir(nome):
+    return _Medicao(nome) if _ativo else _NULA
+
+def _linhas(resultado):
+    return len(resultado) if isinstance(resultado, list) else 0
+
+#Decorador para funções e métodos; em geradores mede o tempo gasto dentro do gerador durante a iteração
+#inteira e conta as linhas entregues (um lote em forma de lista conta como suas linhas)
+def medido(nome):
+    def decorador(funcao):
+        if inspect.isgeneratorfunction(funcao):
+            @functools.wraps(funcao)
+            def gerador(*args, **kwargs):
+                if not _ativo:
+                    yield from funcao(*args, **kwargs)
+                    return
+                #Soma só o tempo dentro de cada next() (e do close): o que quem consome faz entre
+                #um item e outro, como gravar o arquivo do relatório, não entra na latência da consulta
+                iterador = funcao(*args, **kwargs)
+                duracao = 0.0
+                linhas = 0
+                erro = False
+                try:
+                    while True:
+                        inicio = time.perf_counter()
+                        try:
+                            item = next(iterador)
+                        except StopIteration:
+                            break
+                        finally:
+                            duracao += time.perf_counter() - inicio
+                        linhas += len(item) if isinstance(item, list) else 1
+                        yield item
+                except Exception:
+                    erro = True
+                    raise
+                finally:
+                    inicio = time.perf_counter()
+                    iterador.close()
+                    duracao += time.perf_counter() - inicio
+                    registro.registrar(nome, duracao, linhas, erro=erro)
+            return gerador
+
+        @functools.wraps(funcao)
+        def envoltorio(*args, **kwargs):
+            if not _ativo:
+                return funcao(*args, **kwargs)
+            inicio = time.perf_counter()
+            resultado = None
+            erro = True
+            try:
+                resultado = funcao(*args, **kwargs)
+                erro = False
+                return resultado
+            finally:
+                registro.registrar(nome, time.perf_counter() - inicio, _linhas(resultado), erro=erro)
+        return envoltorio
+    return decorador
+
+#Grava as métricas em Prometheus (texto) ou JSON, conforme a extensão do arquivo
+def gravar(caminho):
+    if caminho.endswith('.json'):
+        conteudo = json.dumps(registro.resumo(), ensure_ascii=False, indent=2)
+    else:
+        conteudo = registro.texto_prometheus()
+    temporario = caminho + '.tmp'
+    with open(temporario, 'w', encoding='utf-8') as arquivo:
+        arquivo.write(conteudo)
+    os.replace(temporario, caminho)
+
+#Tabela de resumo (usada por --stats)
+def imprimir_resumo(saida=sys.stderr):
+    resumo = registro.resumo()
+    if not resumo:
+        saida.write('Nenhuma operação medida.\n')
+        return
+    saida.write(f'{"Operação":<34} {"N":>7} {"Média ms":>10} {"p50 ms":>9} {"p95 ms":>9} {"p99 ms":>9} {"Máx ms":>9} {"Linhas":>10} {"Bytes":>12} {"Erros":>7}\n')
+    saida.write('-' * 125 + '\n')
+    for nome, valores in resumo.items():
+        saida.write(
+            f'{nome:<34} {valores["contagem"]:>7} {valores["media_ms"]:>10.2f} {valores["p50_ms"]:>9.2f} '
+            f'{valores["p95_ms"]:>9.2f} {valores["p99_ms"]:>9.2f} {valores["max_ms"]:>9.2f} '
+            f'{valores["linhas"]:>10} {valores["bytes"]:>12} {valores["erros"]:>7}\n'
+        )
+
+if os.environ.get('ECOFLUX_METRICAS', '').lower() in ('1', 'true', 'sim'):
+    ativar()
+    if os.environ.get('ECOFLUX_METRICAS_ARQUIVO'):
+        atexit.register(gravar, os.environ['ECOFLUX_METRICAS_ARQUIVO'])
@@ -0,0 +1,331 @@
+#Imports das funcionalidades a serem usadas
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+import anomalias
+from analise import TAMANHO_PAGINA
+from armazenamento import ErroBanco, abrir_sessao, obter_backend
+from cnpj import CNPJNaoEncontrado, ErroConsultaCNPJ, extrair_dados_empresa, obter_cliente
+from diretorio import obter_diretorio
+from indicadores import JANELA_MEDIA, indicadores_empresa
+from perfis import IDADE_MAXIMA_PERFIL, obter_perfis
+from previsao import MESES_HISTORICO, prever_todas
+from ranking import TOP_PADRAO, montar_ranking
+from relatorio import escrever_relatorio, escrever_relatorio_incremental, ler_marca, nome_arquivo_relatorio
+from senhas import autenticar
+from spool import ErroSpool, obter_gravador
+
+#Operações do Ecoflux sem interação com o terminal: recebem os dados prontos,
+#devolvem dicionários e sinalizam problemas com ErroOperacao.
+
+class ErroOperacao(Exception):
+    pass
+
+@contextmanager
+def _sessao():
+    sessao = abrir_sessao()
+    if not sessao:
+        raise ErroOperacao('Falha na conexão com o banco de dados.')
+    try:
+        yield sessao
+    finally:
+        sessao.fechar()
+
+def _exigir_empresa(cnpj):
+    razao_social = obter_diretorio().razao_social(cnpj)
+    if razao_social is None:
+        raise ErroOperacao(f'Empresa {cnpj} não cadastrada.')
+    return razao_social
+
+#Confere usuário e senha
+def login(username, senha):
+    with _sessao() as sessao:
+        try:
+            if not autenticar(sessao, username, senha):
+                raise ErroOperacao('Usuário ou senha inválidos.')
+        except ErroBanco as erro:
+            raise ErroOperacao(f'Erro no login: {erro}') from erro
+    return {'username': username}
+
+#Cadastra uma empresa consultando os dados na API de CNPJ
+def cadastrar_empresa(cnpj, num_funcionarios, area_total, usuario):
+    if len(cnpj) != 14:
+        raise ErroOperacao('CNPJ inválido. Deve conter 14 dígitos.')
+    try:
+        empresa = extrair_dados_empresa(obter_cliente().consultar(cnpj))
+    except ErroConsultaCNPJ as erro:
+        raise ErroOperacao(str(erro)) from erro
+
+    with _sessao() as sessao:
+        try:
+            sessao.empresas.inserir((
+                cnpj, empresa['razao_social'], empresa['nome_fantasia'], empresa['setor'],
+                empresa['endereco'], empresa['responsavel'], empresa['contato'],
+                int(num_funcionarios), float(area_total), usuario
+            ))
+            sessao.commit()
+        except ErroBanco as erro:
+            sessao.rollback()
+            raise ErroOperacao(f'Erro ao cadastrar: {erro}') from erro
+
+    obter_diretorio().adicionar(cnpj, empresa['razao_social'])
+    return {'cnpj': cnpj, **empresa, 'num_funcionarios': int(num_funcionarios), 'area_total': float(area_total)}
+
+def _exigir_perfis():
+    perfis = obter_perfis()
+    if perfis is None:
+        raise ErroOperacao('Armazenamento de perfis desativado (ECOFLUX_CNPJ_PERFIS vazio).')
+    return perfis
+
+#Perfil completo de um CNPJ guardado localmente (consulta a API só se ainda não existir, estiver velho ou com atualizar)
+def perfil_empresa(cnpj, atualizar=False):
+    perfis = _exigir_perfis()
+    try:
+        dados = obter_cliente().consultar(cnpj, atualizar)
+    except ErroConsultaCNPJ as erro:
+        raise ErroOperacao(str(erro)) from erro
+    perfil = perfis.obter(cnpj)
+    idade = round(perfil[1]) if perfil else None
+    return {'cnpj': cnpj, 'idade_s': idade, 'resumo': extrair_dados_empresa(dados), 'perfil': dados}
+
+#Consulta de novo na API os perfis mais velhos que a idade máxima (respeitando o limite de requisições)
+def atualizar_perfis(idade_maxima=IDADE_MAXIMA_PERFIL, limite=None):
+    perfis = _exigir_perfis()
+    cliente = obter_cliente()
+    resultado = {'atualizados': 0, 'nao_encontrados': [], 'erros': []}
+    for cnpj in perfis.desatualizados(idade_maxima, limite):
+        try:
+            cliente.consultar(cnpj, atualizar=True)
+            resultado['atualizados'] += 1
+        except CNPJNaoEncontrado:
+            resultado['nao_encontrados'].append(cnpj)
+        except ErroConsultaCNPJ as erro:
+            resultado['erros'].append({'cnpj': cnpj, 'erro': str(erro)})
+    return resultado
+
+#Registra uma leitura de consumo (data_registro None usa a data do banco)
+def registrar_consumo(cnpj, consumo_kwh, custo_total, usuario, setor=None, observacoes=None, data_registro=None):
+    _exigir_empresa(cnpj)
+    linha = (
+        cnpj, data_registro, float(consumo_kwh), float(custo_total),
+        setor or 'Não especificado', observacoes or 'Sem observações', usuario
+    )
+
+    with _sessao() as sessao:
+        try:
+            gravada = sessao.consumo.inserir(linha)
+            anomalia = anomalias.verificar_leitura(sessao, cnpj, linha[4], gravada, linha[2])
+            sessao.commit()
+        except ErroBanco as erro:
+            sessao.rollback()
+            raise ErroOperacao(f'Erro ao registrar consumo: {erro}') from erro
+
+    return {
+        'cnpj': cnpj, 'data_registro': data_registro, 'consumo_kwh': linha[2], 'custo_total': linha[3],
+        'setor': linha[4], 'observacoes': linha[5], 'anomalia': anomalia,
+    }
+
+def _gravador():
+    try:
+        return obter_gravador()
+    except (ErroSpool, OSError) as erro:
+        raise ErroOperacao(f'Spool indisponível: {erro}') from erro
+
+#Registra uma leitura no spool local e confirma sem esperar o banco (gravada depois, em lotes, pela thread do spool
+#ou pelo drain-spool). A empresa não é conferida aqui: uma leitura de CNPJ não cadastrado vai para as rejeitadas.
+def registrar_consumo_adiado(cnpj, consumo_kwh, custo_total, usuario, setor=None, observacoes=None, data_registro=None):
+    if len(cnpj) != 14 or not cnpj.isdigit():
+        raise ErroOperacao('CNPJ inválido. Deve conter 14 dígitos.')
+    try:
+        registro = _gravador().registrar(cnpj, consumo_kwh, custo_total, usuario, setor, observacoes, data_registro)
+    except OSError as erro:
+        raise ErroOperacao(f'Erro ao gravar no spool: {erro}') from erro
+    return {**registro, 'adiado': True}
+
+#Grava no banco as leituras pendentes no spool
+def esvaziar_spool(limite_lotes=None):
+    gravador = _gravador()
+    try:
+        return gravador.esvaziar(limite_lotes)
+    except (*ErroBanco, RuntimeError) as erro:
+        raise ErroOperacao(f'Erro ao gravar o spool no banco: {erro}') from erro
+
+#Resumo de consumo dos últimos meses (consulta direta) ou de um período (rollups). Com detalhes, inclui uma
+#página dos consumos do mesmo período, paginada por chave como o histórico: passe em apos a 'proxima' anterior.
+def analisar_consumo(cnpj, meses=6, inicio=None, fim=None, detalhes=False, apos=None, tamanho_pagina=TAMANHO_PAGINA):
+    razao_social = _exigir_empresa(cnpj)
+
+    with _sessao() as sessao:
+        try:
+            if inicio and fim:
+                resumo = sessao.consumo.resumo_periodo(cnpj, inicio, fim)
+            else:
+                resumo = sessao.consumo.resumo(cnpj, meses)
+
+            consumos = proxima = None
+            if detalhes or apos:
+                if inicio and fim:
+                    consumos, proxima = sessao.consumo.historico(cnpj, None, inicio, fim, _ler_chave(apos), tamanho_pagina)
+                else:
+                    consumos, proxima = sessao.consumo.historico(cnpj, apos=_ler_chave(apos), tamanho=tamanho_pagina, meses=meses)
+            recentes = [anomalias.descrever(linha) for linha in sessao.anomalias.listar(cnpj)]
+        except ErroBanco as erro:
+            raise ErroOperacao(f'Erro ao analisar consumo: {erro}') from erro
+
+    resultado = {'cnpj': cnpj, 'razao_social': razao_social, 'resumo': resumo, 'anomalias': recentes}
+    if consumos is not None:
+        resultado['detalhes'] = [
+            {'data_registro': consumo[0], 'consumo_kwh': consumo[1], 'custo_total': consumo[2], 'setor': consumo[3]}
+            for consumo in consumos
+        ]
+        resultado['proxima'] = _codificar_chave(proxima)
+    return resultado
+
+#Cria as tabelas auxiliares do backend (no Oracle: rollups, anomalias, ordem de gravação e chaves do spool)
+def criar_estrutura():
+    backend = obter_backend()
+    try:
+        backend.criar_estrutura()
+    except ErroBanco as erro:
+        raise ErroOperacao(f'Erro ao criar a estrutura do banco: {erro}') from erro
+    return {'backend': backend.nome}
+
+#Recalcula os rollups diários e mensais a partir de consumo_energetico (todo o histórico ou o período)
+def reconstruir_rollups(inicio=None, fim=None):
+    with _sessao() as sessao:
+        inicio_execucao = time.perf_counter()
+        try:
+            dias, meses = sessao.consumo.reconstruir_rollups(inicio, fim)
+        except ErroBanco as erro:
+            sessao.rollback()
+            raise ErroOperacao(f'Erro ao reconstruir os rollups: {erro}') from erro
+    return {'linhas_diarias': dias, 'linhas_mensais': meses, 'duracao_s': round(time.perf_counter() - inicio_execucao, 3)}
+
+#Processa as leituras ainda não avaliadas pela detecção de anomalias (todas as empresas ou uma)
+def varrer_anomalias(cnpj=None):
+    if cnpj:
+        _exigir_empresa(cnpj)
+
+    with _sessao() as sessao:
+        try:
+            return anomalias.varrer(sessao, cnpj)
+        except ErroBanco as erro:
+            sessao.rollback()
+            raise ErroOperacao(f'Erro ao varrer anomalias: {erro}') from erro
+
+#Ranking de todas as empresas por kWh/m², kWh/funcionário e custo/kWh no período (padrão: últimos 12 meses)
+def ranking_empresas(inicio=None, fim=None, top=TOP_PADRAO, cnpj=None, setor=None):
+    if cnpj:
+        _exigir_empresa(cnpj)
+    fim = fim or datetime.now()
+    inicio = inicio or fim - timedelta(days=365)
+
+    with _sessao() as sessao:
+        try:
+            ranking = montar_ranking(sessao.consumo.totais_empresas(inicio, fim), top, cnpj, setor)
+        except ErroBanco as erro:
+            raise ErroOperacao(f'Erro ao montar o ranking: {erro}') from erro
+
+    return {'inicio': inicio, 'fim': fim, **ranking}
+
+#Indicadores calculados em memória sobre a série de leituras (médias móveis, variação mensal, intensidade, percentis)
+def indicadores_consumo(cnpj, inicio=None, fim=None, janela=JANELA_MEDIA):
+    razao_social = _exigir_empresa(cnpj)
+
+    with _sessao() as sessao:
+        try:
+            indicadores = indicadores_empresa(sessao, cnpj, inicio, fim, janela)
+        except ErroBanco as erro:
+            raise ErroOperacao(f'Erro ao calcular indicadores: {erro}') from erro
+
+    return {'cnpj': cnpj, 'razao_social': razao_social, 'indicadores': indicadores}
+
+#Previsão do consumo e do custo do próximo mês: ajusta todas as séries de uma vez (com cache até
+#entrar leitura nova) e devolve uma empresa ou, sem cnpj, todas, das que mais consomem para as que menos
+def prever_consumo(cnpj=None, metodo='auto', horizonte=1, meses=MESES_HISTORICO):
+    razao_social = _exigir_empresa(cnpj) if cnpj else None
+    if horizonte < 1:
+        raise ErroOperacao('O horizonte da previsão deve ser de pelo menos 1 mês.')
+
+    with _sessao() as sessao:
+        try:
+            previsao = prever_todas(sessao, metodo, horizonte, meses)
+        except ErroBanco as erro:
+            raise ErroOperacao(f'Erro ao prever consumo: {erro}') from erro
+
+    empresas = previsao['empresas']
+    resultado = {chave: valor for chave, valor in previsao.items() if chave != 'empresas'}
+    if cnpj:
+        if cnpj not in empresas:
+            raise ErroOperacao(f'Empresa {cnpj} sem consumo no período usado na previsão.')
+        return {**resultado, 'razao_social': razao_social, 'previsao': empresas[cnpj]}
+    resultado['empresas'] = sorted(empresas.values(), key=lambda empresa: empresa['consumo_kwh'], reverse=True)
+    return resultado
+
+#Chave de página do histórico como texto ('data ISO|linha'), para ser repassada pela linha de comando
+def _codificar_chave(chave):
+    return f'{chave[0].isoformat()}|{chave[1]}' if chave else None
+
+def _ler_chave(texto):
+    if not texto:
+        return None
+    data, _, linha = texto.partition('|')
+    if not linha:
+        raise ErroOperacao(f'Chave de página inválida: {texto}')
+    return datetime.fromisoformat(data), linha
+
+#Histórico de consumos paginado por chave: passe em apos a 'proxima' da página anterior
+def historico_consumo(cnpj, setor=None, inicio=None, fim=None, apos=None, tamanho=TAMANHO_PAGINA):
+    razao_social = _exigir_empresa(cnpj)
+
+    with _sessao() as sessao:
+        try:
+            consumos, proxima = sessao.consumo.historico(cnpj, setor, inicio, fim, _ler_chave(apos), tamanho)
+        except ErroBanco as erro:
+            raise ErroOperacao(f'Erro ao consultar o histórico: {erro}') from erro
+
+    return {
+        'cnpj': cnpj,
+        'razao_social': razao_social,
+        'consumos': [
+            {'data_registro': consumo[0], 'consumo_kwh': consumo[1], 'custo_total': consumo[2],
+             'setor': consumo[3], 'observacoes': consumo[4]}
+            for consumo in consumos
+        ],
+        'proxima': _codificar_chave(proxima),
+    }
+
+#Gera o relatório de uma empresa; tipo 'consumos' (histórico completo) ou 'mensal' (rollup mensal).
+#Com incremental, só as leituras posteriores à marca d'água do arquivo são lidas e gravadas.
+def gerar_relatorio(cnpj, formato='json', diretorio='.', tipo='consumos', inicio=None, fim=None, sessao=None, incremental=False):
+    razao_social = _exigir_empresa(cnpj)
+    if incremental and tipo != 'consumos':
+        raise ErroOperacao('O relatório incremental só está disponível para o tipo consumos.')
+
+    if sessao is None:
+        with _sessao() as sessao:
+            return gerar_relatorio(cnpj, formato, diretorio, tipo, inicio, fim, sessao, incremental)
+
+    try:
+        if incremental:
+            caminho = nome_arquivo_relatorio(cnpj, formato, diretorio)
+            marca = ler_marca(caminho, formato)
+            linhas = sessao.consumo.iterar_novos(cnpj, marca['chave'] if marca else None)
+            total, marca = escrever_relatorio_incremental(linhas, cnpj, razao_social, caminho, formato, marca)
+            return {
+                'cnpj': cnpj, 'arquivo': caminho if marca else None, 'registros': total,
+                'registros_total': marca['registros'] if marca else 0, 'partes': marca['partes'] if marca else 0,
+            }
+        if tipo == 'mensal':
+            caminho = nome_arquivo_relatorio(cnpj, formato, diretorio, sufixo='_mensal')
+            linhas = sessao.consumo.iterar_resumo_mensal(cnpj, inicio, fim)
+            total = escrever_relatorio(linhas, cnpj, razao_social, caminho, formato, chave='meses')
+        else:
+            caminho = nome_arquivo_relatorio(cnpj, formato, diretorio)
+            linhas = sessao.consumo.iterar(cnpj)
+            total = escrever_relatorio(linhas, cnpj, razao_social, caminho, formato)
+    except ErroBanco as erro:
+        raise ErroOperacao(f'Erro ao gerar relatório: {erro}') from erro
+
+    return {'cnpj': cnpj, 'arquivo': caminho if total else None, 'registros': total}
@@ -0,0 +1,117 @@
+#Imports das funcionalidades a serem usadas
+import json
+import os
+import sqlite3
+import threading
+import time
+
+#Perfis completos devolvidos pela API de CNPJ (empresa, sócios, endereço, e-mails, telefones, atividades),
+#guardados em um SQLite local por CNPJ com a data da consulta. O cadastro só grava alguns campos na
+#tabela empresas; o restante fica aqui para consultas de setor, recadastros e relatórios sem chamar a API.
+
+ARQUIVO_PERFIS = os.environ.get('ECOFLUX_CNPJ_PERFIS', 'perfis_cnpj.db') or None
+
+#Idade a partir da qual o perfil é consultado de novo na API (em segundos)
+IDADE_MAXIMA_PERFIL = float(os.environ.get('ECOFLUX_CNPJ_IDADE_PERFIL', 30 * 24 * 60 * 60))
+
+DDL_PERFIS = '''
+    CREATE TABLE IF NOT EXISTS perfis_cnpj (
+        cnpj TEXT PRIMARY KEY,
+        razao_social TEXT,
+        setor TEXT,
+        uf TEXT,
+        municipio TEXT,
+        consultado_em REAL NOT NULL,
+        dados TEXT NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS idx_perfis_setor ON perfis_cnpj (setor);
+    CREATE INDEX IF NOT EXISTS idx_perfis_uf_municipio ON perfis_cnpj (uf, municipio);
+    CREATE INDEX IF NOT EXISTS idx_perfis_consultado ON perfis_cnpj (consultado_em);
+'''
+
+#Colunas indexadas tiradas do retorno da API
+def _colunas(dados):
+    empresa = dados.get('company') or {}
+    atividade = dados.get('mainActivity') or empresa.get('mainActivity') or {}
+    endereco = dados.get('address') or {}
+    return empresa.get('name'), atividade.get('text'), endereco.get('state'), endereco.get('city')
+
+class PerfisCNPJ:
+    def __init__(self, arquivo=ARQUIVO_PERFIS):
+        self.arquivo = arquivo
+        self._trava = threading.Lock()
+        self._conexao = sqlite3.connect(arquivo, timeout=30, check_same_thread=False)
+        self._conexao.execute('PRAGMA journal_mode=WAL')
+        self._conexao.execute('PRAGMA synchronous=NORMAL')
+        self._conexao.executescript(DDL_PERFIS)
+
+    def guardar(self, cnpj, dados, consultado_em=None):
+        razao_social, setor, uf, municipio = _colunas(dados)
+        with self._trava, self._conexao:
+            self._conexao.execute('''
+                INSERT INTO perfis_cnpj (cnpj, razao_social, setor, uf, municipio, consultado_em, dados)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (cnpj) DO UPDATE SET
+                    razao_social = excluded.razao_social, setor = excluded.setor, uf = excluded.uf,
+                    municipio = excluded.municipio, consultado_em = excluded.consultado_em, dados = excluded.dados
+            ''', (cnpj, razao_social, setor, uf, municipio, consultado_em or time.time(),
+                  json.dumps(dados, ensure_ascii=False, separators=(',', ':'))))
+
+    #(dados, idade em segundos) do perfil, ou None se o CNPJ nunca foi consultado
+    def obter(self, cnpj):
+        with self._trava:
+            linha = self._conexao.execute(
+                'SELECT dados, consultado_em FROM perfis_cnpj WHERE cnpj = ?', (cnpj,)
+            ).fetchone()
+        if linha is None:
+            return None
+        return json.loads(linha[0]), time.time() - linha[1]
+
+    #Setor (atividade principal) sem carregar o perfil inteiro
+    def setor(self, cnpj):
+        with self._trava:
+            linha = self._conexao.execute('SELECT setor FROM perfis_cnpj WHERE cnpj = ?', (cnpj,)).fetchone()
+        return linha[0] if linha else None
+
+    #CNPJs cujo setor contém o texto, com razão social e setor
+    def buscar_setor(self, texto, limite=100):
+        with self._trava:
+            return self._conexao.execute('''
+                SELECT cnpj, razao_social, setor FROM perfis_cnpj
+                WHERE setor LIKE ? ORDER BY razao_social LIMIT ?
+            ''', (f'%{texto}%', limite)).fetchall()
+
+    #CNPJs consultados há mais tempo que a idade máxima, dos mais antigos para os mais novos
+    def desatualizados(self, idade_maxima=IDADE_MAXIMA_PERFIL, limite=None):
+        with self._trava:
+            return [linha[0] for linha in self._conexao.execute('''
+                SELECT cnpj FROM perfis_cnpj WHERE consultado_em < ? ORDER BY consultado_em LIMIT ?
+            ''', (time.time() - idade_maxima, -1 if limite is None else limite))]
+
+    def remover(self, cnpj):
+        with self._trava, self._conexao:
+            self._conexao.execute('DELETE FROM perfis_cnpj WHERE cnpj = ?', (cnpj,))
+
+    def __len__(self):
+        with self._trava:
+            return self._conexao.execute('SELECT COUNT(*) FROM perfis_cnpj').fetchone()[0]
+
+    def fechar(self):
+        with self._trava:
+            self._conexao.close()
+
+_perfis_padrao = None
+_trava_perfis = threading.Lock()
+
+#Retorna o armazenamento de perfis compartilhado pelo processo (None se ECOFLUX_CNPJ_PERFIS estiver vazio)
+def obter_perfis():
+    global _perfis_padrao
+    with _trava_perfis:
+        if _perfis_padrao is None and ARQUIVO_PERFIS:
+            _perfis_padrao = PerfisCNPJ(ARQUIVO_PERFIS)
+        return _perfis_padrao
+
+def definir_perfis(perfis):
+    global _perfis_padrao
+    with _trava_perfis:
+        _perfis_padrao = perfis
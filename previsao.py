@@ -0,0 +1,326 @@
+#Imports das funcionalidades a serem usadas
+import argparse
+import json
+import os
+import threading
+import time
+from datetime import datetime
+
+import numpy as np
+
+#Previsão do consumo (kWh) e do custo (R$) dos próximos meses para todas as séries (empresa + setor)
+#de uma vez. Os totais mensais vêm do rollup consumo_mensal e formam uma matriz séries x meses;
+#cada modelo é uma conta vetorizada sobre a matriz inteira (o Holt-Winters percorre os meses,
+#mas atualiza todas as séries a cada passo). O resultado fica em cache até entrar leitura nova.
+
+#Meses de histórico usados no ajuste e tamanho da estação (meses)
+MESES_HISTORICO = int(os.environ.get('ECOFLUX_PREVISAO_MESES', 36))
+ESTACAO = 12
+
+#Meses usados na tendência linear e no custo médio por kWh
+JANELA_TENDENCIA = 12
+JANELA_TARIFA = 3
+
+#Suavização do Holt-Winters aditivo: nível, tendência e sazonalidade
+CONFIG_HOLT_WINTERS = {
+    'alfa': float(os.environ.get('ECOFLUX_PREVISAO_ALFA', 0.3)),
+    'beta': float(os.environ.get('ECOFLUX_PREVISAO_BETA', 0.05)),
+    'gama': float(os.environ.get('ECOFLUX_PREVISAO_GAMA', 0.2)),
+}
+
+#Métodos disponíveis; 'auto' escolhe por série conforme o histórico disponível
+#(Holt-Winters com 2 estações, sazonal ingênuo com 1, tendência linear com 3 meses, média abaixo disso)
+METODOS = ('auto', 'holt_winters', 'sazonal_ingenuo', 'tendencia_linear', 'media')
+
+#Resultados guardados em memória e, com ECOFLUX_PREVISAO_ARQUIVO, também em disco
+ARQUIVO_CACHE = os.environ.get('ECOFLUX_PREVISAO_ARQUIVO') or None
+
+#Séries em forma de matriz: chaves (cnpj, setor), kWh e custo por mês (zero em mês sem leitura)
+#e o índice do primeiro mês com leitura de cada série
+class MatrizMensal:
+    def __init__(self, chaves, kwh, custo, inicio, primeiro_mes):
+        self.chaves = chaves
+        self.kwh = kwh
+        self.custo = custo
+        self.inicio = inicio
+        self.primeiro_mes = primeiro_mes
+
+    def __len__(self):
+        return len(self.chaves)
+
+    #Meses de histórico de cada série
+    @property
+    def historico(self):
+        return self.kwh.shape[1] - self.inicio
+
+def _indice_mes(data):
+    return data.year * 12 + data.month - 1
+
+def _mes_texto(indice):
+    return f'{indice // 12:04d}-{indice % 12 + 1:02d}'
+
+#Monta a matriz a partir das linhas (cnpj, setor, índice do mês, kWh, custo) com meses em [primeiro_mes, primeiro_mes + meses)
+def montar_matriz(linhas, primeiro_mes, meses):
+    linhas = list(linhas)
+    if not linhas:
+        vazia = np.zeros((0, meses))
+        return MatrizMensal([], vazia, vazia, np.zeros(0, dtype=np.int64), primeiro_mes)
+
+    cnpjs, setores, meses_linhas, kwh, custo = zip(*linhas)
+    posicoes = {}
+    series = np.array([posicoes.setdefault(chave, len(posicoes)) for chave in zip(cnpjs, setores)], dtype=np.int64)
+    colunas = np.array(meses_linhas, dtype=np.int64) - primeiro_mes
+    dentro = (colunas >= 0) & (colunas < meses)
+    series, colunas = series[dentro], colunas[dentro]
+    kwh = np.nan_to_num(np.array(kwh, dtype=np.float64)[dentro])
+    custo = np.nan_to_num(np.array(custo, dtype=np.float64)[dentro])
+
+    quantidade = len(posicoes)
+    celulas = series * meses + colunas
+    matriz_kwh = np.bincount(celulas, kwh, quantidade * meses).reshape(quantidade, meses)
+    matriz_custo = np.bincount(celulas, custo, quantidade * meses).reshape(quantidade, meses)
+    inicio = np.full(quantidade, meses, dtype=np.int64)
+    np.minimum.at(inicio, series, colunas)
+    return MatrizMensal(list(posicoes), matriz_kwh, matriz_custo, inicio, primeiro_mes)
+
+#Média dos meses de histórico de cada série
+def _media(matriz):
+    historico = np.maximum(matriz.historico, 1)
+    return matriz.kwh.sum(axis=1) / historico
+
+#Mesmo mês do ano anterior (para horizontes de até uma estação)
+def _sazonal_ingenuo(matriz, horizonte):
+    meses = matriz.kwh.shape[1]
+    coluna = meses - 1 + horizonte - ESTACAO * ((horizonte - 1) // ESTACAO + 1)
+    return matriz.kwh[:, coluna]
+
+#Reta de mínimos quadrados sobre os últimos JANELA_TENDENCIA meses de cada série
+def _tendencia_linear(matriz, horizonte):
+    meses = matriz.kwh.shape[1]
+    tempos = np.arange(meses, dtype=np.float64)
+    pesos = (tempos >= np.maximum(matriz.inicio, meses - JANELA_TENDENCIA)[:, None]).astype(np.float64)
+    quantidade = np.maximum(pesos.sum(axis=1), 1)
+    media_t = (pesos * tempos).sum(axis=1) / quantidade
+    media_y = (pesos * matriz.kwh).sum(axis=1) / quantidade
+    desvio_t = (tempos - media_t[:, None]) * pesos
+    variancia = (desvio_t ** 2).sum(axis=1)
+    inclinacao = np.divide((desvio_t * (matriz.kwh - media_y[:, None])).sum(axis=1), variancia,
+                           out=np.zeros_like(variancia), where=variancia > 0)
+    return media_y + inclinacao * (meses - 1 + horizonte - media_t)
+
+#Holt-Winters aditivo. Cada série começa no seu primeiro mês: as duas primeiras estações dão o nível,
+#a tendência e os índices sazonais iniciais, e a partir daí todas as séries são atualizadas juntas, mês a mês.
+def _holt_winters(matriz, horizonte, config=None):
+    config = config or CONFIG_HOLT_WINTERS
+    alfa, beta, gama = config['alfa'], config['beta'], config['gama']
+    kwh = matriz.kwh
+    quantidade, meses = kwh.shape
+    inicio = np.minimum(matriz.inicio, max(meses - 2 * ESTACAO, 0))
+
+    linhas = np.arange(quantidade)[:, None]
+    primeira = kwh[linhas, np.minimum(inicio[:, None] + np.arange(ESTACAO), meses - 1)]
+    segunda = kwh[linhas, np.minimum(inicio[:, None] + ESTACAO + np.arange(ESTACAO), meses - 1)]
+    nivel = primeira.mean(axis=1)
+    tendencia = (segunda.mean(axis=1) - nivel) / ESTACAO
+    sazonal = np.zeros((quantidade, ESTACAO))
+    sazonal[linhas, (inicio[:, None] + np.arange(ESTACAO)) % ESTACAO] = primeira - nivel[:, None]
+    nivel = nivel + tendencia * (ESTACAO - 1)
+
+    for mes in range(int(inicio.min(initial=meses)) + ESTACAO, meses):
+        ativas = mes >= inicio + ESTACAO
+        if not ativas.any():
+            continue
+        valor = kwh[:, mes]
+        posicao = mes % ESTACAO
+        anterior = nivel
+        novo_nivel = alfa * (valor - sazonal[:, posicao]) + (1 - alfa) * (nivel + tendencia)
+        nova_tendencia = beta * (novo_nivel - anterior) + (1 - beta) * tendencia
+        novo_sazonal = gama * (valor - novo_nivel) + (1 - gama) * sazonal[:, posicao]
+        nivel = np.where(ativas, novo_nivel, nivel)
+        tendencia = np.where(ativas, nova_tendencia, tendencia)
+        sazonal[:, posicao] = np.where(ativas, novo_sazonal, sazonal[:, posicao])
+
+    return nivel + tendencia * horizonte + sazonal[:, (meses - 1 + horizonte) % ESTACAO]
+
+_MODELOS = {
+    'holt_winters': _holt_winters,
+    'sazonal_ingenuo': _sazonal_ingenuo,
+    'tendencia_linear': _tendencia_linear,
+    'media': lambda matriz, horizonte: _media(matriz),
+}
+
+#Método usado em cada série no modo 'auto'
+def _escolher_metodos(matriz):
+    historico = matriz.historico
+    return np.select(
+        [historico >= 2 * ESTACAO, historico >= ESTACAO, historico >= 3],
+        ['holt_winters', 'sazonal_ingenuo', 'tendencia_linear'],
+        'media',
+    )
+
+#Custo médio por kWh dos últimos meses de cada série; sem consumo recente, usa o histórico inteiro
+#da série e, sem nenhum consumo, a mediana das outras séries
+def _tarifas(matriz):
+    def razao(kwh, custo):
+        kwh = kwh.sum(axis=1)
+        return np.divide(custo.sum(axis=1), kwh, out=np.full(len(kwh), np.nan), where=kwh > 0)
+
+    tarifas = razao(matriz.kwh[:, -JANELA_TARIFA:], matriz.custo[:, -JANELA_TARIFA:])
+    tarifas = np.where(np.isnan(tarifas), razao(matriz.kwh, matriz.custo), tarifas)
+    validas = tarifas[~np.isnan(tarifas)]
+    return np.where(np.isnan(tarifas), np.median(validas) if len(validas) else 0.0, tarifas)
+
+#Previsão vetorizada de todas as séries: (kWh, custo, método de cada série) para o mês 'horizonte' depois do último
+def prever(matriz, metodo='auto', horizonte=1):
+    if metodo not in METODOS:
+        raise ValueError(f'Método de previsão desconhecido: {metodo}')
+    if metodo == 'auto':
+        metodos = _escolher_metodos(matriz)
+        kwh = np.zeros(len(matriz))
+        for nome in np.unique(metodos):
+            selecionadas = metodos == nome
+            kwh[selecionadas] = _MODELOS[nome](_subconjunto(matriz, selecionadas), horizonte)
+    else:
+        metodos = np.full(len(matriz), metodo)
+        kwh = _MODELOS[metodo](matriz, horizonte)
+    kwh = np.maximum(kwh, 0.0)
+    return kwh, kwh * _tarifas(matriz), metodos
+
+def _subconjunto(matriz, selecionadas):
+    chaves = [chave for chave, escolhida in zip(matriz.chaves, selecionadas) if escolhida]
+    return MatrizMensal(chaves, matriz.kwh[selecionadas], matriz.custo[selecionadas], matriz.inicio[selecionadas], matriz.primeiro_mes)
+
+#Junta as previsões das séries por empresa
+def _por_empresa(matriz, kwh, custo, metodos, mes):
+    empresas = {}
+    for (cnpj, setor), valor_kwh, valor_custo, metodo, historico in zip(
+        matriz.chaves, kwh.tolist(), custo.tolist(), metodos.tolist(), matriz.historico.tolist()
+    ):
+        empresa = empresas.get(cnpj)
+        if empresa is None:
+            empresa = empresas[cnpj] = {'cnpj': cnpj, 'mes': mes, 'consumo_kwh': 0.0, 'custo_total': 0.0, 'setores': []}
+        empresa['consumo_kwh'] += valor_kwh
+        empresa['custo_total'] += valor_custo
+        empresa['setores'].append({
+            'setor': setor, 'consumo_kwh': round(valor_kwh, 3), 'custo_total': round(valor_custo, 2),
+            'metodo': metodo, 'meses_historico': historico,
+        })
+    for empresa in empresas.values():
+        empresa['consumo_kwh'] = round(empresa['consumo_kwh'], 3)
+        empresa['custo_total'] = round(empresa['custo_total'], 2)
+    return empresas
+
+#Ajusta e prevê todas as séries a partir das linhas mensais; o último mês usado é 'ultimo_mes' (índice)
+def prever_linhas(linhas, ultimo_mes, metodo='auto', horizonte=1, meses=MESES_HISTORICO):
+    inicio = time.perf_counter()
+    primeiro_mes = ultimo_mes - meses + 1
+    matriz = montar_matriz(linhas, primeiro_mes, meses)
+    kwh, custo, metodos = prever(matriz, metodo, horizonte)
+    mes = _mes_texto(ultimo_mes + horizonte)
+    return {
+        'mes': mes,
+        'metodo': metodo,
+        'base': f'{_mes_texto(primeiro_mes)} a {_mes_texto(ultimo_mes)}',
+        'series': len(matriz),
+        'duracao_s': round(time.perf_counter() - inicio, 3),
+        'empresas': _por_empresa(matriz, kwh, custo, metodos, mes),
+    }
+
+#Cache das previsões, válido enquanto a impressão dos rollups (que muda a cada leitura gravada)
+#e o último mês completo forem os mesmos
+class CachePrevisoes:
+    def __init__(self, arquivo=ARQUIVO_CACHE):
+        self.arquivo = arquivo
+        self._dados = {}
+        self._trava = threading.Lock()
+        if arquivo:
+            self._carregar()
+
+    def obter(self, chave, impressao):
+        with self._trava:
+            item = self._dados.get(chave)
+        if item is None or item['impressao'] != impressao:
+            return None
+        return item['resultado']
+
+    def guardar(self, chave, impressao, resultado):
+        with self._trava:
+            self._dados[chave] = {'impressao': impressao, 'resultado': resultado}
+            if self.arquivo:
+                self._salvar()
+
+    def limpar(self):
+        with self._trava:
+            self._dados.clear()
+            if self.arquivo:
+                self._salvar()
+
+    def _carregar(self):
+        try:
+            with open(self.arquivo, 'r', encoding='utf-8') as arquivo:
+                self._dados = json.load(arquivo)
+        except (OSError, ValueError):
+            self._dados = {}
+
+    def _salvar(self):
+        temporario = f'{self.arquivo}.tmp'
+        with open(temporario, 'w', encoding='utf-8') as arquivo:
+            json.dump(self._dados, arquivo, ensure_ascii=False)
+        os.replace(temporario, self.arquivo)
+
+cache_previsoes = CachePrevisoes()
+
+#Previsão de todas as empresas pela sessão de armazenamento, usando o cache quando não há leitura nova.
+#A base são os meses completos até o mês anterior ao atual.
+def prever_todas(sessao, metodo='auto', horizonte=1, meses=MESES_HISTORICO, agora=None):
+    ultimo_mes = _indice_mes(agora or datetime.now()) - 1
+    chave = f'{metodo}|{horizonte}|{meses}|{ultimo_mes}'
+    impressao = [str(valor) for valor in sessao.consumo.impressao_rollups()]
+    resultado = cache_previsoes.obter(chave, impressao)
+    if resultado is not None:
+        return {**resultado, 'cache': True}
+
+    primeiro = ultimo_mes - meses + 1
+    inicio = datetime(primeiro // 12, primeiro % 12 + 1, 1)
+    fim = datetime((ultimo_mes + 1) // 12, (ultimo_mes + 1) % 12 + 1, 1)
+    resultado = prever_linhas(sessao.consumo.series_mensais(inicio, fim), ultimo_mes, metodo, horizonte, meses)
+    cache_previsoes.guardar(chave, impressao, resultado)
+    return {**resultado, 'cache': False}
+
+#Linhas mensais sintéticas (sazonalidade anual, tendência e ruído) para medir o tempo do ajuste
+def linhas_sinteticas(series, meses, semente=42):
+    gerador = np.random.default_rng(semente)
+    base = gerador.gamma(3.0, 2000.0, series)
+    tendencia = gerador.normal(0.0, 0.01, series)
+    fase = gerador.uniform(0, 2 * np.pi, series)
+    inicio = gerador.integers(0, meses - 1, series) * (gerador.random(series) < 0.3)
+    tempos = np.arange(meses)
+    kwh = base[:, None] * (1 + tendencia[:, None] * tempos + 0.25 * np.sin(2 * np.pi * tempos / ESTACAO + fase[:, None]))
+    kwh *= gerador.normal(1.0, 0.05, kwh.shape)
+    serie, mes = np.nonzero(tempos >= inicio[:, None])
+    valores = np.maximum(kwh[serie, mes], 0).tolist()
+    return [
+        (f'{indice // 4:014d}', f'Setor {indice % 4}', coluna, valor, valor * 0.82)
+        for indice, coluna, valor in zip(serie.tolist(), mes.tolist(), valores)
+    ]
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Tempo de ajuste e previsão sobre séries mensais sintéticas.')
+    parser.add_argument('--series', type=int, default=10_000)
+    parser.add_argument('--meses', type=int, default=MESES_HISTORICO)
+    parser.add_argument('--metodo', choices=METODOS, default='auto')
+    parser.add_argument('--repeticoes', type=int, default=3)
+    args = parser.parse_args(argv)
+
+    linhas = linhas_sinteticas(args.series, args.meses)
+    prever_linhas(linhas, args.meses - 1, args.metodo, meses=args.meses)
+    inicio = time.perf_counter()
+    for _ in range(args.repeticoes):
+        resultado = prever_linhas(linhas, args.meses - 1, args.metodo, meses=args.meses)
+    duracao = (time.perf_counter() - inicio) / args.repeticoes
+
+    print(f'Séries: {resultado["series"]} ({len(linhas)} meses-série, {len(resultado["empresas"])} empresas)')
+    print(f'Tempo médio (matriz + ajuste + previsão): {duracao * 1000:.1f} ms')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+#Imports das funcionalidades a serem usadas
+import heapq
+import statistics
+from collections import defaultdict
+
+#Comparação entre empresas: os totais do período vêm de uma única consulta sobre os rollups
+#e a classificação é feita em memória. Em todas as métricas, menor é melhor (mais eficiente).
+
+TOP_PADRAO = 10
+
+METRICAS = {
+    'kwh_por_m2': 'kWh por m²',
+    'kwh_por_funcionario': 'kWh por funcionário',
+    'custo_por_kwh': 'Custo por kWh (R$)',
+}
+
+def _dividir(numerador, denominador):
+    return numerador / denominador if numerador is not None and denominador else None
+
+#Linha da consulta de totais -> empresa com as métricas calculadas
+def _empresa(linha):
+    cnpj, razao_social, setor, num_funcionarios, area_total, registros, consumo_kwh, custo_total = linha
+    return {
+        'cnpj': cnpj,
+        'razao_social': razao_social,
+        'setor': setor or 'Não informado',
+        'registros': registros,
+        'consumo_kwh': consumo_kwh,
+        'custo_total': custo_total,
+        'kwh_por_m2': _dividir(consumo_kwh, area_total),
+        'kwh_por_funcionario': _dividir(consumo_kwh, num_funcionarios),
+        'custo_por_kwh': _dividir(custo_total, consumo_kwh),
+    }
+
+def _item(empresa, metrica):
+    return {
+        'cnpj': empresa['cnpj'],
+        'razao_social': empresa['razao_social'],
+        'setor': empresa['setor'],
+        'valor': round(empresa[metrica], 4),
+    }
+
+#Melhores e piores (top-k com heap, sem ordenar o grupo inteiro) e mediana de um grupo
+def _classificacao(empresas, metrica, top):
+    chave = lambda empresa: empresa[metrica]
+    valores = [empresa[metrica] for empresa in empresas]
+    return {
+        'empresas': len(empresas),
+        'mediana': round(statistics.median(valores), 4) if valores else None,
+        'melhores': [_item(empresa, metrica) for empresa in heapq.nsmallest(top, empresas, key=chave)],
+        'piores': [_item(empresa, metrica) for empresa in heapq.nlargest(top, empresas, key=chave)],
+    }
+
+#Posição de uma empresa no grupo (1 = mais eficiente) e percentual de empresas que ela supera
+def _posicao(empresas, metrica, valor):
+    melhores = sum(1 for empresa in empresas if empresa[metrica] < valor)
+    piores = sum(1 for empresa in empresas if empresa[metrica] > valor)
+    return {
+        'posicao': melhores + 1,
+        'de': len(empresas),
+        'supera_pct': round(piores / len(empresas) * 100, 1),
+    }
+
+#Monta o ranking geral e por setor de cada métrica; com cnpj, inclui a posição da empresa
+#no geral e entre os pares do mesmo setor. Com setor, só o grupo desse setor é detalhado.
+def montar_ranking(linhas, top=TOP_PADRAO, cnpj=None, setor=None):
+    empresas = [_empresa(linha) for linha in linhas]
+    destaque = next((empresa for empresa in empresas if empresa['cnpj'] == cnpj), None) if cnpj else None
+
+    resultado = {'empresas': len(empresas), 'metricas': {}}
+    if destaque:
+        resultado['empresa'] = {'cnpj': destaque['cnpj'], 'razao_social': destaque['razao_social'], 'setor': destaque['setor']}
+
+    for metrica, descricao in METRICAS.items():
+        validas = [empresa for empresa in empresas if empresa[metrica] is not None]
+        por_setor = defaultdict(list)
+        for empresa in validas:
+            por_setor[empresa['setor']].append(empresa)
+
+        setores = [setor] if setor else sorted(por_setor)
+        ranking = {
+            'descricao': descricao,
+            'geral': _classificacao(validas, metrica, top),
+            'por_setor': {nome: _classificacao(por_setor[nome], metrica, top) for nome in setores if por_setor.get(nome)},
+        }
+        if destaque and destaque[metrica] is not None:
+            ranking['empresa'] = {
+                'valor': round(destaque[metrica], 4),
+                'geral': _posicao(validas, metrica, destaque[metrica]),
+                'setor': _posicao(por_setor[destaque['setor']], metrica, destaque[metrica]),
+            }
+        resultado['metricas'][metrica] = ranking
+
+    return resultado
@@ -0,0 +1,378 @@
+#Imports das funcionalidades a serem usadas
+import csv
+import gzip
+import io
+import json
+import os
+from datetime import datetime
+from functools import partial
+
+import numpy as np
+
+from metricas import medir
+
+#Formatos opcionais: parquet precisa do pyarrow e jsonl-zstd do zstandard
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+#Quantidade de linhas trazidas do banco por ida e volta
+TAMANHO_LOTE_PADRAO = 1000
+
+#Linhas por bloco nos formatos colunares (grupo de linhas do parquet)
+TAMANHO_BLOCO_COLUNAR = 65536
+
+FORMATOS = {
+    'json': '.json',
+    'json-compacto': '.json',
+    'jsonl': '.jsonl',
+    'jsonl-gzip': '.jsonl.gz',
+    'jsonl-zstd': '.jsonl.zst',
+    'csv': '.csv',
+    'parquet': '.parquet',
+    'npz': '.npz',
+}
+
+FORMATO_COLUNAR = 'parquet' if pq is not None else 'npz'
+FORMATOS['colunar'] = FORMATOS[FORMATO_COLUNAR]
+
+#Formatos em que o relatório incremental acrescenta as linhas novas ao mesmo arquivo
+#(gzip e zstd aceitam vários blocos compactados concatenados); os outros ganham um arquivo por atualização
+FORMATOS_ANEXAVEIS = {'jsonl', 'jsonl-gzip', 'jsonl-zstd', 'csv'}
+
+#Marca d'água do relatório incremental, gravada ao lado do arquivo
+SUFIXO_MARCA = '.marca'
+
+#Só no Oracle: o relatório incremental deixa para a próxima vez as leituras gravadas há menos que isto
+#(em segundos), porque um id de gravação menor ainda pode estar em uma transação não confirmada
+ATRASO_INCREMENTAL = float(os.environ.get('ECOFLUX_RELATORIO_ATRASO', 60))
+
+#Colunas e tipos (pyarrow) do parquet de cada tipo de relatório, pela chave das linhas.
+#O esquema é fixo para um bloco com coluna toda vazia não ser inferido com outro tipo.
+COLUNAS_PARQUET = {
+    'consumos': (
+        ('data_registro', 'string'), ('consumo_kwh', 'float64'), ('custo_total', 'float64'),
+        ('setor', 'string'), ('observacoes', 'string'),
+    ),
+    'meses': (
+        ('mes', 'string'), ('setor', 'string'), ('registros', 'int64'),
+        ('consumo_kwh', 'float64'), ('custo_total', 'float64'),
+        ('consumo_min', 'float64'), ('consumo_max', 'float64'),
+        ('custo_min', 'float64'), ('custo_max', 'float64'),
+    ),
+}
+
+#Consulta o histórico de uma empresa e devolve os consumos aos poucos, com fetchmany
+def iterar_consumos(cursor, cnpj, tamanho_lote=TAMANHO_LOTE_PADRAO):
+    cursor.arraysize = tamanho_lote
+    cursor.prefetchrows = tamanho_lote + 1
+    cursor.execute('''
+        SELECT
+            data_registro,
+            consumo_kwh,
+            custo_total,
+            setor,
+            observacoes
+        FROM consumo_energetico
+        WHERE cnpj_empresa = :1
+        ORDER BY data_registro DESC
+    ''', [cnpj])
+
+    while True:
+        consumos = cursor.fetchmany()
+        if not consumos:
+            break
+        for consumo in consumos:
+            yield {
+                "data_registro": consumo[0].strftime("%Y-%m-%d"),
+                "consumo_kwh": consumo[1],
+                "custo_total": consumo[2],
+                "setor": consumo[3],
+                "observacoes": consumo[4]
+            }
+
+#Consumos gravados depois da marca d'água (id de gravação, id_ingestao), na ordem de gravação; cada item vem
+#com o seu id. Pela ordem de gravação, e não pela data, uma leitura retroativa gravada depois da última
+#exportação entra na próxima.
+def iterar_consumos_novos(cursor, cnpj, apos=None, tamanho_lote=TAMANHO_LOTE_PADRAO, atraso=ATRASO_INCREMENTAL):
+    cursor.arraysize = tamanho_lote
+    cursor.prefetchrows = tamanho_lote + 1
+    cursor.execute('''
+        SELECT data_registro, consumo_kwh, custo_total, setor, observacoes, id_ingestao
+        FROM consumo_energetico
+        WHERE cnpj_empresa = :cnpj AND id_ingestao > :apos
+        AND gravada_em <= SYSTIMESTAMP - NUMTODSINTERVAL(:atraso, 'SECOND')
+        ORDER BY id_ingestao
+    ''', {'cnpj': cnpj, 'apos': apos or 0, 'atraso': atraso})
+
+    while True:
+        consumos = cursor.fetchmany()
+        if not consumos:
+            break
+        for consumo in consumos:
+            yield int(consumo[5]), {
+                "data_registro": consumo[0].strftime("%Y-%m-%d"),
+                "consumo_kwh": consumo[1],
+                "custo_total": consumo[2],
+                "setor": consumo[3],
+                "observacoes": consumo[4]
+            }
+
+#Nome padrão do arquivo de relatório de uma empresa
+def nome_arquivo_relatorio(cnpj, formato='json', diretorio='.', sufixo=''):
+    return os.path.join(diretorio, f"relatorio_{cnpj}{sufixo}{FORMATOS[formato]}")
+
+def _escrever_json(arquivo, linhas, cnpj, razao_social, chave):
+    total = 0
+    arquivo.write('{\n')
+    arquivo.write(f'    "cnpj": {json.dumps(cnpj, ensure_ascii=False)},\n')
+    arquivo.write(f'    "razao_social": {json.dumps(razao_social, ensure_ascii=False)},\n')
+    arquivo.write(f'    {json.dumps(chave)}: [\n')
+    for consumo in linhas:
+        if total:
+            arquivo.write(',\n')
+        item = json.dumps(consumo, indent=4, ensure_ascii=False)
+        arquivo.write('\n'.join('        ' + linha for linha in item.split('\n')))
+        total += 1
+    arquivo.write('\n    ]\n}')
+    return total
+
+def _escrever_json_compacto(arquivo, linhas, cnpj, razao_social, chave):
+    total = 0
+    cabecalho = json.dumps({"cnpj": cnpj, "razao_social": razao_social}, ensure_ascii=False, separators=(',', ':'))
+    arquivo.write(cabecalho[:-1] + f',{json.dumps(chave)}:[')
+    for consumo in linhas:
+        if total:
+            arquivo.write(',')
+        arquivo.write(json.dumps(consumo, ensure_ascii=False, separators=(',', ':')))
+        total += 1
+    arquivo.write(']}')
+    return total
+
+def _escrever_jsonl(arquivo, linhas, cnpj, razao_social, chave):
+    total = 0
+    for consumo in linhas:
+        linha = {"cnpj": cnpj, **consumo}
+        arquivo.write(json.dumps(linha, ensure_ascii=False))
+        arquivo.write('\n')
+        total += 1
+    return total
+
+def _escrever_csv(arquivo, linhas, cnpj, razao_social, chave, cabecalho=True):
+    total = 0
+    escritor = None
+    for consumo in linhas:
+        if escritor is None:
+            escritor = csv.writer(arquivo)
+            if cabecalho:
+                escritor.writerow(['cnpj', *consumo])
+        escritor.writerow([cnpj, *consumo.values()])
+        total += 1
+    return total
+
+#Junta as linhas em colunas, em blocos de TAMANHO_BLOCO_COLUNAR linhas
+def _blocos_colunares(linhas):
+    colunas = None
+    for consumo in linhas:
+        if colunas is None:
+            colunas = {nome: [] for nome in consumo}
+        for nome, valor in consumo.items():
+            colunas[nome].append(valor)
+        if len(colunas[nome]) >= TAMANHO_BLOCO_COLUNAR:
+            yield colunas
+            colunas = {nome: [] for nome in colunas}
+    if colunas and next(iter(colunas.values())):
+        yield colunas
+
+#Parquet em grupos de linhas (pyarrow); cnpj e razão social ficam nos metadados do arquivo
+def _escrever_parquet(caminho, linhas, cnpj, razao_social, chave):
+    if chave not in COLUNAS_PARQUET:
+        raise ValueError(f'Relatório sem esquema parquet: {chave}')
+    esquema = pa.schema(COLUNAS_PARQUET[chave], metadata={'cnpj': cnpj, 'razao_social': razao_social or '', 'chave': chave})
+    total = 0
+    with pq.ParquetWriter(caminho, esquema, compression='zstd') as escritor:
+        for colunas in _blocos_colunares(linhas):
+            tabela = pa.Table.from_pydict(colunas, schema=esquema)
+            escritor.write_table(tabela)
+            total += tabela.num_rows
+    return total
+
+#Um array por coluna (números em float64 com NaN para vazio, textos em unicode) em um .npz compactado.
+#Diferente dos outros formatos, as colunas ficam inteiras na memória até a gravação.
+def _escrever_npz(caminho, linhas, cnpj, razao_social, chave):
+    colunas = {}
+    for bloco in _blocos_colunares(linhas):
+        for nome, valores in bloco.items():
+            colunas.setdefault(nome, []).extend(valores)
+
+    arrays = {}
+    for nome, valores in colunas.items():
+        if all(valor is None or isinstance(valor, (int, float)) for valor in valores):
+            arrays[nome] = np.array([np.nan if valor is None else valor for valor in valores], dtype=np.float64)
+        else:
+            arrays[nome] = np.array(['' if valor is None else str(valor) for valor in valores])
+    with open(caminho, 'wb') as arquivo:
+        np.savez_compressed(arquivo, cnpj=np.array(cnpj), razao_social=np.array(razao_social or ''),
+                            chave=np.array(chave), **arrays)
+    return len(next(iter(colunas.values()), []))
+
+#Escritores de texto: recebem o arquivo aberto; os binários recebem o caminho
+_ESCRITORES_TEXTO = {
+    'json': _escrever_json,
+    'json-compacto': _escrever_json_compacto,
+    'jsonl': _escrever_jsonl,
+    'jsonl-gzip': _escrever_jsonl,
+    'jsonl-zstd': _escrever_jsonl,
+    'csv': _escrever_csv,
+}
+_ESCRITORES_BINARIOS = {
+    'parquet': _escrever_parquet,
+    'npz': _escrever_npz,
+}
+
+def _abrir_texto(caminho, formato, modo='w'):
+    if formato == 'jsonl-gzip':
+        return gzip.open(caminho, modo + 't', encoding='utf-8', compresslevel=6)
+    if formato == 'jsonl-zstd':
+        binario = zstandard.ZstdCompressor(level=3).stream_writer(open(caminho, modo + 'b'))
+        return io.TextIOWrapper(binario, encoding='utf-8')
+    return open(caminho, modo, encoding='utf-8', newline='' if formato == 'csv' else None)
+
+#Formato efetivo: 'colunar' vira parquet quando o pyarrow está instalado e .npz caso contrário
+def resolver_formato(formato):
+    if formato == 'colunar':
+        return FORMATO_COLUNAR
+    if formato not in FORMATOS:
+        raise ValueError(f'Formato de relatório desconhecido: {formato}')
+    if formato == 'parquet' and pq is None:
+        raise ValueError('O formato parquet precisa do pacote pyarrow.')
+    if formato == 'jsonl-zstd' and zstandard is None:
+        raise ValueError('O formato jsonl-zstd precisa do pacote zstandard.')
+    return formato
+
+#Escreve o relatório item a item a partir da mesma fonte de linhas, em qualquer formato.
+#O formato 'json' produz o mesmo arquivo que json.dump(..., indent=4).
+def escrever_relatorio(consumos, cnpj, razao_social, caminho, formato='json', chave='consumos'):
+    formato = resolver_formato(formato)
+
+    consumos = iter(consumos)
+    primeiro = next(consumos, None)
+    if primeiro is None:
+        return 0
+
+    caminho_temporario = f'{caminho}.tmp'
+    linhas = _encadear(primeiro, consumos)
+    try:
+        with medir('arquivo.relatorio') as medicao:
+            if formato in _ESCRITORES_BINARIOS:
+                total = _ESCRITORES_BINARIOS[formato](caminho_temporario, linhas, cnpj, razao_social, chave)
+            else:
+                with _abrir_texto(caminho_temporario, formato) as arquivo:
+                    total = _ESCRITORES_TEXTO[formato](arquivo, linhas, cnpj, razao_social, chave)
+            medicao.linhas = total
+            medicao.bytes = os.path.getsize(caminho_temporario)
+        os.replace(caminho_temporario, caminho)
+    except BaseException:
+        #Falha no meio (banco, disco, interrupção): o arquivo pela metade não fica para trás
+        if os.path.exists(caminho_temporario):
+            os.remove(caminho_temporario)
+        raise
+
+    #Um relatório completo substitui o incremental que existisse no mesmo arquivo
+    if os.path.exists(caminho + SUFIXO_MARCA):
+        os.remove(caminho + SUFIXO_MARCA)
+    return total
+
+def _encadear(primeiro, restantes):
+    yield primeiro
+    yield from restantes
+
+#Nome da parte n (a partir de 2) de um relatório incremental em formato não anexável
+def _nome_parte(caminho, formato, parte):
+    extensao = FORMATOS[formato]
+    return f'{caminho[:-len(extensao)]}_parte{parte:04d}{extensao}'
+
+#Marca d'água do relatório: último id de gravação exportado, linhas e tamanho do arquivo (ou partes) já gravados.
+#A marca só vale se o arquivo ainda estiver como ela descreve; caso contrário o relatório recomeça do zero.
+def ler_marca(caminho, formato):
+    formato = resolver_formato(formato)
+    try:
+        with open(caminho + SUFIXO_MARCA, 'r', encoding='utf-8') as arquivo:
+            marca = json.load(arquivo)
+    except (OSError, ValueError):
+        return None
+    #Marcas sem ultimo_id são da chave por data, que perdia leituras retroativas: o relatório recomeça
+    if marca.get('formato') != formato or 'ultimo_id' not in marca:
+        return None
+    try:
+        if formato in FORMATOS_ANEXAVEIS:
+            valida = os.path.getsize(caminho) >= marca['bytes']
+        else:
+            valida = os.path.exists(caminho if marca['partes'] == 1 else _nome_parte(caminho, formato, marca['partes']))
+    except OSError:
+        return None
+    if not valida:
+        return None
+    marca['chave'] = marca['ultimo_id']
+    return marca
+
+def _gravar_marca(caminho, marca):
+    temporario = caminho + SUFIXO_MARCA + '.tmp'
+    with open(temporario, 'w', encoding='utf-8') as arquivo:
+        json.dump(marca, arquivo, ensure_ascii=False, indent=2)
+    os.replace(temporario, caminho + SUFIXO_MARCA)
+
+#Relatório incremental: grava só as linhas novas (pares (id de gravação, consumo) de iterar_consumos_novos, lidas depois da marca).
+#Nos formatos anexáveis as linhas vão para o fim do arquivo, que antes volta ao tamanho registrado na marca
+#(descarta o que uma execução interrompida tenha deixado pela metade); nos outros vira uma nova parte.
+#A marca só é atualizada depois que o arquivo foi gravado. Devolve o total de linhas novas e a marca.
+def escrever_relatorio_incremental(linhas, cnpj, razao_social, caminho, formato='jsonl', marca=None):
+    formato = resolver_formato(formato)
+    linhas = iter(linhas)
+    primeira = next(linhas, None)
+    if primeira is None:
+        return 0, marca
+
+    ultima = primeira[0]
+    def consumos():
+        nonlocal ultima
+        for chave, consumo in _encadear(primeira, linhas):
+            ultima = chave
+            yield consumo
+
+    with medir('arquivo.relatorio_incremental') as medicao:
+        if formato in FORMATOS_ANEXAVEIS:
+            tamanho = marca['bytes'] if marca else 0
+            if os.path.exists(caminho):
+                os.truncate(caminho, tamanho)
+            escritor = _ESCRITORES_TEXTO[formato]
+            if formato == 'csv' and tamanho:
+                escritor = partial(_escrever_csv, cabecalho=False)
+            with _abrir_texto(caminho, formato, 'a') as arquivo:
+                total = escritor(arquivo, consumos(), cnpj, razao_social, 'consumos')
+            partes = 1
+            medicao.bytes = os.path.getsize(caminho) - tamanho
+        else:
+            partes = marca['partes'] + 1 if marca else 1
+            destino = caminho if partes == 1 else _nome_parte(caminho, formato, partes)
+            total = escrever_relatorio(consumos(), cnpj, razao_social, destino, formato)
+            medicao.bytes = os.path.getsize(destino)
+        medicao.linhas = total
+
+    nova_marca = {
+        'formato': formato,
+        'ultimo_id': ultima,
+        'registros': (marca['registros'] if marca else 0) + total,
+        'bytes': os.path.getsize(caminho),
+        'partes': partes,
+        'atualizado_em': datetime.now().isoformat(timespec='seconds'),
+    }
+    _gravar_marca(caminho, nova_marca)
+    return total, nova_marca
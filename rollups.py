@@ -0,0 +1,292 @@
+#Imports das funcionalidades a serem usadas
+from datetime import datetime
+
+import oracledb
+
+from analise import montar_resumo
+
+#Tabelas com os totais consolidados por empresa, setor e dia/mês
+DDL_ROLLUPS = [
+    '''
+    CREATE TABLE consumo_diario (
+        cnpj_empresa VARCHAR2(14) NOT NULL,
+        dia DATE NOT NULL,
+        setor VARCHAR2(100) NOT NULL,
+        registros NUMBER NOT NULL,
+        consumo_kwh NUMBER NOT NULL,
+        custo_total NUMBER NOT NULL,
+        consumo_min NUMBER,
+        consumo_max NUMBER,
+        custo_min NUMBER,
+        custo_max NUMBER,
+        CONSTRAINT pk_consumo_diario PRIMARY KEY (cnpj_empresa, dia, setor)
+    )
+    ''',
+    '''
+    CREATE TABLE consumo_mensal (
+        cnpj_empresa VARCHAR2(14) NOT NULL,
+        mes DATE NOT NULL,
+        setor VARCHAR2(100) NOT NULL,
+        registros NUMBER NOT NULL,
+        consumo_kwh NUMBER NOT NULL,
+        custo_total NUMBER NOT NULL,
+        consumo_min NUMBER,
+        consumo_max NUMBER,
+        custo_min NUMBER,
+        custo_max NUMBER,
+        CONSTRAINT pk_consumo_mensal PRIMARY KEY (cnpj_empresa, mes, setor)
+    )
+    ''',
+]
+
+_SQL_MERGE = '''
+    MERGE INTO {tabela} r
+    USING (
+        SELECT :1 AS cnpj_empresa, TRUNC(:2{unidade}) AS periodo, :3 AS setor,
+               :4 AS registros, :5 AS consumo_kwh, :6 AS custo_total,
+               :7 AS consumo_min, :8 AS consumo_max, :9 AS custo_min, :10 AS custo_max
+        FROM dual
+    ) n
+    ON (r.cnpj_empresa = n.cnpj_empresa AND r.{coluna} = n.periodo AND r.setor = n.setor)
+    WHEN MATCHED THEN UPDATE SET
+        r.registros = r.registros + n.registros,
+        r.consumo_kwh = r.consumo_kwh + n.consumo_kwh,
+        r.custo_total = r.custo_total + n.custo_total,
+        r.consumo_min = LEAST(r.consumo_min, n.consumo_min),
+        r.consumo_max = GREATEST(r.consumo_max, n.consumo_max),
+        r.custo_min = LEAST(r.custo_min, n.custo_min),
+        r.custo_max = GREATEST(r.custo_max, n.custo_max)
+    WHEN NOT MATCHED THEN INSERT
+        (cnpj_empresa, {coluna}, setor, registros, consumo_kwh, custo_total,
+         consumo_min, consumo_max, custo_min, custo_max)
+    VALUES
+        (n.cnpj_empresa, n.periodo, n.setor, n.registros, n.consumo_kwh, n.custo_total,
+         n.consumo_min, n.consumo_max, n.custo_min, n.custo_max)
+'''
+
+SQL_MERGE_DIARIO = _SQL_MERGE.format(tabela='consumo_diario', coluna='dia', unidade='')
+SQL_MERGE_MENSAL = _SQL_MERGE.format(tabela='consumo_mensal', coluna='mes', unidade=", 'MM'")
+
+#Vezes que um MERGE é repetido quando outra sessão inseriu a mesma chave ao mesmo tempo (ORA-00001)
+TENTATIVAS_MERGE = 3
+
+#Agrupa leituras (cnpj, data_registro, consumo_kwh, custo_total, setor) pela chave do rollup.
+#A data é a mesma gravada na leitura (quem insere resolve a data do banco antes, ver armazenamento.py).
+def _agrupar(leituras, mensal):
+    grupos = {}
+    for cnpj, data_registro, consumo_kwh, custo_total, setor in leituras:
+        if mensal:
+            periodo = datetime(data_registro.year, data_registro.month, 1)
+        else:
+            periodo = datetime(data_registro.year, data_registro.month, data_registro.day)
+        chave = (cnpj, periodo, setor)
+        grupo = grupos.get(chave)
+        if grupo is None:
+            grupos[chave] = [1, consumo_kwh, custo_total, consumo_kwh, consumo_kwh, custo_total, custo_total]
+        else:
+            grupo[0] += 1
+            grupo[1] += consumo_kwh
+            grupo[2] += custo_total
+            grupo[3] = min(grupo[3], consumo_kwh)
+            grupo[4] = max(grupo[4], consumo_kwh)
+            grupo[5] = min(grupo[5], custo_total)
+            grupo[6] = max(grupo[6], custo_total)
+    return [(*chave, *valores) for chave, valores in grupos.items()]
+
+#Soma novas leituras aos rollups diário e mensal, dentro da transação de quem inseriu as leituras
+def atualizar_rollups(cursor, leituras):
+    leituras = list(leituras)
+    if not leituras:
+        return
+    for sql, mensal in ((SQL_MERGE_DIARIO, False), (SQL_MERGE_MENSAL, True)):
+        _mesclar(cursor, sql, _agrupar(leituras, mensal))
+
+#Executa o MERGE de todos os grupos. Duas sessões que inserem ao mesmo tempo o primeiro grupo de uma
+#chave fazem a segunda falhar com ORA-00001 (a linha ainda não existia quando o MERGE começou); repetir
+#só esses grupos cai no WHEN MATCHED. Outros erros sobem normalmente.
+def _mesclar(cursor, sql, grupos):
+    for _ in range(TENTATIVAS_MERGE):
+        cursor.setinputsizes(None, oracledb.DB_TYPE_DATE)
+        cursor.executemany(sql, grupos, batcherrors=True)
+        erros = cursor.getbatcherrors()
+        if not erros:
+            return
+        for erro in erros:
+            if erro.code != 1:
+                raise oracledb.DatabaseError(erro.message)
+        grupos = [grupos[erro.offset] for erro in erros]
+    raise oracledb.IntegrityError(erros[0].message)
+
+#Limites do período ampliados para meses inteiros, para que o rollup mensal fique consistente
+def _meses_inteiros(inicio, fim):
+    inicio_mes = datetime(inicio.year, inicio.month, 1) if inicio else None
+    if fim is None:
+        return inicio_mes, None
+    if fim.month == 12:
+        return inicio_mes, datetime(fim.year + 1, 1, 1)
+    return inicio_mes, datetime(fim.year, fim.month + 1, 1)
+
+#Recalcula os rollups a partir de consumo_energetico (todo o histórico ou o período informado)
+def reconstruir_rollups(conexao, inicio=None, fim=None):
+    inicio, fim = _meses_inteiros(inicio, fim)
+    filtro = 'WHERE {coluna} >= NVL(:1, {coluna}) AND {coluna} < NVL(:2, {coluna} + 1)'
+    cursor = conexao.cursor()
+    try:
+        cursor.setinputsizes(oracledb.DB_TYPE_DATE, oracledb.DB_TYPE_DATE)
+        cursor.execute('DELETE FROM consumo_mensal ' + filtro.format(coluna='mes'), [inicio, fim])
+        cursor.setinputsizes(oracledb.DB_TYPE_DATE, oracledb.DB_TYPE_DATE)
+        cursor.execute('DELETE FROM consumo_diario ' + filtro.format(coluna='dia'), [inicio, fim])
+        cursor.setinputsizes(oracledb.DB_TYPE_DATE, oracledb.DB_TYPE_DATE)
+        cursor.execute('''
+            INSERT INTO consumo_diario
+            (cnpj_empresa, dia, setor, registros, consumo_kwh, custo_total,
+             consumo_min, consumo_max, custo_min, custo_max)
+            SELECT cnpj_empresa, TRUNC(data_registro), setor, COUNT(*),
+                   SUM(consumo_kwh), SUM(custo_total),
+                   MIN(consumo_kwh), MAX(consumo_kwh), MIN(custo_total), MAX(custo_total)
+            FROM consumo_energetico
+        ''' + filtro.format(coluna='data_registro') + '''
+            GROUP BY cnpj_empresa, TRUNC(data_registro), setor
+        ''', [inicio, fim])
+        dias = cursor.rowcount
+        cursor.setinputsizes(oracledb.DB_TYPE_DATE, oracledb.DB_TYPE_DATE)
+        cursor.execute('''
+            INSERT INTO consumo_mensal
+            (cnpj_empresa, mes, setor, registros, consumo_kwh, custo_total,
+             consumo_min, consumo_max, custo_min, custo_max)
+            SELECT cnpj_empresa, TRUNC(dia, 'MM'), setor, SUM(registros),
+                   SUM(consumo_kwh), SUM(custo_total),
+                   MIN(consumo_min), MAX(consumo_max), MIN(custo_min), MAX(custo_max)
+            FROM consumo_diario
+        ''' + filtro.format(coluna='dia') + '''
+            GROUP BY cnpj_empresa, TRUNC(dia, 'MM'), setor
+        ''', [inicio, fim])
+        meses = cursor.rowcount
+        conexao.commit()
+        return dias, meses
+    except oracledb.Error:
+        conexao.rollback()
+        raise
+    finally:
+        cursor.close()
+
+#Divide o período em meses completos [primeiro_mes, ultimo_mes) e pontas em dias; fim é inclusivo
+def _limites_periodo(inicio, fim):
+    inicio = datetime(inicio.year, inicio.month, inicio.day)
+    fim = datetime(fim.year, fim.month, fim.day)
+    primeiro_mes = inicio if inicio.day == 1 else _meses_inteiros(inicio, inicio)[1]
+    fim_exclusivo = datetime.fromordinal(fim.toordinal() + 1)
+    ultimo_mes = datetime(fim_exclusivo.year, fim_exclusivo.month, 1)
+    if ultimo_mes < primeiro_mes:
+        primeiro_mes = ultimo_mes = fim_exclusivo
+    return inicio, fim_exclusivo, primeiro_mes, ultimo_mes
+
+#Resumo de um período qualquer lido só dos rollups: meses completos vêm do rollup mensal
+#e as pontas do período vêm do rollup diário. Devolve o mesmo formato de analise.resumo_consumo.
+def resumo_periodo(cursor, cnpj, inicio, fim):
+    inicio, fim_exclusivo, primeiro_mes, ultimo_mes = _limites_periodo(inicio, fim)
+
+    cursor.execute('''
+        SELECT
+            GROUPING(setor),
+            GROUPING(TRUNC(periodo, 'MM')),
+            setor,
+            TRUNC(periodo, 'MM'),
+            SUM(registros),
+            SUM(consumo_kwh), SUM(consumo_kwh) / SUM(registros), MIN(consumo_min), MAX(consumo_max),
+            SUM(custo_total), SUM(custo_total) / SUM(registros), MIN(custo_min), MAX(custo_max)
+        FROM (
+            SELECT mes AS periodo, setor, registros, consumo_kwh, custo_total,
+                   consumo_min, consumo_max, custo_min, custo_max
+            FROM consumo_mensal
+            WHERE cnpj_empresa = :cnpj AND mes >= :primeiro_mes AND mes < :ultimo_mes
+            UNION ALL
+            SELECT dia, setor, registros, consumo_kwh, custo_total,
+                   consumo_min, consumo_max, custo_min, custo_max
+            FROM consumo_diario
+            WHERE cnpj_empresa = :cnpj AND dia >= :inicio AND dia < :fim
+            AND (dia < :primeiro_mes OR dia >= :ultimo_mes)
+        )
+        GROUP BY GROUPING SETS ((), (setor), (TRUNC(periodo, 'MM')))
+    ''', cnpj=cnpj, inicio=inicio, fim=fim_exclusivo, primeiro_mes=primeiro_mes, ultimo_mes=ultimo_mes)
+
+    return montar_resumo(cursor)
+
+#Totais do período de todas as empresas com consumo, junto com porte e setor do cadastro.
+#Uma única consulta sobre os rollups (meses completos do mensal, pontas do diário).
+def totais_empresas(cursor, inicio, fim):
+    inicio, fim_exclusivo, primeiro_mes, ultimo_mes = _limites_periodo(inicio, fim)
+    cursor.arraysize = 5000
+    cursor.execute('''
+        SELECT e.cnpj, e.razao_social, e.setor, e.num_funcionarios, e.area_total,
+               t.registros, t.consumo_kwh, t.custo_total
+        FROM (
+            SELECT cnpj_empresa, SUM(registros) AS registros,
+                   SUM(consumo_kwh) AS consumo_kwh, SUM(custo_total) AS custo_total
+            FROM (
+                SELECT cnpj_empresa, registros, consumo_kwh, custo_total
+                FROM consumo_mensal
+                WHERE mes >= :primeiro_mes AND mes < :ultimo_mes
+                UNION ALL
+                SELECT cnpj_empresa, registros, consumo_kwh, custo_total
+                FROM consumo_diario
+                WHERE dia >= :inicio AND dia < :fim
+                AND (dia < :primeiro_mes OR dia >= :ultimo_mes)
+            )
+            GROUP BY cnpj_empresa
+        ) t
+        JOIN empresas e ON e.cnpj = t.cnpj_empresa
+    ''', inicio=inicio, fim=fim_exclusivo, primeiro_mes=primeiro_mes, ultimo_mes=ultimo_mes)
+    yield from cursor
+
+#Totais mensais por setor de uma empresa, lidos do rollup mensal (meses inteiros do período)
+def iterar_resumo_mensal(cursor, cnpj, inicio=None, fim=None):
+    inicio, fim = _meses_inteiros(inicio, fim)
+    cursor.setinputsizes(None, oracledb.DB_TYPE_DATE, oracledb.DB_TYPE_DATE)
+    cursor.execute('''
+        SELECT mes, setor, registros, consumo_kwh, custo_total,
+               consumo_min, consumo_max, custo_min, custo_max
+        FROM consumo_mensal
+        WHERE cnpj_empresa = :1
+        AND mes >= NVL(:2, mes) AND mes < NVL(:3, mes + 1)
+        ORDER BY mes DESC, setor
+    ''', [cnpj, inicio, fim])
+    for linha in cursor:
+        yield {
+            "mes": linha[0].strftime("%Y-%m"),
+            "setor": linha[1],
+            "registros": linha[2],
+            "consumo_kwh": linha[3],
+            "custo_total": linha[4],
+            "consumo_min": linha[5],
+            "consumo_max": linha[6],
+            "custo_min": linha[7],
+            "custo_max": linha[8]
+        }
+
+#Totais mensais de todas as séries (cnpj, setor, índice do mês = ano * 12 + mês - 1, kWh, custo) em [inicio, fim)
+def series_mensais(cursor, inicio, fim):
+    cursor.arraysize = 10000
+    cursor.prefetchrows = 10001
+    cursor.execute('''
+        SELECT cnpj_empresa, setor, EXTRACT(YEAR FROM mes) * 12 + EXTRACT(MONTH FROM mes) - 1,
+               consumo_kwh, custo_total
+        FROM consumo_mensal
+        WHERE mes >= :inicio AND mes < :fim
+        ORDER BY cnpj_empresa, setor, mes
+    ''', inicio=inicio, fim=fim)
+    yield from cursor
+
+#Resumo do rollup mensal inteiro (linhas, leituras, kWh); muda sempre que uma leitura é gravada
+def impressao_rollups(cursor):
+    cursor.execute('SELECT COUNT(*), SUM(registros), SUM(consumo_kwh) FROM consumo_mensal')
+    return cursor.fetchone()
+
+#Cria as tabelas de rollup
+def criar_tabelas(conexao):
+    cursor = conexao.cursor()
+    try:
+        for ddl in DDL_ROLLUPS:
+            cursor.execute(ddl)
+    finally:
+        cursor.close()
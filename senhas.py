@@ -0,0 +1,196 @@
+#Imports das funcionalidades a serem usadas
+import argparse
+import base64
+import hashlib
+import hmac
+import os
+import secrets
+import threading
+import time
+from collections import OrderedDict
+
+#Parâmetros de custo do hash de senha (podem ser ajustados por variáveis de ambiente)
+CONFIG_SENHA = {
+    'algoritmo': os.environ.get('ECOFLUX_SENHA_ALGORITMO', 'scrypt'),
+    'scrypt_n': int(os.environ.get('ECOFLUX_SCRYPT_N', 2 ** 14)),
+    'scrypt_r': int(os.environ.get('ECOFLUX_SCRYPT_R', 8)),
+    'scrypt_p': int(os.environ.get('ECOFLUX_SCRYPT_P', 1)),
+    'pbkdf2_iteracoes': int(os.environ.get('ECOFLUX_PBKDF2_ITERACOES', 600_000)),
+    'cache_ttl': float(os.environ.get('ECOFLUX_SENHA_CACHE_TTL', 60)),
+    'cache_tamanho': int(os.environ.get('ECOFLUX_SENHA_CACHE', 1024)),
+}
+
+TAMANHO_SAL = 16
+TAMANHO_HASH = 32
+
+def _b64(dados):
+    return base64.b64encode(dados).decode('ascii')
+
+def _de_b64(texto):
+    return base64.b64decode(texto.encode('ascii'))
+
+def _scrypt(senha, sal, n, r, p):
+    return hashlib.scrypt(senha.encode('utf-8'), salt=sal, n=n, r=r, p=p,
+                          maxmem=256 * n * r + 1024 * 1024, dklen=TAMANHO_HASH)
+
+def _pbkdf2(senha, sal, iteracoes):
+    return hashlib.pbkdf2_hmac('sha256', senha.encode('utf-8'), sal, iteracoes, dklen=TAMANHO_HASH)
+
+#Gera o hash de uma senha no formato 'algoritmo$parâmetros$sal$hash'
+def gerar_hash(senha, config=None):
+    config = config or CONFIG_SENHA
+    sal = secrets.token_bytes(TAMANHO_SAL)
+    if config['algoritmo'] == 'pbkdf2':
+        iteracoes = config['pbkdf2_iteracoes']
+        return f'pbkdf2_sha256${iteracoes}${_b64(sal)}${_b64(_pbkdf2(senha, sal, iteracoes))}'
+    n, r, p = config['scrypt_n'], config['scrypt_r'], config['scrypt_p']
+    return f'scrypt${n}:{r}:{p}${_b64(sal)}${_b64(_scrypt(senha, sal, n, r, p))}'
+
+#Indica se o valor gravado ainda é uma senha em texto puro (linhas anteriores ao hash)
+def eh_texto_puro(armazenada):
+    return not (armazenada.startswith('scrypt$') or armazenada.startswith('pbkdf2_sha256$'))
+
+#Confere uma senha com o valor gravado; senhas em texto puro ainda são aceitas para permitir a migração
+def verificar(senha, armazenada):
+    if armazenada is None:
+        return False
+    if eh_texto_puro(armazenada):
+        return hmac.compare_digest(senha.encode('utf-8'), armazenada.encode('utf-8'))
+    try:
+        algoritmo, parametros, sal, esperado = armazenada.split('$')
+        sal, esperado = _de_b64(sal), _de_b64(esperado)
+        if algoritmo == 'pbkdf2_sha256':
+            calculado = _pbkdf2(senha, sal, int(parametros))
+        else:
+            n, r, p = (int(valor) for valor in parametros.split(':'))
+            calculado = _scrypt(senha, sal, n, r, p)
+    except ValueError:
+        return False
+    return hmac.compare_digest(calculado, esperado)
+
+#Indica se o valor gravado deve ser refeito com os parâmetros atuais (texto puro ou custo diferente)
+def precisa_atualizar(armazenada, config=None):
+    config = config or CONFIG_SENHA
+    if eh_texto_puro(armazenada):
+        return True
+    algoritmo, parametros = armazenada.split('$')[:2]
+    if config['algoritmo'] == 'pbkdf2':
+        return algoritmo != 'pbkdf2_sha256' or int(parametros) != config['pbkdf2_iteracoes']
+    return algoritmo != 'scrypt' or parametros != f"{config['scrypt_n']}:{config['scrypt_r']}:{config['scrypt_p']}"
+
+#Cache curto de logins já verificados, para não repetir o hash em logins seguidos do mesmo usuário.
+#Guarda apenas um HMAC da senha com uma chave aleatória do processo, nunca a senha.
+class CacheVerificacoes:
+    def __init__(self, ttl=None, tamanho_maximo=None):
+        self.ttl = CONFIG_SENHA['cache_ttl'] if ttl is None else ttl
+        self.tamanho_maximo = tamanho_maximo or CONFIG_SENHA['cache_tamanho']
+        self._chave = secrets.token_bytes(32)
+        self._dados = OrderedDict()
+        self._trava = threading.Lock()
+
+    def _assinatura(self, username, senha, armazenada):
+        mensagem = f'{username}\0{senha}\0{armazenada}'.encode('utf-8')
+        return hmac.new(self._chave, mensagem, hashlib.sha256).digest()
+
+    def contem(self, username, senha, armazenada):
+        if self.ttl <= 0:
+            return False
+        assinatura = self._assinatura(username, senha, armazenada)
+        with self._trava:
+            item = self._dados.get(username)
+            if item is None:
+                return False
+            expira_em, guardada = item
+            if expira_em < time.monotonic():
+                del self._dados[username]
+                return False
+            return hmac.compare_digest(guardada, assinatura)
+
+    def guardar(self, username, senha, armazenada):
+        if self.ttl <= 0:
+            return
+        assinatura = self._assinatura(username, senha, armazenada)
+        with self._trava:
+            self._dados[username] = (time.monotonic() + self.ttl, assinatura)
+            self._dados.move_to_end(username)
+            while len(self._dados) > self.tamanho_maximo:
+                self._dados.popitem(last=False)
+
+    def remover(self, username):
+        with self._trava:
+            self._dados.pop(username, None)
+
+cache_verificacoes = CacheVerificacoes()
+
+#Autentica um usuário na sessão de armazenamento informada; migra senhas em texto puro ou com custo antigo para o hash atual
+def autenticar(sessao, username, senha):
+    armazenada = sessao.usuarios.obter_senha(username)
+    if armazenada is None:
+        return False
+
+    if cache_verificacoes.contem(username, senha, armazenada):
+        return True
+    if not verificar(senha, armazenada):
+        return False
+
+    if precisa_atualizar(armazenada):
+        nova = gerar_hash(senha)
+        if sessao.usuarios.atualizar_senha(username, nova, armazenada):
+            sessao.commit()
+            armazenada = nova
+
+    cache_verificacoes.guardar(username, senha, armazenada)
+    return True
+
+#Mede o tempo de hash e de verificação para cada combinação de parâmetros
+def medir(configuracoes, repeticoes=5):
+    resultados = []
+    for config in configuracoes:
+        config = {**CONFIG_SENHA, **config}
+        inicio = time.perf_counter()
+        for _ in range(repeticoes):
+            armazenada = gerar_hash('senha-de-teste', config)
+        tempo_hash = (time.perf_counter() - inicio) / repeticoes
+
+        inicio = time.perf_counter()
+        for _ in range(repeticoes):
+            verificar('senha-de-teste', armazenada)
+        tempo_verificacao = (time.perf_counter() - inicio) / repeticoes
+
+        if config['algoritmo'] == 'pbkdf2':
+            descricao = f"pbkdf2 iter={config['pbkdf2_iteracoes']}"
+        else:
+            descricao = f"scrypt n={config['scrypt_n']} r={config['scrypt_r']} p={config['scrypt_p']}"
+        resultados.append((descricao, tempo_hash * 1000, tempo_verificacao * 1000))
+    return resultados
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Custo e latência do hash de senha para cada configuração.')
+    parser.add_argument('--repeticoes', type=int, default=5)
+    args = parser.parse_args(argv)
+
+    configuracoes = [
+        {'algoritmo': 'scrypt', 'scrypt_n': 2 ** 12},
+        {'algoritmo': 'scrypt', 'scrypt_n': 2 ** 14},
+        {'algoritmo': 'scrypt', 'scrypt_n': 2 ** 15},
+        {'algoritmo': 'scrypt', 'scrypt_n': 2 ** 14, 'scrypt_p': 2},
+        {'algoritmo': 'pbkdf2', 'pbkdf2_iteracoes': 100_000},
+        {'algoritmo': 'pbkdf2', 'pbkdf2_iteracoes': 600_000},
+        {'algoritmo': 'pbkdf2', 'pbkdf2_iteracoes': 1_200_000},
+    ]
+
+    print(f'{"Configuração":<32} {"Hash (ms)":>12} {"Verificação (ms)":>18}')
+    print('-' * 64)
+    for descricao, tempo_hash, tempo_verificacao in medir(configuracoes, args.repeticoes):
+        print(f'{descricao:<32} {tempo_hash:>12.1f} {tempo_verificacao:>18.1f}')
+
+    cache = CacheVerificacoes(ttl=60)
+    armazenada = gerar_hash('senha-de-teste')
+    cache.guardar('usuario', 'senha-de-teste', armazenada)
+    inicio = time.perf_counter()
+    for _ in range(10_000):
+        cache.contem('usuario', 'senha-de-teste', armazenada)
+    print(f'{"Login com cache (verificado)":<32} {"-":>12} {(time.perf_counter() - inicio) / 10_000 * 1000:>18.4f}')
+
+if __name__ == '__main__':
+    main()
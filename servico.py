@@ -0,0 +1,385 @@
+#Imports das funcionalidades a serem usadas
+import argparse
+import asyncio
+import functools
+import json
+import os
+import secrets
+import sys
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+from http import HTTPStatus
+from urllib.parse import parse_qs, unquote, urlsplit
+
+import metricas
+import operacoes
+from armazenamento import criar_backend, definir_backend
+from banco import CONFIG_POOL
+from indicadores import JANELA_MEDIA
+from operacoes import ErroOperacao
+from ranking import TOP_PADRAO
+from relatorio import FORMATOS
+from spool import obter_gravador
+
+#Modo serviço: as operações do Ecoflux expostas em uma API HTTP/JSON local, servida por asyncio.
+#As operações (e os repositórios) continuam síncronos; cada requisição roda em uma thread do
+#executor, que usa as sessões do pool normalmente. O semáforo limita quantas operações rodam
+#ao mesmo tempo (padrão: o tamanho máximo do pool) e cada uma tem um tempo máximo.
+
+CONFIG_SERVICO = {
+    'host': os.environ.get('ECOFLUX_SERVICO_HOST', '127.0.0.1'),
+    'porta': int(os.environ.get('ECOFLUX_SERVICO_PORTA', 8080)),
+    'concorrencia': int(os.environ.get('ECOFLUX_SERVICO_CONCORRENCIA', CONFIG_POOL['max'])),
+    'timeout': float(os.environ.get('ECOFLUX_SERVICO_TIMEOUT', 30)),
+    'espera_fila': float(os.environ.get('ECOFLUX_SERVICO_ESPERA_FILA', 5)),
+    'validade_token': int(os.environ.get('ECOFLUX_SERVICO_VALIDADE_TOKEN', 8 * 3600)),
+    'diretorio_relatorios': os.environ.get('ECOFLUX_SERVICO_RELATORIOS', 'relatorios'),
+    #POST /consumos grava no spool local e responde sem esperar o banco (spool.py)
+    'adiado': os.environ.get('ECOFLUX_SERVICO_ADIADO', '').lower() in ('1', 'true', 'sim'),
+}
+
+#Limites de uma requisição
+TAMANHO_MAXIMO_CORPO = 1024 * 1024
+TIMEOUT_LEITURA = 15
+
+class ErroHTTP(Exception):
+    def __init__(self, status, mensagem):
+        super().__init__(mensagem)
+        self.status = status
+
+#Tokens de sessão emitidos pelo login, guardados em memória com validade
+class Tokens:
+    def __init__(self, validade):
+        self.validade = validade
+        self._tokens = {}
+        self._trava = threading.Lock()
+
+    def emitir(self, username):
+        token = secrets.token_urlsafe(32)
+        with self._trava:
+            self._tokens[token] = (username, time.monotonic() + self.validade)
+        return token
+
+    #Usuário dono do token, ou None se o token não existe ou expirou
+    def usuario(self, token):
+        with self._trava:
+            registro = self._tokens.get(token)
+            if registro is None:
+                return None
+            username, expira = registro
+            if expira < time.monotonic():
+                del self._tokens[token]
+                return None
+            return username
+
+    def revogar(self, token):
+        with self._trava:
+            self._tokens.pop(token, None)
+
+#Dados de uma requisição já resolvida, entregues às rotas
+Requisicao = namedtuple('Requisicao', 'usuario token parametros consulta corpo')
+
+def _para_json(valor):
+    if isinstance(valor, (date, datetime)):
+        return valor.isoformat()
+    return str(valor)
+
+def _ler_data(valor):
+    if valor is None or isinstance(valor, datetime):
+        return valor
+    try:
+        return datetime.fromisoformat(valor)
+    except ValueError:
+        return datetime.strptime(valor, '%d/%m/%Y')
+
+def _inteiro(valor, padrao=None):
+    return padrao if valor is None else int(valor)
+
+class Servico:
+    def __init__(self, config=None):
+        self.config = dict(CONFIG_SERVICO)
+        self.config.update(config or {})
+        self.tokens = Tokens(self.config['validade_token'])
+        self.executor = ThreadPoolExecutor(max_workers=self.config['concorrencia'], thread_name_prefix='ecoflux-servico')
+        self._semaforo = None
+        #Rotas: (método, caminho com {parametros}, função, exige login)
+        self._rotas = []
+        for metodo, caminho, funcao, exige_login in (
+            ('GET', '/saude', self.saude, False),
+            ('POST', '/login', self.login, False),
+            ('POST', '/logout', self.logout, True),
+            ('POST', '/empresas', self.cadastrar_empresa, True),
+            ('POST', '/consumos', self.registrar_consumo, True),
+            ('GET', '/empresas/{cnpj}/analise', self.analisar, True),
+            ('GET', '/empresas/{cnpj}/historico', self.historico, True),
+            ('GET', '/empresas/{cnpj}/indicadores', self.indicadores, True),
+            ('GET', '/empresas/{cnpj}/previsao', self.previsao, True),
+            ('POST', '/empresas/{cnpj}/relatorio', self.relatorio, True),
+            ('GET', '/ranking', self.ranking, True),
+        ):
+            self._rotas.append((metodo, caminho.strip('/').split('/'), funcao, exige_login))
+
+    def _rota(self, metodo, caminho):
+        partes = [unquote(parte) for parte in caminho.strip('/').split('/')]
+        caminho_existe = False
+        for metodo_rota, modelo, funcao, exige_login in self._rotas:
+            if len(modelo) != len(partes):
+                continue
+            parametros = {}
+            for esperado, recebido in zip(modelo, partes):
+                if esperado.startswith('{'):
+                    parametros[esperado[1:-1]] = recebido
+                elif esperado != recebido:
+                    break
+            else:
+                caminho_existe = True
+                if metodo_rota == metodo:
+                    return funcao, exige_login, parametros
+        if caminho_existe:
+            raise ErroHTTP(HTTPStatus.METHOD_NOT_ALLOWED, f'Método {metodo} não permitido em {caminho}.')
+        raise ErroHTTP(HTTPStatus.NOT_FOUND, f'Rota não encontrada: {caminho}')
+
+    #Executa uma operação bloqueante no executor, respeitando o limite de concorrência e o tempo máximo.
+    #Uma operação que estoura o tempo devolve 504, mas a vaga só é liberada quando a thread terminar.
+    async def executar(self, funcao, *args):
+        try:
+            await asyncio.wait_for(self._semaforo.acquire(), self.config['espera_fila'])
+        except asyncio.TimeoutError:
+            raise ErroHTTP(HTTPStatus.SERVICE_UNAVAILABLE, 'Serviço ocupado; tente novamente.') from None
+        tarefa = asyncio.get_running_loop().run_in_executor(self.executor, functools.partial(funcao, *args))
+        tarefa.add_done_callback(lambda _: self._semaforo.release())
+        try:
+            return await asyncio.wait_for(asyncio.shield(tarefa), self.config['timeout'])
+        except asyncio.TimeoutError:
+            raise ErroHTTP(HTTPStatus.GATEWAY_TIMEOUT, 'A operação excedeu o tempo máximo.') from None
+
+    async def saude(self, requisicao):
+        resultado = {'status': 'ok', 'concorrencia': self.config['concorrencia']}
+        if self.config['adiado']:
+            resultado['spool'] = obter_gravador().situacao()
+        return resultado
+
+    async def login(self, requisicao):
+        resultado = await self.executar(operacoes.login, requisicao.corpo['username'], requisicao.corpo['senha'])
+        return {**resultado, 'token': self.tokens.emitir(resultado['username']), 'validade_s': self.tokens.validade}
+
+    async def logout(self, requisicao):
+        self.tokens.revogar(requisicao.token)
+        return {'username': requisicao.usuario}
+
+    async def cadastrar_empresa(self, requisicao):
+        corpo = requisicao.corpo
+        return await self.executar(
+            operacoes.cadastrar_empresa, str(corpo['cnpj']), corpo['num_funcionarios'], corpo['area_total'], requisicao.usuario
+        )
+
+    async def registrar_consumo(self, requisicao):
+        corpo = requisicao.corpo
+        registrar = operacoes.registrar_consumo_adiado if self.config['adiado'] else operacoes.registrar_consumo
+        return await self.executar(
+            registrar, str(corpo['cnpj']), corpo['consumo_kwh'], corpo['custo_total'], requisicao.usuario,
+            corpo.get('setor'), corpo.get('observacoes'), _ler_data(corpo.get('data_registro'))
+        )
+
+    async def analisar(self, requisicao):
+        consulta = requisicao.consulta
+        return await self.executar(
+            operacoes.analisar_consumo, requisicao.parametros['cnpj'], _inteiro(consulta.get('meses'), 6),
+            _ler_data(consulta.get('inicio')), _ler_data(consulta.get('fim')),
+            consulta.get('detalhes', '').lower() in ('1', 'true', 'sim'), consulta.get('apos')
+        )
+
+    async def historico(self, requisicao):
+        consulta = requisicao.consulta
+        return await self.executar(
+            operacoes.historico_consumo, requisicao.parametros['cnpj'], consulta.get('setor'),
+            _ler_data(consulta.get('inicio')), _ler_data(consulta.get('fim')), consulta.get('apos'),
+            _inteiro(consulta.get('tamanho'), 20)
+        )
+
+    async def indicadores(self, requisicao):
+        consulta = requisicao.consulta
+        return await self.executar(
+            operacoes.indicadores_consumo, requisicao.parametros['cnpj'],
+            _ler_data(consulta.get('inicio')), _ler_data(consulta.get('fim')), _inteiro(consulta.get('janela'), JANELA_MEDIA)
+        )
+
+    async def previsao(self, requisicao):
+        consulta = requisicao.consulta
+        return await self.executar(
+            operacoes.prever_consumo, requisicao.parametros['cnpj'], consulta.get('metodo', 'auto'),
+            _inteiro(consulta.get('horizonte'), 1)
+        )
+
+    async def ranking(self, requisicao):
+        consulta = requisicao.consulta
+        return await self.executar(
+            operacoes.ranking_empresas, _ler_data(consulta.get('inicio')), _ler_data(consulta.get('fim')),
+            _inteiro(consulta.get('top'), TOP_PADRAO), consulta.get('cnpj'), consulta.get('setor')
+        )
+
+    #O arquivo é gravado no diretório de relatórios do serviço; a resposta informa o caminho
+    async def relatorio(self, requisicao):
+        corpo = requisicao.corpo
+        formato = corpo.get('formato', 'json')
+        if formato not in FORMATOS:
+            raise ValueError(f'Formato de relatório desconhecido: {formato}')
+        os.makedirs(self.config['diretorio_relatorios'], exist_ok=True)
+        return await self.executar(
+            operacoes.gerar_relatorio, requisicao.parametros['cnpj'], formato, self.config['diretorio_relatorios'],
+            corpo.get('tipo', 'consumos'), _ler_data(corpo.get('inicio')), _ler_data(corpo.get('fim')),
+            None, bool(corpo.get('incremental'))
+        )
+
+    #Resolve a rota, confere o login e executa; devolve (status, corpo da resposta)
+    async def despachar(self, metodo, alvo, cabecalhos, corpo_bruto):
+        url = urlsplit(alvo)
+        consulta = {chave: valores[-1] for chave, valores in parse_qs(url.query).items()}
+        try:
+            funcao, exige_login, parametros = self._rota(metodo, url.path)
+
+            usuario = None
+            token = cabecalhos.get('authorization', '').removeprefix('Bearer ').strip()
+            if exige_login:
+                usuario = self.tokens.usuario(token) if token else None
+                if usuario is None:
+                    raise ErroHTTP(HTTPStatus.UNAUTHORIZED, 'Faça login para usar esta rota.')
+
+            corpo = {}
+            if corpo_bruto:
+                try:
+                    corpo = json.loads(corpo_bruto)
+                except ValueError:
+                    raise ErroHTTP(HTTPStatus.BAD_REQUEST, 'Corpo da requisição não é um JSON válido.') from None
+                if not isinstance(corpo, dict):
+                    raise ErroHTTP(HTTPStatus.BAD_REQUEST, 'O corpo da requisição deve ser um objeto JSON.')
+
+            with metricas.medir(f'servico.{funcao.__name__}'):
+                resultado = await funcao(Requisicao(usuario, token, parametros, consulta, corpo))
+            return HTTPStatus.OK, resultado
+        except ErroHTTP as erro:
+            return erro.status, {'erro': str(erro)}
+        except ErroOperacao as erro:
+            status = HTTPStatus.UNAUTHORIZED if funcao == self.login else HTTPStatus.BAD_REQUEST
+            return status, {'erro': str(erro)}
+        except KeyError as erro:
+            return HTTPStatus.BAD_REQUEST, {'erro': f'Campo obrigatório ausente: {erro}'}
+        except (ValueError, TypeError) as erro:
+            return HTTPStatus.BAD_REQUEST, {'erro': str(erro)}
+        except (RuntimeError, OSError) as erro:
+            return HTTPStatus.INTERNAL_SERVER_ERROR, {'erro': str(erro)}
+        except Exception as erro:
+            #Erro inesperado (por exemplo, do banco): responde 500 em vez de derrubar a conexão sem resposta
+            print(f'Erro interno em {metodo} {url.path}: {type(erro).__name__}: {erro}', file=sys.stderr)
+            return HTTPStatus.INTERNAL_SERVER_ERROR, {'erro': 'Erro interno do servidor.'}
+
+    #Uma conexão HTTP/1.1: várias requisições em sequência (keep-alive) até o cliente fechar
+    async def atender(self, leitor, escritor):
+        try:
+            while True:
+                try:
+                    requisicao = await asyncio.wait_for(_ler_requisicao(leitor), TIMEOUT_LEITURA)
+                except asyncio.TimeoutError:
+                    break
+                except ErroHTTP as erro:
+                    await _responder(escritor, erro.status, {'erro': str(erro)}, manter=False)
+                    break
+                if requisicao is None:
+                    break
+                metodo, alvo, versao, cabecalhos, corpo = requisicao
+                status, resultado = await self.despachar(metodo, alvo, cabecalhos, corpo)
+                manter = versao == 'HTTP/1.1' and cabecalhos.get('connection', '').lower() != 'close'
+                await _responder(escritor, status, resultado, manter)
+                if not manter:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            escritor.close()
+
+    async def servir(self):
+        self._semaforo = asyncio.Semaphore(self.config['concorrencia'])
+        gravador = obter_gravador() if self.config['adiado'] else None
+        if gravador is not None:
+            gravador.iniciar()
+        servidor = await asyncio.start_server(self.atender, self.config['host'], self.config['porta'])
+        enderecos = ', '.join(f'{soquete.getsockname()[0]}:{soquete.getsockname()[1]}' for soquete in servidor.sockets)
+        print(f'Ecoflux servindo em {enderecos} (concorrência {self.config["concorrencia"]}, '
+              f'tempo máximo {self.config["timeout"]:.0f}s)', file=sys.stderr)
+        try:
+            async with servidor:
+                await servidor.serve_forever()
+        finally:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            if gravador is not None:
+                gravador.parar()
+
+#Lê linha de requisição, cabeçalhos e corpo (Content-Length); None quando o cliente fechou a conexão
+async def _ler_requisicao(leitor):
+    linha = await leitor.readline()
+    if not linha:
+        return None
+    try:
+        metodo, alvo, versao = linha.decode('latin-1').split()
+    except ValueError:
+        raise ErroHTTP(HTTPStatus.BAD_REQUEST, 'Linha de requisição inválida.') from None
+
+    cabecalhos = {}
+    while True:
+        linha = await leitor.readline()
+        if linha in (b'\r\n', b'\n', b''):
+            break
+        nome, _, valor = linha.decode('latin-1').partition(':')
+        cabecalhos[nome.strip().lower()] = valor.strip()
+
+    try:
+        tamanho = int(cabecalhos.get('content-length') or 0)
+    except ValueError:
+        raise ErroHTTP(HTTPStatus.BAD_REQUEST, 'Content-Length inválido.') from None
+    if tamanho < 0:
+        raise ErroHTTP(HTTPStatus.BAD_REQUEST, 'Content-Length inválido.')
+    if tamanho > TAMANHO_MAXIMO_CORPO:
+        raise ErroHTTP(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, 'Corpo da requisição grande demais.')
+    corpo = await leitor.readexactly(tamanho) if tamanho else b''
+    return metodo.upper(), alvo, versao, cabecalhos, corpo
+
+async def _responder(escritor, status, resultado, manter):
+    corpo = json.dumps(resultado, default=_para_json, ensure_ascii=False).encode('utf-8')
+    cabecalho = (
+        f'HTTP/1.1 {status.value} {status.phrase}\r\n'
+        'Content-Type: application/json; charset=utf-8\r\n'
+        f'Content-Length: {len(corpo)}\r\n'
+        f'Connection: {"keep-alive" if manter else "close"}\r\n\r\n'
+    )
+    escritor.write(cabecalho.encode('latin-1') + corpo)
+    await escritor.drain()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Ecoflux em modo serviço (API HTTP/JSON local).')
+    parser.add_argument('--host', default=CONFIG_SERVICO['host'])
+    parser.add_argument('--porta', type=int, default=CONFIG_SERVICO['porta'])
+    parser.add_argument('--concorrencia', type=int, default=CONFIG_SERVICO['concorrencia'], help='Operações executadas ao mesmo tempo')
+    parser.add_argument('--timeout', type=float, default=CONFIG_SERVICO['timeout'], help='Tempo máximo de cada operação, em segundos')
+    parser.add_argument('--relatorios', default=CONFIG_SERVICO['diretorio_relatorios'], help='Diretório onde os relatórios são gravados')
+    parser.add_argument('--sqlite', metavar='ARQUIVO', help='Usa um banco SQLite local em vez do Oracle')
+    parser.add_argument('--adiado', action='store_true', default=CONFIG_SERVICO['adiado'],
+                        help='Grava as leituras no spool local e responde sem esperar o banco')
+    args = parser.parse_args(argv)
+
+    if args.sqlite:
+        definir_backend(criar_backend('sqlite', caminho=args.sqlite))
+    servico = Servico({
+        'host': args.host, 'porta': args.porta, 'concorrencia': args.concorrencia,
+        'timeout': args.timeout, 'diretorio_relatorios': args.relatorios, 'adiado': args.adiado,
+    })
+    try:
+        asyncio.run(servico.servir())
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,338 @@
+#Imports das funcionalidades a serem usadas
+import json
+import os
+import threading
+import uuid
+from datetime import datetime
+
+from armazenamento import ErroBanco, sessao
+from metricas import medir
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+#Gravação adiada (write-behind) das leituras de consumo: cada leitura é anexada a um spool local
+#(uma linha JSON por leitura, com fsync agrupado entre as threads que gravam ao mesmo tempo) e
+#confirmada na hora, sem esperar o banco. Uma thread em segundo plano esvazia o spool em lotes para
+#consumo_energetico; cada leitura leva uma chave de idempotência gravada na mesma transação
+#(tabela chaves_consumo), então reenviar um lote depois de uma falha não duplica leituras.
+#As leituras gravadas assim não passam pela verificação de anomalias na hora. O scan-anomalies as
+#avalia depois: a varredura segue a ordem de gravação no banco, então elas entram mesmo com data
+#anterior a leituras registradas direto enquanto estavam no spool.
+
+CONFIG_SPOOL = {
+    'diretorio': os.environ.get('ECOFLUX_SPOOL_DIR', 'spool'),
+    #Leituras por transação (no Oracle, até 1000: as chaves vão em uma lista IN)
+    'tamanho_lote': int(os.environ.get('ECOFLUX_SPOOL_LOTE', 500)),
+    'intervalo': float(os.environ.get('ECOFLUX_SPOOL_INTERVALO', 1.0)),
+    'espera_base': float(os.environ.get('ECOFLUX_SPOOL_ESPERA_BASE', 1.0)),
+    'espera_maxima': float(os.environ.get('ECOFLUX_SPOOL_ESPERA_MAXIMA', 60.0)),
+    'fsync': os.environ.get('ECOFLUX_SPOOL_FSYNC', '1').lower() in ('1', 'true', 'sim'),
+    #Com o spool todo gravado no banco e o arquivo acima deste tamanho, o arquivo é zerado
+    'compactar_acima': int(os.environ.get('ECOFLUX_SPOOL_COMPACTAR', 16 * 1024 * 1024)),
+}
+
+ARQUIVO_SPOOL = 'consumos.spool'
+ARQUIVO_POSICAO = 'consumos.posicao'
+ARQUIVO_REJEITADAS = 'consumos.rejeitadas.jsonl'
+ARQUIVO_TRAVA = 'consumos.trava'
+
+FORMATO_DATA = '%Y-%m-%d %H:%M:%S'
+
+class ErroSpool(Exception):
+    pass
+
+def _gravar_atomico(caminho, texto, sincronizar):
+    temporario = caminho + '.tmp'
+    with open(temporario, 'w', encoding='utf-8') as arquivo:
+        arquivo.write(texto)
+        arquivo.flush()
+        if sincronizar:
+            os.fsync(arquivo.fileno())
+    os.replace(temporario, caminho)
+
+#Linha do spool -> linha de consumo_energetico (a mesma de consumo.inserir_lote)
+def _linha_consumo(registro):
+    return (
+        registro['cnpj'], datetime.strptime(registro['data_registro'], FORMATO_DATA),
+        float(registro['consumo_kwh']), float(registro['custo_total']),
+        registro['setor'], registro['observacoes'], registro['usuario'],
+    )
+
+class Gravador:
+    def __init__(self, config=None):
+        self.config = dict(CONFIG_SPOOL)
+        self.config.update(config or {})
+        diretorio = self.config['diretorio']
+        os.makedirs(diretorio, exist_ok=True)
+        self.caminho = os.path.join(diretorio, ARQUIVO_SPOOL)
+        self.caminho_posicao = os.path.join(diretorio, ARQUIVO_POSICAO)
+        self.caminho_rejeitadas = os.path.join(diretorio, ARQUIVO_REJEITADAS)
+
+        #Um único processo por diretório de spool (o arquivo é anexado e truncado sem coordenação entre processos)
+        self._arquivo_trava = open(os.path.join(diretorio, ARQUIVO_TRAVA), 'a')
+        if fcntl is not None:
+            try:
+                fcntl.flock(self._arquivo_trava, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                self._arquivo_trava.close()
+                raise ErroSpool(f'O spool {diretorio} está em uso por outro processo.') from None
+
+        self._trava = threading.Lock()
+        self._trava_sincronia = threading.Lock()
+        self._trava_esvaziar = threading.Lock()
+        self._arquivo = open(self.caminho, 'ab')
+        self._reparar()
+        self._escrito = self._arquivo.tell()
+        self._sincronizado = self._escrito
+        self.posicao = self._ler_posicao()
+
+        self._evento = threading.Event()
+        self._parar = threading.Event()
+        self._thread = None
+        self.falhas = 0
+        self.ultimo_erro = None
+
+    #Uma queda no meio de uma gravação deixa a última linha incompleta; ela nunca foi confirmada e é descartada
+    def _reparar(self):
+        tamanho = self._arquivo.seek(0, os.SEEK_END)
+        if not tamanho:
+            return
+        with open(self.caminho, 'rb') as leitura:
+            inicio = max(0, tamanho - 64 * 1024)
+            while True:
+                leitura.seek(inicio)
+                bloco = leitura.read(tamanho - inicio)
+                fim_linha = bloco.rfind(b'\n')
+                if fim_linha >= 0 or inicio == 0:
+                    break
+                inicio = max(0, inicio - 64 * 1024)
+        valido = inicio + fim_linha + 1
+        if valido != tamanho:
+            self._arquivo.truncate(valido)
+            os.fsync(self._arquivo.fileno())
+        self._arquivo.seek(0, os.SEEK_END)
+
+    def _ler_posicao(self):
+        try:
+            with open(self.caminho_posicao, 'r', encoding='utf-8') as arquivo:
+                posicao = int(arquivo.read().strip() or 0)
+        except (OSError, ValueError):
+            return 0
+        #Posição além do fim: o arquivo foi zerado depois de a posição ser gravada
+        return posicao if posicao <= self._escrito else 0
+
+    def _gravar_posicao(self, posicao):
+        _gravar_atomico(self.caminho_posicao, str(posicao), self.config['fsync'])
+        self.posicao = posicao
+
+    #Garante no disco tudo o que foi escrito até 'fim'; quem chega enquanto outro fsync roda
+    #aproveita o próximo, que cobre as linhas de todas as threads que esperavam
+    def _sincronizar(self, fim):
+        if not self.config['fsync'] or self._sincronizado >= fim:
+            return
+        with self._trava_sincronia:
+            if self._sincronizado >= fim:
+                return
+            with self._trava:
+                alvo = self._escrito
+            with medir('spool.fsync'):
+                os.fsync(self._arquivo.fileno())
+            self._sincronizado = alvo
+
+    #Anexa a leitura ao spool e devolve o registro gravado (com a chave de idempotência) depois do fsync
+    def registrar(self, cnpj, consumo_kwh, custo_total, usuario, setor=None, observacoes=None, data_registro=None):
+        registro = {
+            'chave': uuid.uuid4().hex,
+            'cnpj': cnpj,
+            'data_registro': (data_registro or datetime.now()).strftime(FORMATO_DATA),
+            'consumo_kwh': float(consumo_kwh),
+            'custo_total': float(custo_total),
+            'setor': setor or 'Não especificado',
+            'observacoes': observacoes or 'Sem observações',
+            'usuario': usuario,
+        }
+        linha = (json.dumps(registro, ensure_ascii=False, separators=(',', ':')) + '\n').encode('utf-8')
+        with medir('spool.registrar') as medicao:
+            with self._trava:
+                self._arquivo.write(linha)
+                self._arquivo.flush()
+                self._escrito += len(linha)
+                fim = self._escrito
+            self._sincronizar(fim)
+            medicao.linhas = 1
+            medicao.bytes = len(linha)
+        self._evento.set()
+        return registro
+
+    def pendentes(self):
+        with self._trava:
+            return self._escrito - self.posicao
+
+    #Próximas linhas completas a partir da posição: ([(chave, linha) ou (None, texto inválido)], posição final)
+    def _ler_lote(self, tamanho_lote):
+        itens = []
+        with open(self.caminho, 'rb') as arquivo:
+            arquivo.seek(self.posicao)
+            posicao = self.posicao
+            while len(itens) < tamanho_lote:
+                bruta = arquivo.readline()
+                if not bruta.endswith(b'\n'):
+                    break
+                posicao += len(bruta)
+                try:
+                    registro = json.loads(bruta)
+                    itens.append((registro['chave'], registro))
+                except (ValueError, KeyError, TypeError):
+                    itens.append((None, bruta.decode('utf-8', 'replace').rstrip('\n')))
+        return itens, posicao
+
+    def _gravar_rejeitadas(self, rejeitadas):
+        if not rejeitadas:
+            return
+        with open(self.caminho_rejeitadas, 'a', encoding='utf-8') as arquivo:
+            for registro, mensagem in rejeitadas:
+                arquivo.write(json.dumps({'registro': registro, 'erro': mensagem}, ensure_ascii=False) + '\n')
+
+    #Grava um lote no banco; devolve (gravadas, duplicadas, rejeitadas) ou None se o spool estiver vazio
+    def _esvaziar_lote(self):
+        itens, fim = self._ler_lote(self.config['tamanho_lote'])
+        if not itens:
+            return None
+
+        rejeitadas = []
+        registros = {}
+        for chave, registro in itens:
+            if chave is None:
+                rejeitadas.append((registro, 'Linha inválida no spool'))
+            else:
+                registros.setdefault(chave, registro)
+
+        gravadas = 0
+        with sessao() as aberta:
+            try:
+                ja_gravadas = aberta.consumo.chaves_gravadas(list(registros))
+                novas = []
+                for chave, registro in registros.items():
+                    if chave in ja_gravadas:
+                        continue
+                    try:
+                        novas.append((chave, registro, _linha_consumo(registro)))
+                    except (ValueError, KeyError, TypeError) as erro:
+                        rejeitadas.append((registro, f'Registro inválido: {erro}'))
+                if novas:
+                    erros = aberta.consumo.inserir_lote([linha for _, _, linha in novas])
+                    aberta.consumo.gravar_chaves([chave for posicao, (chave, _, _) in enumerate(novas) if posicao not in erros])
+                    rejeitadas.extend((novas[posicao][1], mensagem) for posicao, mensagem in sorted(erros.items()))
+                    gravadas = len(novas) - len(erros)
+                aberta.commit()
+            except ErroBanco:
+                aberta.rollback()
+                raise
+
+        #Só depois do commit: uma queda antes de gravar a posição reenvia o lote, e as chaves evitam a duplicação
+        self._gravar_rejeitadas(rejeitadas)
+        self._gravar_posicao(fim)
+        return gravadas, len(itens) - gravadas - len(rejeitadas), len(rejeitadas)
+
+    #Zera o spool quando tudo já foi gravado e o arquivo passou do limite
+    def _compactar(self):
+        with self._trava_sincronia, self._trava:
+            if self.posicao != self._escrito or self._escrito < self.config['compactar_acima']:
+                return False
+            #Posição zerada antes do arquivo: uma queda entre os dois só reenvia leituras já gravadas (ignoradas pelas chaves)
+            self._gravar_posicao(0)
+            self._arquivo.truncate(0)
+            self._arquivo.seek(0)
+            if self.config['fsync']:
+                os.fsync(self._arquivo.fileno())
+            self._escrito = self._sincronizado = 0
+            return True
+
+    #Grava no banco o que estiver no spool, um lote por transação
+    def esvaziar(self, limite_lotes=None):
+        resultado = {'gravadas': 0, 'duplicadas': 0, 'rejeitadas': 0, 'lotes': 0}
+        with self._trava_esvaziar, medir('spool.esvaziar') as medicao:
+            while limite_lotes is None or resultado['lotes'] < limite_lotes:
+                lote = self._esvaziar_lote()
+                if lote is None:
+                    break
+                resultado['lotes'] += 1
+                for campo, quantidade in zip(('gravadas', 'duplicadas', 'rejeitadas'), lote):
+                    resultado[campo] += quantidade
+            medicao.linhas = resultado['gravadas']
+            resultado['compactado'] = self._compactar()
+        resultado['pendentes_bytes'] = self.pendentes()
+        return resultado
+
+    #Thread que esvazia o spool a cada intervalo (ou logo que chega uma leitura), com espera
+    #exponencial enquanto o banco estiver fora do ar
+    def _executar(self):
+        espera = self.config['espera_base']
+        while not self._parar.is_set():
+            self._evento.wait(self.config['intervalo'])
+            self._evento.clear()
+            try:
+                self.esvaziar()
+            except (*ErroBanco, RuntimeError, OSError) as erro:
+                self.falhas += 1
+                self.ultimo_erro = str(erro)
+                self._parar.wait(espera)
+                espera = min(espera * 2, self.config['espera_maxima'])
+                continue
+            espera = self.config['espera_base']
+            self.ultimo_erro = None
+
+    def iniciar(self):
+        if self._thread is None:
+            self._parar.clear()
+            self._thread = threading.Thread(target=self._executar, name='ecoflux-spool', daemon=True)
+            self._thread.start()
+
+    #Para a thread; com esvaziar, tenta gravar o que ficou (o que não couber fica no spool para a próxima vez)
+    def parar(self, esvaziar=True):
+        if self._thread is not None:
+            self._parar.set()
+            self._evento.set()
+            self._thread.join()
+            self._thread = None
+        if esvaziar:
+            try:
+                self.esvaziar()
+            except (*ErroBanco, RuntimeError) as erro:
+                self.ultimo_erro = str(erro)
+
+    def situacao(self):
+        return {
+            'arquivo': self.caminho,
+            'pendentes_bytes': self.pendentes(),
+            'em_execucao': self._thread is not None,
+            'falhas': self.falhas,
+            'ultimo_erro': self.ultimo_erro,
+        }
+
+    def fechar(self):
+        self.parar(esvaziar=False)
+        with self._trava:
+            self._arquivo.close()
+        self._arquivo_trava.close()
+
+_gravador_padrao = None
+_trava_gravador = threading.Lock()
+
+#Retorna o gravador compartilhado pelo processo (criado no diretório de CONFIG_SPOOL)
+def obter_gravador():
+    global _gravador_padrao
+    with _trava_gravador:
+        if _gravador_padrao is None:
+            _gravador_padrao = Gravador()
+        return _gravador_padrao
+
+def definir_gravador(gravador):
+    global _gravador_padrao
+    with _trava_gravador:
+        anterior, _gravador_padrao = _gravador_padrao, gravador
+    if anterior is not None and anterior is not gravador:
+        anterior.fechar()
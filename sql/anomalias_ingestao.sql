@@ -0,0 +1,18 @@
+-- Ordem de gravação das leituras (Oracle), usada pela varredura de anomalias e pelo relatório incremental.
+-- Executar uma vez em um esquema em que consumo_energetico já existe; as tabelas de anomalias
+-- (estado_anomalias, anomalias_consumo, leituras_avaliadas) são criadas por BackendOracle.criar_estrutura.
+
+-- Id e instante de gravação, ambos atribuídos pelo banco. As linhas existentes recebem ids na ordem
+-- em que o ALTER as percorre.
+CREATE SEQUENCE seq_consumo_ingestao CACHE 1000;
+
+ALTER TABLE consumo_energetico ADD (
+    id_ingestao NUMBER DEFAULT seq_consumo_ingestao.NEXTVAL NOT NULL,
+    gravada_em TIMESTAMP DEFAULT SYSTIMESTAMP NOT NULL
+);
+
+-- Varredura de anomalias, que percorre cada série (empresa, setor) a partir do último id varrido.
+CREATE INDEX idx_consumo_serie_ingestao ON consumo_energetico (cnpj_empresa, setor, id_ingestao);
+
+-- Relatório incremental, que exporta as leituras de uma empresa gravadas depois do último id exportado.
+CREATE INDEX idx_consumo_empresa_ingestao ON consumo_energetico (cnpj_empresa, id_ingestao);
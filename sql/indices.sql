@@ -0,0 +1,12 @@
+-- Índices de apoio às consultas do Ecoflux (Oracle).
+-- Executar uma vez no esquema da aplicação; o backend SQLite cria os equivalentes sozinho.
+
+-- Histórico e análises por empresa, do mais recente para o mais antigo
+-- (paginação por chave em analise.historico_consumos e resumo dos últimos meses).
+CREATE INDEX idx_consumo_empresa_data ON consumo_energetico (cnpj_empresa, data_registro DESC);
+
+-- Histórico filtrado por setor (a varredura de anomalias usa o índice de sql/anomalias_ingestao.sql).
+CREATE INDEX idx_consumo_empresa_setor_data ON consumo_energetico (cnpj_empresa, setor, data_registro);
+
+-- Reconstrução de rollups por período.
+CREATE INDEX idx_consumo_data ON consumo_energetico (data_registro);
@@ -0,0 +1,24 @@
+#Os módulos do Ecoflux ficam na raiz do repositório (sem pacote); os testes importam de lá
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+from armazenamento import BackendSQLite, definir_backend
+
+CNPJ_TESTE = '11222333000181'
+
+#Banco SQLite novo, instalado como backend compartilhado, com uma empresa cadastrada
+@pytest.fixture
+def backend(tmp_path):
+    backend = BackendSQLite(str(tmp_path / 'ecoflux.db'))
+    definir_backend(backend)
+    aberta = backend.abrir_sessao()
+    aberta.empresas.inserir((CNPJ_TESTE, 'Empresa Teste', 'Teste', 'Comércio', 'Rua A 10',
+                             'Fulana', 'contato@teste.com', 10, 250.0, 'teste'))
+    aberta.commit()
+    aberta.fechar()
+    yield backend
+    definir_backend(None)
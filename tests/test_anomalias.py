@@ -0,0 +1,64 @@
+#Imports das funcionalidades a serem usadas
+from datetime import datetime, timedelta
+
+import anomalias
+import operacoes
+from conftest import CNPJ_TESTE
+
+def _leitura(instante, kwh, setor='Produção'):
+    return (CNPJ_TESTE, instante, kwh, kwh * 0.8, setor, 'Teste', 'teste')
+
+def _historico(backend, dias=25):
+    inicio = datetime.now() - timedelta(days=dias + 30)
+    aberta = backend.abrir_sessao()
+    aberta.consumo.inserir_lote([_leitura(inicio + timedelta(days=dia), 100.0 + dia % 5) for dia in range(dias)])
+    aberta.commit()
+
+def test_varredura_continua_de_onde_parou(backend):
+    _historico(backend)
+    assert operacoes.varrer_anomalias()['leituras'] == 25
+    assert operacoes.varrer_anomalias()['leituras'] == 0
+
+def test_leituras_retroativas_depois_do_registro_sao_varridas(backend):
+    _historico(backend)
+    operacoes.varrer_anomalias()
+    operacoes.registrar_consumo(CNPJ_TESTE, 102.0, 80.0, 'teste', setor='Produção')
+
+    #Importação em lote com datas anteriores à leitura registrada agora
+    ontem = datetime.now() - timedelta(days=1)
+    aberta = backend.abrir_sessao()
+    aberta.consumo.inserir_lote([_leitura(ontem - timedelta(hours=hora), 5000.0) for hora in range(30)])
+    aberta.commit()
+
+    resultado = operacoes.varrer_anomalias()
+    assert resultado['leituras'] == 30
+    assert resultado['anomalias'] == 30
+
+    #A leitura do registro não é contada de novo e a marca dela some depois da varredura
+    estado = aberta.anomalias.estado(CNPJ_TESTE, 'Produção')
+    assert estado[2] == 26
+    assert aberta.conexao.execute('SELECT COUNT(*) FROM leituras_avaliadas').fetchone()[0] == 0
+    assert operacoes.varrer_anomalias()['leituras'] == 0
+
+def test_leitura_com_mesma_data_nao_e_perdida(backend):
+    _historico(backend)
+    instante = datetime.now().replace(microsecond=0)
+    aberta = backend.abrir_sessao()
+    aberta.consumo.inserir_lote([_leitura(instante, 101.0)])
+    aberta.commit()
+    operacoes.varrer_anomalias()
+    aberta.consumo.inserir_lote([_leitura(instante, 5000.0)])
+    aberta.commit()
+    resultado = operacoes.varrer_anomalias()
+    assert (resultado['leituras'], resultado['anomalias']) == (1, 1)
+
+def test_registro_avalia_leitura_na_hora(backend):
+    _historico(backend)
+    operacoes.varrer_anomalias()
+    aberta = backend.abrir_sessao()
+    gravada = aberta.consumo.inserir(_leitura(None, 5000.0))
+    anomalia = anomalias.verificar_leitura(aberta, CNPJ_TESTE, 'Produção', gravada, 5000.0)
+    aberta.commit()
+    assert anomalia['consumo_kwh'] == 5000.0
+    assert anomalia['data_registro'] == gravada[1]
+    assert operacoes.varrer_anomalias()['leituras'] == 0
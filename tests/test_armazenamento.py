@@ -0,0 +1,52 @@
+#Imports das funcionalidades a serem usadas
+import threading
+
+from armazenamento import sessao
+from conftest import CNPJ_TESTE
+
+def _contar(aberta):
+    return aberta.conexao.execute('SELECT COUNT(*) FROM consumo_energetico').fetchone()[0]
+
+def _leitura(kwh):
+    return (CNPJ_TESTE, None, kwh, kwh * 0.8, 'A', '-', 'teste')
+
+def test_sessao_interna_nao_desfaz_a_externa(backend):
+    with sessao() as externa:
+        externa.consumo.inserir(_leitura(10.0))
+        with sessao() as interna:
+            assert _contar(interna) == 1
+        externa.commit()
+    with sessao() as aberta:
+        assert _contar(aberta) == 1
+
+def test_ultima_sessao_desfaz_o_que_nao_foi_confirmado(backend):
+    with sessao() as externa:
+        externa.consumo.inserir(_leitura(10.0))
+        with sessao():
+            pass
+    with sessao() as aberta:
+        assert _contar(aberta) == 0
+
+def test_fechar_duas_vezes_nao_afeta_outra_sessao(backend):
+    with sessao() as externa:
+        externa.consumo.inserir(_leitura(10.0))
+        interna = backend.abrir_sessao()
+        interna.fechar()
+        interna.fechar()
+        externa.commit()
+    with sessao() as aberta:
+        assert _contar(aberta) == 1
+
+def test_threads_tem_sessoes_independentes(backend):
+    with sessao() as externa:
+        externa.consumo.inserir(_leitura(10.0))
+        externa.commit()
+        #Outra thread usa outra conexão: fechar a sessão dela não mexe na desta
+        resultado = []
+        def outra():
+            with sessao() as aberta:
+                resultado.append(_contar(aberta))
+        thread = threading.Thread(target=outra)
+        thread.start()
+        thread.join()
+    assert resultado == [1]
@@ -0,0 +1,116 @@
+#Imports das funcionalidades a serem usadas
+import oracledb
+import pytest
+
+import banco
+from banco import PoolConexoes
+
+#Pool local no lugar do oracledb: empresta objetos simples e registra o que foi devolvido ou descartado
+class ConexaoFalsa:
+    def __init__(self, viva=True):
+        self.viva = viva
+        self.fechada = False
+
+    def ping(self):
+        if not self.viva:
+            raise oracledb.DatabaseError('conexão perdida')
+
+    def close(self):
+        self.fechada = True
+
+class PoolFalso:
+    def __init__(self, **opcoes):
+        self.opcoes = opcoes
+        self.opened = 0
+        self.busy = 0
+        self.devolvidas = []
+        self.descartadas = []
+        self.fechado = False
+        self.falhar_aquisicao = False
+        self.falhar_devolucao = False
+
+    def acquire(self):
+        if self.falhar_aquisicao:
+            raise oracledb.DatabaseError('pool esgotado')
+        self.opened += 1
+        self.busy += 1
+        return ConexaoFalsa()
+
+    def release(self, conexao):
+        if self.falhar_devolucao:
+            raise oracledb.InterfaceError('sessão quebrada')
+        self.busy -= 1
+        self.devolvidas.append(conexao)
+
+    def drop(self, conexao):
+        self.busy -= 1
+        self.descartadas.append(conexao)
+
+    def close(self):
+        self.fechado = True
+
+@pytest.fixture
+def pool():
+    criados = []
+
+    def fabrica(**opcoes):
+        criados.append(PoolFalso(**opcoes))
+        return criados[-1]
+
+    pool = PoolConexoes({'user': 'u', 'password': 'p', 'dsn': 'local'}, {'max': 2}, fabrica)
+    pool.criados = criados
+    yield pool
+    pool.fechar()
+
+def test_pool_criado_uma_vez_com_as_configuracoes(pool):
+    pool.liberar(pool.adquirir())
+    pool.liberar(pool.adquirir())
+    assert len(pool.criados) == 1
+    assert pool.criados[0].opcoes['dsn'] == 'local'
+    assert pool.criados[0].opcoes['max'] == 2
+
+def test_adquirir_e_liberar_registram_metricas(pool):
+    conexao = pool.adquirir()
+    pool.liberar(conexao)
+    resumo = pool.estatisticas()
+    assert resumo['aquisicoes'] == 1
+    assert resumo['liberacoes'] == 1
+    assert resumo['falhas'] == 0
+    assert resumo['ocupadas'] == 0
+    assert pool.criados[0].devolvidas == [conexao]
+
+def test_sessao_que_falha_na_devolucao_e_descartada(pool):
+    conexao = pool.adquirir()
+    pool.criados[0].falhar_devolucao = True
+    pool.liberar(conexao)
+    assert pool.criados[0].descartadas == [conexao]
+    assert pool.estatisticas()['falhas'] == 1
+
+def test_falha_na_aquisicao_e_contada(pool):
+    pool.liberar(pool.adquirir())
+    pool.criados[0].falhar_aquisicao = True
+    with pytest.raises(oracledb.DatabaseError):
+        pool.adquirir()
+    assert pool.estatisticas()['falhas'] == 1
+    assert pool.verificar_saude() is False
+
+def test_liberar_none_nao_faz_nada(pool):
+    pool.liberar(None)
+    assert pool.estatisticas()['liberacoes'] == 0
+
+def test_fechar_fecha_o_pool(pool):
+    pool.liberar(pool.adquirir())
+    pool.fechar()
+    assert pool.criados[0].fechado
+
+def test_conectar_banco_usa_o_pool_compartilhado(pool):
+    banco.definir_pool(pool)
+    try:
+        conexao = banco.conectar_banco()
+        assert isinstance(conexao, ConexaoFalsa)
+        banco.liberar_conexao(conexao)
+        assert pool.estatisticas()['liberacoes'] == 1
+        pool.criados[0].falhar_aquisicao = True
+        assert banco.conectar_banco() is None
+    finally:
+        banco.definir_pool(None)
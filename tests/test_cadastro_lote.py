@@ -0,0 +1,66 @@
+#Imports das funcionalidades a serem usadas
+from cadastro_lote import cadastrar_empresas
+from cnpj import CNPJNaoEncontrado
+from diretorio import DiretorioEmpresas, carregar_empresas, definir_diretorio
+from conftest import CNPJ_TESTE
+
+#Cliente no lugar da API de CNPJ: cada CNPJ devolve um dicionário, outro valor qualquer ou lança um erro
+class ClienteFalso:
+    def __init__(self, respostas):
+        self.respostas = respostas
+        self.consultas = []
+
+    def consultar(self, cnpj):
+        self.consultas.append(cnpj)
+        resposta = self.respostas[cnpj]
+        if isinstance(resposta, Exception):
+            raise resposta
+        return resposta
+
+def _dados(nome):
+    return {'company': {'name': nome}, 'mainActivity': {'text': 'Indústria'}}
+
+def test_cadastro_em_lote_separa_o_resultado_de_cada_cnpj(backend, tmp_path):
+    diretorio = DiretorioEmpresas(carregar_empresas)
+    definir_diretorio(diretorio)
+    diretorio.total()
+
+    arquivo = tmp_path / 'empresas.csv'
+    arquivo.write_text(
+        'cnpj;num_funcionarios;area_total\n'
+        '33.000.167/0001-01;120;1500,5\n'
+        '33000167000101;1;1\n'
+        f'{CNPJ_TESTE};10;250\n'
+        '60746948000112;abc;10\n'
+        '123;5;5\n'
+        '00000000000191;5;5\n'
+        '11444777000161;5;5\n'
+        '04252011000110;8;80\n',
+        encoding='utf-8')
+    cliente = ClienteFalso({
+        '33000167000101': _dados('Petróleo Brasileiro'),
+        CNPJ_TESTE: _dados('Empresa Teste'),
+        '00000000000191': CNPJNaoEncontrado('00000000000191'),
+        '11444777000161': ['formato', 'inesperado'],
+        '04252011000110': _dados('Zeta Serviços'),
+    })
+
+    try:
+        resultados = cadastrar_empresas(str(arquivo), 'teste', simultaneas=2, tamanho_lote=2, cliente=cliente)
+    finally:
+        definir_diretorio(None)
+
+    assert resultados['33000167000101'] == ('cadastrada', 'Petróleo Brasileiro')
+    assert resultados['04252011000110'] == ('cadastrada', 'Zeta Serviços')
+    assert resultados[CNPJ_TESTE][0] == 'erro'
+    assert resultados['60746948000112'] == ('erro', 'Número de funcionários ou área total inválidos.')
+    assert resultados['123'] == ('erro', 'CNPJ inválido. Deve conter 14 dígitos.')
+    assert resultados['00000000000191'] == ('erro', str(CNPJNaoEncontrado('00000000000191')))
+    assert resultados['11444777000161'][1].startswith('AttributeError')
+    assert len(resultados) == 7
+    assert sorted(cliente.consultas) == sorted(cnpj for cnpj in cliente.respostas)
+
+    assert sorted(carregar_empresas()) == [
+        ('04252011000110', 'Zeta Serviços'), (CNPJ_TESTE, 'Empresa Teste'), ('33000167000101', 'Petróleo Brasileiro'),
+    ]
+    assert diretorio.razao_social('04252011000110') == 'Zeta Serviços'
@@ -0,0 +1,36 @@
+#Imports das funcionalidades a serem usadas
+import json
+
+import cli
+import operacoes
+from conftest import CNPJ_TESTE
+
+def _executar(capsys, *argv):
+    codigo = cli.main(list(argv))
+    return codigo, json.loads(capsys.readouterr().out)
+
+def test_lista_no_json_com_um_item_ruim(backend, tmp_path, capsys):
+    arquivo = tmp_path / 'lista.json'
+    arquivo.write_text(json.dumps([
+        {'cnpj': CNPJ_TESTE, 'consumo_kwh': 10, 'custo_total': 8, 'usuario': 'ana'},
+        {'cnpj': '99999999000199', 'consumo_kwh': 10, 'custo_total': 8},
+        {'cnpj': CNPJ_TESTE, 'custo_total': 8},
+        'texto',
+        {'cnpj': CNPJ_TESTE, 'consumo_kwh': 30, 'custo_total': 24},
+    ]), encoding='utf-8')
+    codigo, saida = _executar(capsys, 'record-consumption', '--json', str(arquivo), '--setor', 'A')
+    assert codigo == 1
+    assert [resultado.get('item') for resultado in saida] == [None, 1, 2, 3, None]
+    assert 'consumo_kwh' in saida[2]['erro']
+
+    #Os itens válidos foram gravados, com o setor da linha de comando e o usuário de cada item
+    linhas = backend.abrir_sessao().conexao.execute(
+        'SELECT consumo_kwh, setor, usuario_registro FROM consumo_energetico ORDER BY id_consumo').fetchall()
+    assert linhas == [(10.0, 'A', 'ana'), (30.0, 'A', cli.USUARIO_PADRAO)]
+
+def test_usuario_da_linha_de_comando_vale_para_todos(backend, tmp_path, capsys):
+    arquivo = tmp_path / 'item.json'
+    arquivo.write_text(json.dumps({'cnpj': CNPJ_TESTE, 'consumo_kwh': 10, 'custo_total': 8, 'usuario': 'ana'}), encoding='utf-8')
+    codigo, saida = _executar(capsys, '--usuario', 'bia', 'record-consumption', '--json', str(arquivo))
+    assert codigo == 0 and len(saida) == 1
+    assert backend.abrir_sessao().conexao.execute('SELECT usuario_registro FROM consumo_energetico').fetchone() == ('bia',)
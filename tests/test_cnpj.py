@@ -0,0 +1,120 @@
+#Imports das funcionalidades a serem usadas
+import json
+
+import pytest
+import requests
+
+import cnpj
+from cnpj import CacheTTL, ClienteCNPJ, CNPJNaoEncontrado, ErroConsultaCNPJ, extrair_dados_empresa
+from perfis import PerfisCNPJ
+
+CNPJ = '11222333000181'
+
+DADOS = {
+    'company': {'name': 'Empresa Teste', 'members': [{'person': {'name': 'Fulana'}}]},
+    'alias': 'Teste',
+    'mainActivity': {'text': 'Comércio varejista'},
+    'address': {'street': 'Rua A', 'number': '10', 'state': 'SP', 'city': 'São Paulo'},
+    'emails': [{'address': 'contato@teste.com'}],
+}
+
+def _resposta(status, dados=None, cabecalhos=None):
+    resposta = requests.Response()
+    resposta.status_code = status
+    resposta._content = json.dumps(dados).encode('utf-8') if dados is not None else b''
+    resposta.headers.update(cabecalhos or {})
+    return resposta
+
+#Sessão HTTP local no lugar da API: devolve (ou lança) os itens da fila, um por chamada
+class SessaoFalsa:
+    def __init__(self, *respostas):
+        self.respostas = list(respostas)
+        self.chamadas = []
+
+    def get(self, url, timeout=None):
+        self.chamadas.append(url)
+        resposta = self.respostas.pop(0)
+        if isinstance(resposta, Exception):
+            raise resposta
+        return resposta
+
+    def close(self):
+        pass
+
+@pytest.fixture
+def esperas(monkeypatch):
+    registradas = []
+    monkeypatch.setattr(cnpj.time, 'sleep', registradas.append)
+    return registradas
+
+@pytest.fixture
+def perfis(tmp_path):
+    perfis = PerfisCNPJ(str(tmp_path / 'perfis.db'))
+    yield perfis
+    perfis.fechar()
+
+def _cliente(sessao, perfis, **config):
+    config = {'requisicoes_por_minuto': 60_000, 'rajada': 100, 'tentativas': 3, 'espera_base': 1.0, **config}
+    return ClienteCNPJ('http://api.local/office', config, sessao, perfis)
+
+def test_consulta_guarda_em_cache_e_no_perfil(perfis, esperas):
+    sessao = SessaoFalsa(_resposta(200, DADOS))
+    cliente = _cliente(sessao, perfis)
+    assert cliente.consultar(CNPJ) == DADOS
+    assert cliente.consultar(CNPJ) == DADOS
+    assert sessao.chamadas == [f'http://api.local/office/{CNPJ}']
+    assert perfis.setor(CNPJ) == 'Comércio varejista'
+
+def test_nao_encontrado_fica_em_cache(perfis, esperas):
+    sessao = SessaoFalsa(_resposta(404))
+    cliente = _cliente(sessao, perfis)
+    for _ in range(2):
+        with pytest.raises(CNPJNaoEncontrado):
+            cliente.consultar(CNPJ)
+    assert len(sessao.chamadas) == 1
+
+def test_repete_status_temporario_com_espera_limitada(perfis, esperas):
+    sessao = SessaoFalsa(_resposta(503, cabecalhos={'Retry-After': '86400'}), _resposta(429), _resposta(200, DADOS))
+    cliente = _cliente(sessao, perfis, espera_maxima=5.0)
+    assert cliente.consultar(CNPJ) == DADOS
+    assert esperas == [5.0, 2.0]
+
+def test_erro_de_conexao_esgota_tentativas(perfis, esperas):
+    sessao = SessaoFalsa(*[requests.ConnectionError('recusada')] * 3)
+    with pytest.raises(ErroConsultaCNPJ):
+        _cliente(sessao, perfis).consultar(CNPJ)
+    assert len(sessao.chamadas) == 3
+
+@pytest.mark.parametrize('erro', [requests.TooManyRedirects('voltas'), requests.exceptions.InvalidURL('url')])
+def test_outros_erros_http_viram_erro_de_consulta(perfis, esperas, erro):
+    with pytest.raises(ErroConsultaCNPJ):
+        _cliente(SessaoFalsa(erro), perfis).consultar(CNPJ)
+
+def test_perfil_antigo_e_usado_se_a_api_falhar(perfis, esperas):
+    perfis.guardar(CNPJ, DADOS, consultado_em=1.0)
+    sessao = SessaoFalsa(*[requests.Timeout('lenta')] * 3)
+    assert _cliente(sessao, perfis).consultar(CNPJ) == DADOS
+
+def test_extrair_dados_empresa():
+    empresa = extrair_dados_empresa(DADOS)
+    assert empresa['razao_social'] == 'Empresa Teste'
+    assert empresa['setor'] == 'Comércio varejista'
+    assert empresa['endereco'] == 'Rua A 10'
+    assert empresa['responsavel'] == 'Fulana'
+    assert empresa['contato'] == 'contato@teste.com'
+
+def test_cache_em_arquivo_anexa_e_compacta(tmp_path):
+    arquivo = str(tmp_path / 'cache.jsonl')
+    cache = CacheTTL(3, arquivo)
+    for numero in range(10):
+        cache.guardar(f'c{numero}', {'n': numero}, 60)
+    cache.guardar('vazio', None, 60)
+    cache.fechar()
+    with open(arquivo, 'r', encoding='utf-8') as entrada:
+        assert len(entrada.readlines()) <= 6
+
+    recarregado = CacheTTL(3, arquivo)
+    assert recarregado.obter('vazio')[1] is None
+    assert recarregado.obter('c9')[1] == {'n': 9}
+    assert recarregado.obter('c0') is None
+    assert len(recarregado) == 3
@@ -0,0 +1,69 @@
+#Imports das funcionalidades a serem usadas
+from diretorio import DiretorioEmpresas, carregar_empresas
+from conftest import CNPJ_TESTE
+
+EMPRESAS = [
+    ('33000167000101', 'Petróleo Brasileiro'),
+    ('11222333000181', 'Alfa Comércio'),
+    ('11222444000155', 'Beta Alfa Serviços'),
+    ('60746948000112', 'alfaiataria Central'),
+    ('00000000000191', None),
+]
+
+def _diretorio(empresas=EMPRESAS, validade=300):
+    cargas = []
+    def carregar():
+        cargas.append(1)
+        return list(empresas)
+    return DiretorioEmpresas(carregar, validade), cargas
+
+def test_busca_por_nome_prefixo_antes_de_trecho():
+    diretorio, cargas = _diretorio()
+    assert [cnpj for cnpj, _ in diretorio.buscar('ALFA')] == ['11222333000181', '60746948000112', '11222444000155']
+    assert diretorio.buscar('inexistente') == []
+    assert len(diretorio.buscar('')) == 5
+    assert len(cargas) == 1
+
+def test_busca_por_cnpj_aceita_prefixo_com_pontuacao():
+    diretorio, _ = _diretorio()
+    assert diretorio.buscar('11.222') == [('11222333000181', 'Alfa Comércio'), ('11222444000155', 'Beta Alfa Serviços')]
+    assert diretorio.buscar('11.222.444/0001-55') == [('11222444000155', 'Beta Alfa Serviços')]
+    assert diretorio.razao_social('33000167000101') == 'Petróleo Brasileiro'
+    assert diretorio.razao_social('99999999999999') is None
+
+def test_paginas_cobrem_o_resultado_sem_repetir():
+    empresas = [(f'{posicao:014d}', f'Empresa {posicao:03d}') for posicao in range(45)]
+    diretorio, _ = _diretorio(empresas)
+    vistos = []
+    for numero in range(3):
+        itens, atual, total_paginas, total = diretorio.pagina('empresa', numero, tamanho=20)
+        assert (atual, total_paginas, total) == (numero, 3, 45)
+        vistos += itens
+    assert vistos == sorted(empresas, key=lambda empresa: empresa[1].lower())
+    #Números fora do intervalo ficam na primeira ou na última página
+    assert diretorio.pagina('empresa', 9, tamanho=20)[1] == 2
+    assert diretorio.pagina('empresa', -1, tamanho=20)[1] == 0
+    assert diretorio.pagina('nada', 0) == ([], 0, 1, 0)
+
+def test_adicionar_mantem_a_ordem_sem_recarregar():
+    diretorio, cargas = _diretorio()
+    assert diretorio.total() == 5
+    diretorio.adicionar('12345678000195', 'Alfa Bebidas')
+    assert diretorio.buscar('alfa b') == [('12345678000195', 'Alfa Bebidas')]
+    assert diretorio.buscar('alfa')[0] == ('12345678000195', 'Alfa Bebidas')
+    assert diretorio.buscar('123') == [('12345678000195', 'Alfa Bebidas')]
+    assert diretorio.total() == 6
+    assert len(cargas) == 1
+
+    diretorio.invalidar()
+    assert diretorio.total() == 5
+    assert len(cargas) == 2
+
+def test_indice_vencido_e_recarregado():
+    diretorio, cargas = _diretorio(validade=-1)
+    diretorio.total()
+    diretorio.total()
+    assert len(cargas) == 2
+
+def test_carrega_as_empresas_do_backend(backend):
+    assert carregar_empresas() == [(CNPJ_TESTE, 'Empresa Teste')]
@@ -0,0 +1,63 @@
+#Imports das funcionalidades a serem usadas
+from datetime import datetime
+
+import armazenamento
+from importar_consumo import importar_arquivo
+from conftest import CNPJ_TESTE
+from test_rollups import CursorFalso, ErroLote
+
+def test_importacao_coleta_erros_sem_abortar_o_lote(backend, tmp_path):
+    arquivo = tmp_path / 'leituras.csv'
+    arquivo.write_text(
+        'cnpj_empresa;data_registro;consumo_kwh;custo_total;setor\n'
+        f'{CNPJ_TESTE};2024-03-01;10,5;8;A\n'
+        f'{CNPJ_TESTE};2024-03-02;abc;8;A\n'
+        f'99999999000199;2024-03-03;12;9;A\n'
+        f'{CNPJ_TESTE};2024-03-04;13;10;B\n'
+        f'{CNPJ_TESTE};02/03/2024;14;11;\n',
+        encoding='utf-8')
+
+    resultado = importar_arquivo(str(arquivo), 'teste', tamanho_lote=2)
+
+    assert resultado.lidas == 5
+    assert resultado.inseridas == 3
+    assert [numero for numero, _ in resultado.erros] == [3, 4]
+    assert resultado.erros[0][1].startswith('Registro inválido')
+    assert resultado.lotes == 2
+
+    aberta = backend.abrir_sessao()
+    try:
+        gravadas = aberta.conexao.execute(
+            'SELECT consumo_kwh, setor FROM consumo_energetico ORDER BY id_consumo').fetchall()
+    finally:
+        aberta.fechar()
+    assert gravadas == [(10.5, 'A'), (13.0, 'B'), (14.0, 'Não especificado')]
+
+#Conexão no lugar do Oracle, que entrega sempre o mesmo cursor falso
+class ConexaoFalsa:
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def cursor(self):
+        return self
+
+    def __enter__(self):
+        return self._cursor
+
+    def __exit__(self, *erro):
+        return False
+
+def test_lote_oracle_devolve_as_linhas_rejeitadas_e_nao_as_soma_nos_rollups():
+    cursor = CursorFalso([ErroLote(1, 2291, 'ORA-02291: chave pai não encontrada')])
+    linhas = [
+        (CNPJ_TESTE, datetime(2024, 3, 1), 10.0, 8.0, 'A', '-', 'teste'),
+        ('99999999000199', datetime(2024, 3, 1), 20.0, 9.0, 'A', '-', 'teste'),
+        (CNPJ_TESTE, datetime(2024, 3, 1), 30.0, 10.0, 'A', '-', 'teste'),
+    ]
+    rejeitadas = armazenamento.ConsumoOracle(ConexaoFalsa(cursor)).inserir_lote(linhas)
+
+    assert rejeitadas == {1: 'ORA-02291: chave pai não encontrada'}
+    insercao, diario, mensal = cursor.execucoes
+    assert insercao == linhas
+    assert diario == [(CNPJ_TESTE, datetime(2024, 3, 1), 'A', 2, 40.0, 18.0, 10.0, 30.0, 8.0, 10.0)]
+    assert len(mensal) == 1
@@ -0,0 +1,70 @@
+#Imports das funcionalidades a serem usadas
+from collections import defaultdict
+from datetime import datetime
+
+import numpy as np
+import pytest
+
+from indicadores import (SerieConsumo, calcular_indicadores, media_movel, percentis_ordenados,
+                         serie_de_lotes, serie_sintetica)
+
+LEITURAS = [
+    (datetime(2024, 2, 28, 10), 20.0, 16.0),
+    (datetime(2024, 1, 30, 8), 10.0, 8.0),
+    (datetime(2024, 1, 30, 20), 5.0, 5.0),
+    (datetime(2024, 2, 2, 9), 0.0, 3.0),
+    (datetime(2024, 3, 1, 12), 30.0, 21.0),
+]
+
+#Segundos desde 1970 tratando a data como UTC, como nos lotes devolvidos pelo repositório
+def _serie(leituras):
+    return serie_de_lotes([[((data - datetime(1970, 1, 1)).total_seconds(), kwh, custo) for data, kwh, custo in leituras]])
+
+def test_indicadores_iguais_ao_calculo_leitura_a_leitura():
+    indicadores = calcular_indicadores(_serie(LEITURAS), num_funcionarios=5, area_total=100.0, janela=3)
+
+    por_mes = defaultdict(lambda: [0, 0.0, 0.0])
+    for data, kwh, custo in LEITURAS:
+        mes = por_mes[data.strftime('%Y-%m')]
+        mes[0] += 1
+        mes[1] += kwh
+        mes[2] += custo
+    meses = sorted(por_mes)
+
+    assert indicadores['leituras'] == 5
+    assert indicadores['consumo_total'] == 65.0
+    assert indicadores['custo_total'] == 53.0
+    assert indicadores['custo_por_kwh'] == round(53.0 / 65.0, 4)
+    assert (indicadores['kwh_por_funcionario'], indicadores['kwh_por_m2']) == (13.0, 0.65)
+    assert indicadores['mensal']['meses'] == meses
+    assert indicadores['mensal']['leituras'] == [por_mes[mes][0] for mes in meses]
+    assert indicadores['mensal']['consumo_kwh'] == [por_mes[mes][1] for mes in meses]
+    assert indicadores['mensal']['variacao_kwh'] == [None, 5.0, 10.0]
+    assert indicadores['mensal']['variacao_kwh_pct'] == [None, 33.33, 50.0]
+    #A leitura com 0 kWh não entra nos percentis de tarifa
+    tarifas = sorted(custo / kwh for _, kwh, custo in LEITURAS if kwh)
+    assert indicadores['percentis']['custo_por_kwh'][2] == round(float(np.percentile(tarifas, 50)), 4)
+
+def test_media_movel_inclui_dias_sem_leitura():
+    serie = _serie([(datetime(2024, 1, 1, 12), 3.0, 1.0), (datetime(2024, 1, 4, 12), 6.0, 1.0)])
+    indicadores = calcular_indicadores(serie, janela=2)
+    assert indicadores['media_movel']['dias'] == ['2024-01-02', '2024-01-03', '2024-01-04']
+    assert indicadores['media_movel']['consumo_kwh'] == [1.5, 0.0, 3.0]
+    assert indicadores['kwh_por_funcionario'] is None
+
+@pytest.mark.parametrize('percentis', [(0, 50, 100), (5, 25, 50, 75, 95), (33.3,)])
+def test_percentis_iguais_ao_numpy(percentis):
+    valores = serie_sintetica(1001).kwh
+    assert np.allclose(percentis_ordenados(valores, percentis), np.percentile(valores, percentis))
+
+def test_serie_fora_de_ordem_e_ordenada_e_media_movel_por_soma_acumulada():
+    instantes = np.array(['2024-01-03', '2024-01-01', '2024-01-02'], dtype='datetime64[s]')
+    serie = SerieConsumo(instantes, np.array([3.0, 1.0, 2.0]), np.array([30.0, 10.0, 20.0]))
+    assert serie.kwh.tolist() == [1.0, 2.0, 3.0]
+    assert serie.custo.tolist() == [10.0, 20.0, 30.0]
+    valores = np.arange(10, dtype=np.float64)
+    assert np.allclose(media_movel(valores, 4), np.convolve(valores, np.ones(4) / 4, mode='valid'))
+    assert len(media_movel(valores, 11)) == 0
+
+def test_serie_vazia_nao_tem_indicadores():
+    assert calcular_indicadores(serie_de_lotes([])) is None
@@ -0,0 +1,63 @@
+#Imports das funcionalidades a serem usadas
+import time
+
+import pytest
+
+import metricas
+
+@pytest.fixture
+def registro():
+    metricas.registro.limpar()
+    metricas.ativar()
+    yield metricas.registro
+    metricas.desativar()
+    metricas.registro.limpar()
+
+def test_chamada_com_erro_e_medida_e_contada(registro):
+    @metricas.medido('teste.funcao')
+    def funcao(falhar):
+        if falhar:
+            raise ValueError('falhou')
+        return [1, 2, 3]
+
+    assert funcao(False) == [1, 2, 3]
+    with pytest.raises(ValueError):
+        funcao(True)
+    resumo = registro.resumo()['teste.funcao']
+    assert (resumo['contagem'], resumo['erros'], resumo['linhas']) == (2, 1, 3)
+
+def test_gerador_com_erro_e_interrompido(registro):
+    @metricas.medido('teste.gerador')
+    def gerador(falhar):
+        yield [1, 2]
+        if falhar:
+            raise RuntimeError('falhou')
+        yield [3]
+
+    with pytest.raises(RuntimeError):
+        list(gerador(True))
+    #Parar de iterar antes do fim não é erro
+    iterador = gerador(False)
+    next(iterador)
+    iterador.close()
+    resumo = registro.resumo()['teste.gerador']
+    assert (resumo['contagem'], resumo['erros'], resumo['linhas']) == (2, 1, 4)
+
+def test_trecho_medido_com_erro(registro):
+    with pytest.raises(KeyError):
+        with metricas.medir('teste.trecho'):
+            raise KeyError('x')
+    assert registro.resumo()['teste.trecho']['erros'] == 1
+    assert 'ecoflux_operacao_erros_total{operacao="teste.trecho"} 1' in registro.texto_prometheus()
+
+def test_gerador_nao_mede_o_tempo_de_quem_consome(registro):
+    @metricas.medido('teste.lento')
+    def gerador():
+        for posicao in range(3):
+            time.sleep(0.01)
+            yield posicao
+
+    for _ in gerador():
+        time.sleep(0.05)
+    total = registro.resumo()['teste.lento']['total_s']
+    assert 0.03 <= total < 0.1
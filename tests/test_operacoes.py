@@ -0,0 +1,37 @@
+#Imports das funcionalidades a serem usadas
+from datetime import datetime, timedelta
+
+import operacoes
+from indicadores import indicadores_empresa
+from conftest import CNPJ_TESTE
+
+def test_detalhes_da_analise_paginados_por_chave(backend):
+    agora = datetime.now().replace(microsecond=0)
+    aberta = backend.abrir_sessao()
+    #Leituras com a mesma data também não podem se repetir nem sumir entre páginas
+    aberta.consumo.inserir_lote([
+        (CNPJ_TESTE, agora - timedelta(days=posicao // 2), 10.0 + posicao, 8.0, 'A', '-', 'teste')
+        for posicao in range(25)
+    ] + [(CNPJ_TESTE, agora - timedelta(days=400), 99.0, 80.0, 'A', '-', 'teste')])
+    aberta.commit()
+
+    vistos = []
+    apos = None
+    while True:
+        resultado = operacoes.analisar_consumo(CNPJ_TESTE, 6, detalhes=True, apos=apos, tamanho_pagina=10)
+        vistos += [detalhe['consumo_kwh'] for detalhe in resultado['detalhes']]
+        apos = resultado['proxima']
+        if apos is None:
+            break
+    assert sorted(vistos) == [10.0 + posicao for posicao in range(25)]
+    assert 'detalhes' not in operacoes.analisar_consumo(CNPJ_TESTE, 6)
+
+def test_indicadores_com_o_corte_do_resumo(backend):
+    agora = datetime.now().replace(microsecond=0)
+    aberta = backend.abrir_sessao()
+    aberta.consumo.inserir_lote([
+        (CNPJ_TESTE, agora - timedelta(days=dias), 10.0, 8.0, 'A', '-', 'teste') for dias in (1, 40, 200)
+    ])
+    aberta.commit()
+    indicadores = indicadores_empresa(aberta, CNPJ_TESTE, meses=6)
+    assert indicadores['leituras'] == 2
@@ -0,0 +1,55 @@
+#Imports das funcionalidades a serem usadas
+import time
+
+import pytest
+
+from perfis import PerfisCNPJ
+from test_cnpj import CNPJ, DADOS, SessaoFalsa, _cliente, _resposta
+
+@pytest.fixture
+def perfis(tmp_path):
+    perfis = PerfisCNPJ(str(tmp_path / 'perfis.db'))
+    yield perfis
+    perfis.fechar()
+
+def _dados(nome, setor, uf='SP'):
+    return {'company': {'name': nome}, 'mainActivity': {'text': setor}, 'address': {'state': uf, 'city': 'Cidade'}}
+
+def test_guarda_e_substitui_o_perfil_completo(perfis):
+    assert perfis.obter(CNPJ) is None
+    perfis.guardar(CNPJ, DADOS, consultado_em=time.time() - 100)
+    dados, idade = perfis.obter(CNPJ)
+    assert dados == DADOS
+    assert 99 <= idade < 200
+
+    perfis.guardar(CNPJ, _dados('Empresa Teste', 'Indústria têxtil'))
+    assert perfis.setor(CNPJ) == 'Indústria têxtil'
+    assert perfis.obter(CNPJ)[1] < 100
+    assert len(perfis) == 1
+
+    perfis.remover(CNPJ)
+    assert perfis.obter(CNPJ) is None and perfis.setor(CNPJ) is None
+
+def test_busca_por_setor_e_perfis_desatualizados(perfis):
+    agora = time.time()
+    perfis.guardar('1', _dados('Gama', 'Comércio varejista'), consultado_em=agora - 10)
+    perfis.guardar('2', _dados('Alfa', 'Comércio atacadista'), consultado_em=agora - 300)
+    perfis.guardar('3', _dados('Beta', 'Indústria'), consultado_em=agora - 200)
+
+    assert perfis.buscar_setor('Comércio') == [('2', 'Alfa', 'Comércio atacadista'), ('1', 'Gama', 'Comércio varejista')]
+    assert perfis.buscar_setor('Comércio', limite=1) == [('2', 'Alfa', 'Comércio atacadista')]
+    assert perfis.desatualizados(idade_maxima=100) == ['2', '3']
+    assert perfis.desatualizados(idade_maxima=100, limite=1) == ['2']
+
+def test_perfil_recente_dispensa_a_api_e_atualizar_consulta_de_novo(perfis):
+    perfis.guardar(CNPJ, DADOS)
+    novos = _dados('Empresa Teste', 'Serviços')
+    sessao = SessaoFalsa(_resposta(200, novos))
+    cliente = _cliente(sessao, perfis)
+
+    assert cliente.consultar(CNPJ) == DADOS
+    assert sessao.chamadas == []
+
+    assert cliente.consultar(CNPJ, atualizar=True) == novos
+    assert len(sessao.chamadas) == 1
+    assert perfis.setor(CNPJ) == 'Serviços'
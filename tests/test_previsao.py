@@ -0,0 +1,76 @@
+#Imports das funcionalidades a serem usadas
+from datetime import datetime
+
+import numpy as np
+import pytest
+
+import previsao
+from previsao import ESTACAO, CachePrevisoes, montar_matriz, prever, prever_todas
+from conftest import CNPJ_TESTE
+
+#Linhas (cnpj, setor, índice do mês, kWh, custo) de uma série com os valores dados, terminando no mês 'ultimo'
+def _linhas(cnpj, setor, valores, ultimo, tarifa=0.5):
+    primeiro = ultimo - len(valores) + 1
+    return [(cnpj, setor, primeiro + posicao, valor, valor * tarifa) for posicao, valor in enumerate(valores)]
+
+def test_matriz_descarta_meses_fora_da_janela_e_marca_o_inicio():
+    linhas = _linhas('1', 'A', [1.0, 2.0, 3.0], 102) + _linhas('2', 'A', [5.0], 102) + [('1', 'B', 90, 7.0, None)]
+    matriz = montar_matriz(linhas, 100, 3)
+    assert matriz.chaves == [('1', 'A'), ('2', 'A'), ('1', 'B')]
+    assert matriz.kwh.tolist() == [[1.0, 2.0, 3.0], [0.0, 0.0, 5.0], [0.0, 0.0, 0.0]]
+    assert matriz.historico.tolist() == [3, 1, 0]
+    assert len(montar_matriz([], 100, 3)) == 0
+
+def test_cada_metodo_reproduz_a_serie_que_ele_modela():
+    meses = 3 * ESTACAO
+    tempos = np.arange(meses)
+    sazonal = (100 + 20 * np.sin(2 * np.pi * tempos / ESTACAO)).tolist()
+    reta = (50 + 2.0 * tempos).tolist()
+    linhas = _linhas('1', 'sazonal', sazonal, meses - 1) + _linhas('1', 'reta', reta, meses - 1) + \
+        _linhas('1', 'constante', [80.0] * meses, meses - 1)
+    matriz = montar_matriz(linhas, 0, meses)
+
+    for metodo in ('holt_winters', 'sazonal_ingenuo'):
+        kwh, _, _ = prever(matriz, metodo, horizonte=2)
+        assert kwh[0] == pytest.approx(100 + 20 * np.sin(2 * np.pi * (meses + 1) / ESTACAO))
+        assert kwh[2] == pytest.approx(80.0)
+    kwh, custo, _ = prever(matriz, 'tendencia_linear', horizonte=1)
+    assert kwh[1] == pytest.approx(50 + 2.0 * meses)
+    assert custo[1] == pytest.approx(kwh[1] * 0.5)
+    assert prever(matriz, 'media')[0][2] == pytest.approx(80.0)
+    with pytest.raises(ValueError):
+        prever(matriz, 'inexistente')
+
+def test_auto_escolhe_o_metodo_pelo_historico():
+    meses = 2 * ESTACAO
+    linhas = (_linhas('1', 'A', [10.0] * meses, meses - 1) + _linhas('1', 'B', [10.0] * ESTACAO, meses - 1)
+              + _linhas('2', 'A', [10.0, 20.0, 30.0], meses - 1) + _linhas('3', 'A', [10.0], meses - 1, tarifa=0))
+    kwh, custo, metodos = prever(montar_matriz(linhas, 0, meses))
+    assert metodos.tolist() == ['holt_winters', 'sazonal_ingenuo', 'tendencia_linear', 'media']
+    assert kwh[2] == pytest.approx(40.0)
+    #Custo registrado como zero dá tarifa zero, e não a mediana das outras séries
+    assert custo[3] == 0.0
+
+def test_previsao_pelo_backend_usa_o_cache_ate_entrar_leitura_nova(backend, monkeypatch):
+    monkeypatch.setattr(previsao, 'cache_previsoes', CachePrevisoes(None))
+    aberta = backend.abrir_sessao()
+    try:
+        aberta.consumo.inserir_lote([
+            (CNPJ_TESTE, datetime(2024, mes, 10), 100.0 * mes, 50.0 * mes, 'A', '-', 'teste') for mes in (1, 2, 3)
+        ])
+        aberta.commit()
+        agora = datetime(2024, 4, 15)
+
+        resultado = prever_todas(aberta, agora=agora)
+        assert (resultado['mes'], resultado['series'], resultado['cache']) == ('2024-04', 1, False)
+        empresa = resultado['empresas'][CNPJ_TESTE]
+        assert empresa['setores'][0]['metodo'] == 'tendencia_linear'
+        assert empresa['consumo_kwh'] == pytest.approx(400.0)
+        assert empresa['custo_total'] == pytest.approx(200.0)
+        assert prever_todas(aberta, agora=agora)['cache']
+
+        aberta.consumo.inserir_lote([(CNPJ_TESTE, datetime(2024, 3, 20), 10.0, 5.0, 'A', '-', 'teste')])
+        aberta.commit()
+        assert not prever_todas(aberta, agora=agora)['cache']
+    finally:
+        aberta.fechar()
@@ -0,0 +1,56 @@
+#Imports das funcionalidades a serem usadas
+from datetime import datetime, timedelta
+
+import operacoes
+from ranking import montar_ranking
+from conftest import CNPJ_TESTE
+
+#(cnpj, razão social, setor, funcionários, área, registros, kWh, custo)
+LINHAS = [
+    ('1', 'Alfa', 'Comércio', 10, 100.0, 3, 1000.0, 800.0),
+    ('2', 'Beta', 'Comércio', 20, 400.0, 2, 1000.0, 900.0),
+    ('3', 'Gama', 'Indústria', 5, 50.0, 1, 2000.0, 1000.0),
+    ('4', 'Delta', None, 0, 0.0, 4, 500.0, 400.0),
+    ('5', 'Épsilon', 'Indústria', 8, 80.0, 0, None, None),
+]
+
+def test_ranking_geral_e_por_setor_com_a_posicao_da_empresa():
+    ranking = montar_ranking(LINHAS, top=2, cnpj='1')
+    assert ranking['empresas'] == 5
+    assert ranking['empresa'] == {'cnpj': '1', 'razao_social': 'Alfa', 'setor': 'Comércio'}
+
+    por_m2 = ranking['metricas']['kwh_por_m2']
+    #Sem área ou sem consumo a empresa fica fora da métrica
+    assert por_m2['geral']['empresas'] == 3
+    assert [item['cnpj'] for item in por_m2['geral']['melhores']] == ['2', '1']
+    assert [item['cnpj'] for item in por_m2['geral']['piores']] == ['3', '1']
+    assert por_m2['geral']['mediana'] == 10.0
+    assert sorted(por_m2['por_setor']) == ['Comércio', 'Indústria']
+    assert por_m2['empresa'] == {'valor': 10.0, 'geral': {'posicao': 2, 'de': 3, 'supera_pct': 33.3},
+                                 'setor': {'posicao': 2, 'de': 2, 'supera_pct': 0.0}}
+
+    custo = ranking['metricas']['custo_por_kwh']
+    assert custo['geral']['empresas'] == 4
+    assert custo['geral']['melhores'][0] == {'cnpj': '3', 'razao_social': 'Gama', 'setor': 'Indústria', 'valor': 0.5}
+    assert 'Não informado' in custo['por_setor']
+
+def test_ranking_de_um_setor():
+    ranking = montar_ranking(LINHAS, setor='Indústria')
+    assert list(ranking['metricas']['kwh_por_funcionario']['por_setor']) == ['Indústria']
+    assert 'empresa' not in ranking
+    assert montar_ranking([])['metricas']['kwh_por_m2']['geral'] == {'empresas': 0, 'mediana': None, 'melhores': [], 'piores': []}
+
+def test_ranking_pelos_totais_do_backend(backend):
+    agora = datetime.now().replace(microsecond=0)
+    aberta = backend.abrir_sessao()
+    aberta.consumo.inserir_lote([
+        (CNPJ_TESTE, agora - timedelta(days=dias), 100.0, 80.0, 'A', '-', 'teste') for dias in (1, 30, 400)
+    ])
+    aberta.commit()
+    aberta.fechar()
+
+    ranking = operacoes.ranking_empresas(cnpj=CNPJ_TESTE)
+    #A empresa de teste tem 10 funcionários e 250 m²; a leitura de 400 dias atrás fica fora do período
+    assert ranking['metricas']['kwh_por_m2']['empresa']['valor'] == 0.8
+    assert ranking['metricas']['kwh_por_funcionario']['empresa']['valor'] == 20.0
+    assert ranking['metricas']['custo_por_kwh']['empresa']['geral'] == {'posicao': 1, 'de': 1, 'supera_pct': 0.0}
@@ -0,0 +1,113 @@
+#Imports das funcionalidades a serem usadas
+import csv
+import gzip
+import json
+from datetime import datetime
+
+import pytest
+
+import operacoes
+import relatorio
+from conftest import CNPJ_TESTE
+
+def _consumos(quantidade, falhar=False):
+    for posicao in range(quantidade):
+        yield {'data_registro': f'2024-03-{posicao % 28 + 1:02d}', 'consumo_kwh': 10.0 + posicao,
+               'custo_total': 8.0, 'setor': 'A', 'observacoes': None}
+    if falhar:
+        raise RuntimeError('conexão perdida')
+
+@pytest.mark.parametrize('formato', ['json', 'csv', 'npz'])
+def test_falha_no_meio_nao_deixa_temporario(tmp_path, formato):
+    caminho = str(tmp_path / f'relatorio{relatorio.FORMATOS[formato]}')
+    with pytest.raises(RuntimeError):
+        relatorio.escrever_relatorio(_consumos(5, falhar=True), '1', 'Empresa', caminho, formato)
+    assert list(tmp_path.iterdir()) == []
+
+def test_parquet_com_esquema_fixo(tmp_path, monkeypatch):
+    pq = pytest.importorskip('pyarrow.parquet')
+    #Blocos pequenos: o primeiro só tem observações vazias e o tipo não pode depender dele
+    monkeypatch.setattr(relatorio, 'TAMANHO_BLOCO_COLUNAR', 3)
+    linhas = list(_consumos(5))
+    linhas[-1]['observacoes'] = 'texto'
+    caminho = str(tmp_path / 'relatorio.parquet')
+    assert relatorio.escrever_relatorio(linhas, '1', 'Empresa', caminho, 'parquet') == 5
+    tabela = pq.read_table(caminho)
+    assert str(tabela.schema.field('observacoes').type) == 'string'
+    assert tabela.schema.metadata[b'cnpj'] == b'1'
+    assert tabela.column('observacoes').to_pylist()[-1] == 'texto'
+
+#O relatório antigo: tudo em memória e um json.dump no final
+def _relatorio_antigo(consumos):
+    return {"cnpj": '1', "razao_social": 'Açúcar & Cia "Ltda"', "consumos": consumos}
+
+def _consumos_variados():
+    consumos = list(_consumos(3))
+    consumos[1]['observacoes'] = 'manutenção\nlinha 2, "aspas"'
+    consumos[2]['setor'] = None
+    return consumos
+
+def _ler(caminho, formato):
+    if formato == 'jsonl-gzip':
+        with gzip.open(caminho, 'rt', encoding='utf-8') as arquivo:
+            return arquivo.read()
+    with open(caminho, encoding='utf-8', newline='') as arquivo:
+        return arquivo.read()
+
+@pytest.mark.parametrize('formato', ['json', 'json-compacto', 'jsonl', 'jsonl-gzip', 'csv'])
+def test_escrita_em_fluxo_igual_ao_relatorio_antigo(tmp_path, formato):
+    consumos = _consumos_variados()
+    antigo = _relatorio_antigo(consumos)
+    caminho = str(tmp_path / f'relatorio{relatorio.FORMATOS[formato]}')
+    assert relatorio.escrever_relatorio(iter(consumos), antigo['cnpj'], antigo['razao_social'], caminho, formato) == 3
+    gerado = _ler(caminho, formato)
+
+    if formato == 'json':
+        assert gerado == json.dumps(antigo, indent=4, ensure_ascii=False)
+    elif formato == 'json-compacto':
+        assert gerado == json.dumps(antigo, ensure_ascii=False, separators=(',', ':'))
+        assert json.loads(gerado) == antigo
+    elif formato == 'csv':
+        linhas = list(csv.reader(gerado.splitlines(keepends=True)))
+        assert linhas[0] == ['cnpj', *consumos[0]]
+        assert linhas[1:] == [['1', *('' if valor is None else str(valor) for valor in consumo.values())]
+                              for consumo in consumos]
+    else:
+        assert [json.loads(linha) for linha in gerado.splitlines()] == [{'cnpj': '1', **consumo} for consumo in consumos]
+    assert list(tmp_path.iterdir()) == [tmp_path / f'relatorio{relatorio.FORMATOS[formato]}']
+
+def test_relatorio_sem_consumos_nao_cria_arquivo(tmp_path):
+    caminho = str(tmp_path / 'relatorio.json')
+    assert relatorio.escrever_relatorio(iter([]), '1', 'Empresa', caminho) == 0
+    assert list(tmp_path.iterdir()) == []
+
+def _inserir(backend, *linhas):
+    aberta = backend.abrir_sessao()
+    aberta.consumo.inserir_lote([(CNPJ_TESTE, data, kwh, kwh * 0.8, 'A', '-', 'teste') for data, kwh in linhas])
+    aberta.commit()
+
+def _incremental(diretorio):
+    return operacoes.gerar_relatorio(CNPJ_TESTE, 'jsonl', str(diretorio), incremental=True)
+
+def test_incremental_inclui_leitura_retroativa_gravada_depois(backend, tmp_path):
+    _inserir(backend, (datetime(2024, 3, 10), 10.0), (datetime(2024, 3, 10), 11.0))
+    assert _incremental(tmp_path)['registros'] == 2
+
+    #Gravadas depois da exportação: uma com data anterior à última exportada e outra com a mesma data
+    _inserir(backend, (datetime(2024, 1, 5), 20.0), (datetime(2024, 3, 10), 12.0))
+    resultado = _incremental(tmp_path)
+    assert (resultado['registros'], resultado['registros_total']) == (2, 4)
+    assert _incremental(tmp_path)['registros'] == 0
+
+    with open(resultado['arquivo'], encoding='utf-8') as arquivo:
+        exportadas = [json.loads(linha)['consumo_kwh'] for linha in arquivo]
+    assert exportadas == [10.0, 11.0, 20.0, 12.0]
+
+def test_marca_antiga_recomeca_o_relatorio(backend, tmp_path):
+    _inserir(backend, (datetime(2024, 3, 10), 10.0))
+    caminho = _incremental(tmp_path)['arquivo']
+    with open(caminho + relatorio.SUFIXO_MARCA, 'w', encoding='utf-8') as arquivo:
+        json.dump({'formato': 'jsonl', 'data_registro': '2024-03-10T00:00:00', 'linha': '1',
+                   'registros': 1, 'bytes': 0, 'partes': 1}, arquivo)
+    assert relatorio.ler_marca(caminho, 'jsonl') is None
+    assert _incremental(tmp_path)['registros_total'] == 1
@@ -0,0 +1,122 @@
+#Imports das funcionalidades a serem usadas
+import json
+from datetime import datetime
+
+import oracledb
+import pytest
+
+import armazenamento
+import cli
+import rollups
+from conftest import CNPJ_TESTE
+
+def test_agrupar_por_dia_e_mes():
+    leituras = [
+        ('1', datetime(2024, 3, 1, 8), 10.0, 8.0, 'A'),
+        ('1', datetime(2024, 3, 1, 20), 30.0, 20.0, 'A'),
+        ('1', datetime(2024, 3, 2, 9), 5.0, 4.0, 'A'),
+        ('1', datetime(2024, 3, 2, 9), 7.0, 6.0, 'B'),
+    ]
+    diario = {grupo[:3]: grupo[3:] for grupo in rollups._agrupar(leituras, False)}
+    assert diario[('1', datetime(2024, 3, 1), 'A')] == (2, 40.0, 28.0, 10.0, 30.0, 8.0, 20.0)
+    assert len(diario) == 3
+    mensal = {grupo[:3]: grupo[3:] for grupo in rollups._agrupar(leituras, True)}
+    assert mensal[('1', datetime(2024, 3, 1), 'A')] == (3, 45.0, 32.0, 5.0, 30.0, 4.0, 20.0)
+
+def test_meses_inteiros():
+    assert rollups._meses_inteiros(datetime(2024, 3, 15), datetime(2024, 12, 3)) == (datetime(2024, 3, 1), datetime(2025, 1, 1))
+    assert rollups._meses_inteiros(None, None) == (None, None)
+
+#Cursor no lugar do Oracle: cada executemany devolve os erros de lote da fila
+class ErroLote:
+    def __init__(self, offset, code, message='erro'):
+        self.offset = offset
+        self.code = code
+        self.message = message
+
+class CursorFalso:
+    def __init__(self, *erros):
+        self.erros = list(erros)
+        self.execucoes = []
+        self.atual = []
+
+    def setinputsizes(self, *tipos):
+        pass
+
+    def executemany(self, sql, linhas, batcherrors=False):
+        assert batcherrors
+        self.execucoes.append(list(linhas))
+        self.atual = self.erros.pop(0) if self.erros else []
+
+    def getbatcherrors(self):
+        return self.atual
+
+    def execute(self, sql, parametros=None):
+        self.execucoes.append(sql)
+
+    def fetchone(self):
+        return (datetime(2024, 3, 31, 23, 59, 59),)
+
+def test_merge_repete_so_os_grupos_com_chave_duplicada():
+    cursor = CursorFalso([ErroLote(1, 1)])
+    rollups._mesclar(cursor, rollups.SQL_MERGE_DIARIO, ['g0', 'g1', 'g2'])
+    assert cursor.execucoes == [['g0', 'g1', 'g2'], ['g1']]
+
+def test_merge_desiste_depois_das_tentativas():
+    cursor = CursorFalso(*[[ErroLote(0, 1)]] * rollups.TENTATIVAS_MERGE)
+    with pytest.raises(oracledb.IntegrityError):
+        rollups._mesclar(cursor, rollups.SQL_MERGE_DIARIO, ['g0'])
+
+def test_merge_propaga_outros_erros():
+    cursor = CursorFalso([ErroLote(0, 1), ErroLote(1, 1400)])
+    with pytest.raises(oracledb.DatabaseError):
+        rollups._mesclar(cursor, rollups.SQL_MERGE_DIARIO, ['g0', 'g1'])
+    assert len(cursor.execucoes) == 1
+
+def test_leitura_sem_data_usa_a_data_do_banco_uma_vez():
+    cursor = CursorFalso()
+    linhas = [('1', None, 1.0, 1.0, 'A', '', 'u'), ('1', datetime(2024, 1, 1), 2.0, 2.0, 'A', '', 'u')]
+    resolvidas = armazenamento._com_data_banco(cursor, linhas)
+    assert resolvidas[0][1] == datetime(2024, 3, 31, 23, 59, 59)
+    assert resolvidas[1] == linhas[1]
+    assert cursor.execucoes == ['SELECT SYSDATE FROM dual']
+    assert armazenamento._com_data_banco(cursor, linhas[1:]) == linhas[1:]
+
+def _rollups(conexao):
+    return {
+        tabela: sorted(tuple(round(valor, 6) if isinstance(valor, float) else valor for valor in linha)
+                       for linha in conexao.execute(f'SELECT * FROM {tabela}'))
+        for tabela in ('consumo_diario', 'consumo_mensal')
+    }
+
+def test_rollups_incrementais_iguais_a_reconstrucao(backend):
+    aberta = backend.abrir_sessao()
+    linhas = [
+        (CNPJ_TESTE, datetime(2024, 1, 31, 23, 0), 10.0, 8.0, 'A', '', 'u'),
+        (CNPJ_TESTE, datetime(2024, 2, 1, 0, 30), 20.5, 16.0, 'A', '', 'u'),
+        (CNPJ_TESTE, datetime(2024, 2, 1, 9, 0), 3.25, 2.5, 'B', '', 'u'),
+        (CNPJ_TESTE, None, 7.0, 5.0, 'A', '', 'u'),
+    ]
+    assert aberta.consumo.inserir_lote(linhas[:2]) == {}
+    aberta.consumo.inserir(linhas[2])
+    aberta.consumo.inserir_lote(linhas[3:])
+    aberta.commit()
+
+    incrementais = _rollups(aberta.conexao)
+    aberta.consumo.reconstruir_rollups()
+    assert _rollups(aberta.conexao) == incrementais
+    assert len(incrementais['consumo_mensal']) == 4
+
+def test_reconstruir_pelo_cli_no_sqlite(backend, capsys):
+    aberta = backend.abrir_sessao()
+    aberta.consumo.inserir_lote([
+        (CNPJ_TESTE, datetime(2024, 3, dia), 10.0, 8.0, 'A', '-', 'teste') for dia in (1, 1, 2)
+    ])
+    aberta.conexao.execute('DELETE FROM consumo_diario')
+    aberta.conexao.execute('DELETE FROM consumo_mensal')
+    aberta.commit()
+    aberta.fechar()
+
+    assert cli.main(['rebuild-rollups']) == 0
+    saida = json.loads(capsys.readouterr().out)
+    assert (saida['linhas_diarias'], saida['linhas_mensais']) == (2, 1)
@@ -0,0 +1,57 @@
+#Imports das funcionalidades a serem usadas
+import pytest
+
+import senhas
+from senhas import autenticar, gerar_hash, precisa_atualizar, verificar
+
+#Custo baixo para os testes não levarem segundos por hash
+CONFIG_TESTE = {**senhas.CONFIG_SENHA, 'algoritmo': 'scrypt', 'scrypt_n': 2 ** 4, 'scrypt_r': 8, 'scrypt_p': 1}
+
+@pytest.fixture
+def config_rapida(monkeypatch):
+    monkeypatch.setattr(senhas, 'CONFIG_SENHA', CONFIG_TESTE)
+    monkeypatch.setattr(senhas, 'cache_verificacoes', senhas.CacheVerificacoes(ttl=0))
+
+def _criar_usuario(backend, senha):
+    aberta = backend.abrir_sessao()
+    aberta.usuarios.criar('fulana', senha, 'Fulana de Tal', 'fulana@teste.com')
+    aberta.commit()
+    return aberta
+
+def test_hash_confere_so_a_senha_certa(config_rapida):
+    for config in (CONFIG_TESTE, {**CONFIG_TESTE, 'algoritmo': 'pbkdf2', 'pbkdf2_iteracoes': 1000}):
+        armazenada = gerar_hash('segredo', config)
+        assert verificar('segredo', armazenada)
+        assert not verificar('outra', armazenada)
+        assert not precisa_atualizar(armazenada, config)
+    assert not verificar('segredo', 'scrypt$lixo')
+    assert not verificar('segredo', None)
+
+def test_login_migra_senha_em_texto_puro(backend, config_rapida):
+    aberta = _criar_usuario(backend, 'segredo')
+    try:
+        assert not autenticar(aberta, 'fulana', 'errada')
+        assert aberta.usuarios.obter_senha('fulana') == 'segredo'
+
+        assert autenticar(aberta, 'fulana', 'segredo')
+        armazenada = aberta.usuarios.obter_senha('fulana')
+        assert armazenada.startswith('scrypt$')
+        assert verificar('segredo', armazenada)
+
+        assert autenticar(aberta, 'fulana', 'segredo')
+        assert aberta.usuarios.obter_senha('fulana') == armazenada
+        assert not autenticar(aberta, 'fulana', 'errada')
+        assert not autenticar(aberta, 'ninguem', 'segredo')
+    finally:
+        aberta.fechar()
+
+def test_login_refaz_hash_com_custo_antigo(backend, config_rapida):
+    antiga = gerar_hash('segredo', {**CONFIG_TESTE, 'algoritmo': 'pbkdf2', 'pbkdf2_iteracoes': 1000})
+    aberta = _criar_usuario(backend, antiga)
+    try:
+        assert precisa_atualizar(antiga)
+        assert autenticar(aberta, 'fulana', 'segredo')
+        nova = aberta.usuarios.obter_senha('fulana')
+        assert nova != antiga and not precisa_atualizar(nova)
+    finally:
+        aberta.fechar()
@@ -0,0 +1,43 @@
+#Imports das funcionalidades a serem usadas
+import asyncio
+from http import HTTPStatus
+
+import pytest
+
+import operacoes
+import servico
+
+def _ler(bruto):
+    async def ler():
+        leitor = asyncio.StreamReader()
+        leitor.feed_data(bruto)
+        leitor.feed_eof()
+        return await servico._ler_requisicao(leitor)
+    return asyncio.run(ler())
+
+def test_content_length_invalido_e_400():
+    for valor in (b'abc', b'-5'):
+        with pytest.raises(servico.ErroHTTP) as erro:
+            _ler(b'POST /login HTTP/1.1\r\nContent-Length: ' + valor + b'\r\n\r\n{}')
+        assert erro.value.status == HTTPStatus.BAD_REQUEST
+
+def test_requisicao_valida():
+    metodo, alvo, versao, cabecalhos, corpo = _ler(b'post /login HTTP/1.1\r\nContent-Length: 2\r\n\r\n{}')
+    assert (metodo, alvo, corpo) == ('POST', '/login', b'{}')
+
+def test_erro_inesperado_vira_500(monkeypatch):
+    def login(username, senha):
+        raise LookupError('falha inesperada')
+    monkeypatch.setattr(operacoes, 'login', login)
+
+    async def despachar():
+        aberto = servico.Servico({'concorrencia': 1})
+        aberto._semaforo = asyncio.Semaphore(1)
+        try:
+            return await aberto.despachar('POST', '/login', {}, b'{"username": "a", "senha": "b"}')
+        finally:
+            aberto.executor.shutdown()
+
+    status, resultado = asyncio.run(despachar())
+    assert status == HTTPStatus.INTERNAL_SERVER_ERROR
+    assert resultado == {'erro': 'Erro interno do servidor.'}
@@ -0,0 +1,75 @@
+#Imports das funcionalidades a serem usadas
+import json
+from datetime import datetime, timedelta
+
+import pytest
+
+import operacoes
+import spool
+from conftest import CNPJ_TESTE
+
+@pytest.fixture
+def gravador(backend, tmp_path):
+    gravador = spool.Gravador({'diretorio': str(tmp_path / 'spool'), 'fsync': False})
+    yield gravador
+    gravador.fechar()
+
+def _contar(backend):
+    return backend.abrir_sessao().conexao.execute('SELECT COUNT(*) FROM consumo_energetico').fetchone()[0]
+
+def test_linha_incompleta_e_descartada(backend, tmp_path):
+    diretorio = tmp_path / 'spool'
+    diretorio.mkdir()
+    registro = {'chave': 'a' * 32, 'cnpj': CNPJ_TESTE, 'data_registro': '2024-03-01 10:00:00',
+                'consumo_kwh': 10.0, 'custo_total': 8.0, 'setor': 'A', 'observacoes': '-', 'usuario': 'teste'}
+    (diretorio / spool.ARQUIVO_SPOOL).write_bytes(json.dumps(registro).encode() + b'\n{"chave": "b')
+    gravador = spool.Gravador({'diretorio': str(diretorio), 'fsync': False})
+    try:
+        assert gravador.pendentes() == len(json.dumps(registro)) + 1
+        assert gravador.esvaziar()['gravadas'] == 1
+    finally:
+        gravador.fechar()
+
+def test_reenvio_nao_duplica(backend, gravador):
+    for kwh in (10, 20, 30):
+        gravador.registrar(CNPJ_TESTE, kwh, kwh * 0.8, 'teste')
+    assert gravador.esvaziar()['gravadas'] == 3
+
+    #Queda depois do commit e antes de gravar a posição: o lote volta inteiro
+    gravador._gravar_posicao(0)
+    resultado = gravador.esvaziar()
+    assert (resultado['gravadas'], resultado['duplicadas']) == (0, 3)
+    assert _contar(backend) == 3
+    assert gravador.pendentes() == 0
+
+def test_linhas_rejeitadas_vao_para_arquivo(backend, gravador):
+    gravador.registrar(CNPJ_TESTE, 10, 8, 'teste')
+    gravador.registrar('99999999000199', 10, 8, 'teste')
+    with gravador._trava:
+        gravador._arquivo.write(b'isto nao e json\n')
+        gravador._arquivo.flush()
+        gravador._escrito = gravador._arquivo.tell()
+    resultado = gravador.esvaziar()
+    assert (resultado['gravadas'], resultado['rejeitadas']) == (1, 2)
+    with open(gravador.caminho_rejeitadas, encoding='utf-8') as arquivo:
+        invalida, recusada = [json.loads(linha) for linha in arquivo]
+    assert invalida == {'registro': 'isto nao e json', 'erro': 'Linha inválida no spool'}
+    assert recusada['registro']['cnpj'] == '99999999000199'
+
+def test_leituras_do_spool_chegam_a_varredura(backend, gravador):
+    inicio = datetime.now() - timedelta(days=60)
+    aberta = backend.abrir_sessao()
+    aberta.consumo.inserir_lote([
+        (CNPJ_TESTE, inicio + timedelta(days=dia), 100.0 + dia % 5, 80.0, 'Produção', '-', 'teste')
+        for dia in range(25)
+    ])
+    aberta.commit()
+    operacoes.varrer_anomalias()
+
+    #A leitura fica no spool enquanto outra, mais recente, é registrada direto no banco
+    gravador.registrar(CNPJ_TESTE, 5000, 4000, 'teste', setor='Produção', data_registro=datetime.now() - timedelta(hours=1))
+    operacoes.registrar_consumo(CNPJ_TESTE, 101.0, 80.0, 'teste', setor='Produção')
+    assert gravador.esvaziar()['gravadas'] == 1
+
+    resultado = operacoes.varrer_anomalias()
+    assert (resultado['leituras'], resultado['anomalias']) == (1, 1)